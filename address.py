@@ -0,0 +1,73 @@
+import functools
+from typing import Union
+
+# Address key: the 20 raw bytes of an address, the form used for matching and in the transaction index
+AddressKey = bytes
+
+_HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+
+
+def _keccak(data: bytes) -> bytes:
+    # eth_hash picks its backend on first import, so it is only loaded once a checksum is needed
+    from eth_hash.auto import keccak
+    return keccak(data)
+
+
+def _hex_part(address: str) -> str:
+    return address[2:] if address[:2] in ('0x', '0X') else address
+
+
+def normalize_address(address: str) -> AddressKey:
+    """
+    Normalize a 0x-prefixed Ethereum address to its 20-byte form, independent of checksum casing.
+
+    :param address: The Ethereum address.
+    :return: The 20 raw address bytes.
+    :raises ValueError: If address is not 40 hex digits.
+    """
+    key = bytes.fromhex(_hex_part(address))
+    if len(key) != 20:
+        raise ValueError(f"Address must be 20 bytes: {address}")
+    return key
+
+
+@functools.lru_cache(maxsize=65536)
+def _checksum(hex_address: str) -> str:
+    digest = _keccak(hex_address.encode()).hex()
+    return '0x' + ''.join(c.upper() if int(h, 16) >= 8 else c for c, h in zip(hex_address, digest))
+
+
+def to_checksum_address(address: Union[str, AddressKey]) -> str:
+    """
+    Format an address with its EIP-55 checksum casing, without constructing Web3.
+
+    Results are memoized, since the same watched and contract addresses recur in every block.
+
+    :param address: Address in any casing, or its 20-byte key.
+    :return: The checksummed 0x-prefixed address.
+    :raises ValueError: If address is not a 20-byte address.
+    """
+    key = address if isinstance(address, bytes) else normalize_address(address)
+    if len(key) != 20:
+        raise ValueError(f"Address must be 20 bytes: {address!r}")
+    return _checksum(key.hex())
+
+
+def is_valid_address(address: str) -> bool:
+    """
+    Validate an Ethereum address: 40 hex digits, optionally 0x-prefixed. Unlike Web3.is_address,
+    an address with mixed-case letters carries an EIP-55 checksum, which must be valid, so a
+    mistyped checksummed address is rejected.
+
+    :param address: The address to validate.
+    :return: True if the address is valid, False otherwise.
+    """
+    if not isinstance(address, str):
+        return False
+    hex_address = _hex_part(address)
+    if len(hex_address) != 40 or not _HEX_DIGITS.issuperset(hex_address):
+        return False
+    if hex_address.islower() or hex_address.isupper() or hex_address.isdigit():
+        return True
+    # Mixed case means the address carries a checksum, which must match
+    return _checksum(hex_address.lower())[2:] == hex_address
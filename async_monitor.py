@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import time
+import asyncio
+import threading
+import contextlib
+import metrics
+from utils import logger
+from scanner import BlockScanner
+from head_watcher import HeadWatcher
+from web3_handler import get_token_transfers
+from cache import receipt_cache, block_header_cache, block_header, header_key
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    from web3 import AsyncWeb3
+
+# Maximum number of RPC requests in flight at once
+DEFAULT_MAX_CONCURRENCY = 20
+# Seconds before an individual RPC request is cancelled
+DEFAULT_REQUEST_TIMEOUT = 10
+
+
+async def init_async_web3(
+    INFURA_PROJECT_ID: str,
+    infura_network: Optional[str] = 'mainnet',
+    rpc_urls: Optional[List[str]] = None,
+    poa: bool = False
+) -> AsyncWeb3:
+    """
+    Initialize an AsyncWeb3 instance connected to the Ethereum network via Infura.
+
+    :param INFURA_PROJECT_ID: Infura project ID for accessing the Ethereum network.
+    :param infura_network: Infura network to connect to; None to use the first of rpc_urls.
+    :param rpc_urls: JSON-RPC endpoints used when Infura does not serve the chain.
+    :param poa: Accept proof-of-authority blocks, whose extraData is longer than 32 bytes.
+    :return: AsyncWeb3 instance connected to the Ethereum network.
+    :raises ConnectionError: If the connection to Infura fails.
+    """
+    from web3 import AsyncWeb3
+    from web3.middleware import async_geth_poa_middleware
+
+    if INFURA_PROJECT_ID and infura_network:
+        infura_url = f'https://{infura_network}.infura.io/v3/{INFURA_PROJECT_ID}'
+    elif rpc_urls:
+        infura_url = rpc_urls[0]
+    else:
+        raise ConnectionError("No RPC endpoint configured")
+    web3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(infura_url))
+    if poa:
+        web3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+    if not await web3.is_connected():
+        logger.error("Failed to connect to Infura (async)")
+        raise ConnectionError("Failed to connect to Infura")
+    logger.info("Successfully connected to Infura (async)")
+    return web3
+
+
+class AsyncMonitor:
+    """
+    Asyncio monitoring engine that fetches blocks and receipts concurrently.
+
+    Matching, alerting and checkpointing are delegated to a BlockScanner, so both
+    engines produce identical alerts; only the RPC fetching differs. A cycle takes
+    as long as its slowest request instead of the sum of all of them.
+    """
+
+    def __init__(
+        self,
+        web3: AsyncWeb3,
+        scanner: BlockScanner,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+        poll_interval: float = 60
+    ) -> None:
+        """
+        :param web3: AsyncWeb3 instance used for fetching blocks and receipts.
+        :param scanner: BlockScanner matching blocks against the shared subscription registry.
+        :param max_concurrency: Maximum number of RPC requests in flight at once.
+        :param request_timeout: Seconds before an individual request is cancelled.
+        :param poll_interval: Seconds to wait between cycles.
+        """
+        self.web3 = web3
+        self.scanner = scanner
+        self.request_timeout = request_timeout
+        self.poll_interval = poll_interval
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _request(self, call: Callable[[], Awaitable[Any]], description: str) -> Optional[Any]:
+        """
+        Run one RPC request under the concurrency limit, cancelling it on timeout.
+
+        :param call: Callable returning the request coroutine.
+        :param description: Description of the request for log messages.
+        :return: The result, or None if the request timed out or failed.
+        """
+        method = description.split('(')[0]
+        async with self._semaphore:
+            started = time.perf_counter()
+            try:
+                return await asyncio.wait_for(call(), self.request_timeout)
+            except asyncio.TimeoutError:
+                metrics.rpc_errors.inc(method)
+                logger.error(f"Timed out after {self.request_timeout}s: {description}")
+            except Exception as e:
+                metrics.rpc_errors.inc(method)
+                logger.error(f"Request failed: {description}: {e}")
+            finally:
+                metrics.rpc_requests.inc(method)
+                metrics.rpc_latency.observe(time.perf_counter() - started, method)
+        return None
+
+    async def fetch_blocks(self, block_numbers: Iterable[int]) -> Dict[int, Any]:
+        """
+        Fetch blocks with full transactions concurrently.
+
+        :param block_numbers: Numbers of the blocks to fetch.
+        :return: Dictionary of block number -> block (None if the request failed).
+        """
+        numbers = list(block_numbers)
+        blocks = await asyncio.gather(*(
+            self._request(lambda n=n: self.web3.eth.get_block(n, full_transactions=True), f"get_block({n})")
+            for n in numbers
+        ))
+        for block in blocks:
+            if block is not None:
+                block_header_cache.set(header_key(self.scanner.chain.name, block['hash']), block_header(block))
+        return dict(zip(numbers, blocks))
+
+    async def fetch_receipts(self, tx_hashes: Iterable) -> Dict[Any, Any]:
+        """
+        Fetch receipts concurrently, skipping the ones already cached.
+
+        A receipt whose request timed out is left out; process_transaction then
+        fetches it on its own, so only that single alert is delayed.
+
+        :param tx_hashes: Transaction hashes.
+        :return: Dictionary of hash -> receipt.
+        """
+        receipts = {}
+        missing = []
+        for tx_hash in dict.fromkeys(tx_hashes):
+            receipt = receipt_cache.get(tx_hash.hex())
+            if receipt is None:
+                missing.append(tx_hash)
+            else:
+                receipts[tx_hash] = receipt
+        fetched = await asyncio.gather(*(
+            self._request(lambda h=h: self.web3.eth.get_transaction_receipt(h), f"get_transaction_receipt({h.hex()})")
+            for h in missing
+        ))
+        for tx_hash, receipt in zip(missing, fetched):
+            if receipt is not None:
+                receipt_cache.set(tx_hash.hex(), receipt)
+                receipts[tx_hash] = receipt
+        return receipts
+
+    def _process(self, block_numbers: range, blocks, token_logs_by_block, receipts, matches_by_block) -> int:
+        with self.scanner.lock:
+            return self.scanner.process_blocks(block_numbers, blocks, token_logs_by_block, receipts, matches_by_block)
+
+    async def run_cycle(self, latest_block: Optional[int] = None) -> int:
+        """
+        Scan every block produced since the previous cycle.
+
+        :param latest_block: Current chain head, if already known from a subscription.
+        :return: Number of blocks scanned.
+        """
+        with metrics.profiler.cycle(), metrics.cycle_duration.time(self.scanner.chain.name):
+            return await self._run_cycle(latest_block)
+
+    async def _run_cycle(self, latest_block: Optional[int]) -> int:
+        if latest_block is None:
+            latest_block = await self._request(lambda: self.web3.eth.block_number, "block_number")
+        if latest_block is None:
+            return 0
+        metrics.chain_head.set(latest_block, self.scanner.chain.name)
+        with self.scanner.lock:
+            block_numbers = self.scanner.plan_cycle(latest_block)
+            addresses = self.scanner.registry.addresses()
+        if not block_numbers:
+            return 0
+
+        token_task = None
+        if self.scanner.track_tokens:
+            token_task = asyncio.create_task(asyncio.to_thread(
+                get_token_transfers, self.scanner.web3, addresses, block_numbers.start, block_numbers.stop - 1,
+                self.scanner.topic_chunk_size, self.scanner.log_fetcher
+            ))
+
+        blocks = await self.fetch_blocks(block_numbers)
+        # Stop at the first block that could not be fetched; the next cycle resumes from there
+        for block_number in block_numbers:
+            if blocks[block_number] is None:
+                block_numbers = range(block_numbers.start, block_number)
+                break
+        matches_by_block = self.scanner.match_blocks({n: blocks[n] for n in block_numbers})
+        receipts = await self.fetch_receipts(self.scanner.matched_tx_hashes(matches_by_block))
+        token_logs_by_block = self.scanner.group_logs_by_block(await token_task) if token_task else {}
+
+        return await asyncio.to_thread(
+            self._process, block_numbers, blocks, token_logs_by_block, receipts, matches_by_block
+        )
+
+    async def run_forever(self) -> None:
+        """
+        Run monitoring cycles until cancelled.
+        """
+        while True:
+            try:
+                scanned = await self.run_cycle()
+                logger.info(f"{self.scanner.chain.label}: scanned {scanned} new block(s), "
+                            f"next block {self.scanner.next_block}")
+            except Exception as e:
+                logger.error(f"Unexpected error in {self.scanner.chain.label} async monitoring loop: {e}")
+            else:
+                # While catching up, the next cycle starts at once instead of after poll_interval
+                if scanned and not self.scanner.caught_up():
+                    await asyncio.sleep(0)
+                    continue
+            await asyncio.sleep(self.poll_interval)
+
+    async def run_on_heads(self, watcher: HeadWatcher) -> None:
+        """
+        Run a cycle as soon as each new head arrives, until cancelled.
+
+        Heads that arrive while a cycle is running are covered by the next cycle,
+        which scans everything up to the newest head.
+
+        :param watcher: HeadWatcher yielding new head numbers.
+        """
+        async for head in watcher.heads():
+            try:
+                scanned = await self.run_cycle(head)
+                logger.info(f"Head {head} ({watcher.mode}): scanned {scanned} new block(s)")
+            except Exception as e:
+                logger.error(f"Unexpected error processing head {head}: {e}")
+
+
+async def run_async_monitor(
+    INFURA_PROJECT_ID: str,
+    scanner: BlockScanner,
+    max_concurrency: Optional[int] = None,
+    request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+    ws_url: Optional[str] = None,
+    stop_event: Optional[threading.Event] = None
+) -> None:
+    """
+    Run the async monitor of the scanner's chain until stop_event is set.
+
+    :param INFURA_PROJECT_ID: Infura project ID for accessing the Ethereum network.
+    :param scanner: BlockScanner matching blocks against the shared subscription registry.
+    :param max_concurrency: Maximum number of RPC requests in flight at once; the chain's budget when omitted.
+    :param request_timeout: Seconds before an individual request is cancelled.
+    :param ws_url: WebSocket endpoint for newHeads; when set, cycles are driven by new heads
+                   instead of a fixed polling interval.
+    :param stop_event: Event that cancels the monitor when set; runs until cancelled when omitted.
+    """
+    chain = scanner.chain
+    web3 = await init_async_web3(INFURA_PROJECT_ID, chain.infura_network, chain.rpc_urls, chain.poa)
+    monitor = AsyncMonitor(web3, scanner, max_concurrency or chain.max_concurrency, request_timeout, chain.poll_interval)
+    task = asyncio.create_task(
+        monitor.run_on_heads(HeadWatcher(web3, ws_url, block_time=chain.block_time)) if ws_url
+        else monitor.run_forever()
+    )
+    logger.info(f"Starting async monitor for {chain.label}...")
+    try:
+        while stop_event is None or not stop_event.is_set():
+            done, _ = await asyncio.wait({task}, timeout=0.5)
+            if done:
+                # Surfaces the exception of a monitor that failed
+                return task.result()
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
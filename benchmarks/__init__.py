@@ -0,0 +1,3 @@
+"""
+Benchmark harness: a synthetic JSON-RPC node, a fake Telegram Bot API and a runner.
+"""
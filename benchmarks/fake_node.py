@@ -0,0 +1,321 @@
+import json
+import time
+import random
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+TRANSFER_EVENT_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+# Contract emitting the synthetic ERC-20 Transfer logs
+TOKEN_ADDRESS = '0x' + 'aa' * 20
+# First block of every synthetic chain
+GENESIS_TIMESTAMP = 1700000000
+
+
+def watched_address(index: int) -> str:
+    """
+    :param index: Index of a watched address.
+    :return: The deterministic lowercase address of watched address index.
+    """
+    return '0x' + format(0xbeef << 128 | index, '040x')
+
+
+def other_address(rng: random.Random) -> str:
+    """
+    :return: A random address that is never watched.
+    """
+    return '0x' + format(0xcafe << 128 | rng.getrandbits(112), '040x')
+
+
+def _hex32(value: int) -> str:
+    return '0x' + format(value, '064x')
+
+
+def _topic(address: str) -> str:
+    return '0x' + '0' * 24 + address[2:]
+
+
+class SyntheticChain:
+    """
+    Deterministic synthetic chain served over JSON-RPC.
+
+    Every block is generated from (seed, block number), so the same configuration
+    always produces the same transactions. A transaction touches a watched address
+    with probability hit_rate, sending or receiving. The head only moves when
+    produce_block is called, which records the wall-clock time the block became
+    visible for alert latency measurements. reorg re-hashes the top blocks, as if
+    another fork holding the same transactions became canonical.
+    """
+
+    def __init__(
+        self,
+        watched_count: int,
+        head: int = 1000,
+        tx_per_block: int = 150,
+        hit_rate: float = 0.01,
+        logs_per_block: int = 0,
+        seed: int = 1,
+        rpc_latency: float = 0.0
+    ) -> None:
+        """
+        :param watched_count: Number of watched addresses the generator draws hits from.
+        :param head: Initial chain head.
+        :param tx_per_block: Transactions per block.
+        :param hit_rate: Probability that a transaction or Transfer log involves a watched address.
+        :param logs_per_block: ERC-20 Transfer logs per block.
+        :param seed: Seed of the generator.
+        :param rpc_latency: Seconds added to every HTTP request, to simulate a remote node.
+        """
+        self.watched_count = watched_count
+        self.head = head
+        self.tx_per_block = tx_per_block
+        self.hit_rate = hit_rate
+        self.logs_per_block = logs_per_block
+        self.seed = seed
+        self.rpc_latency = rpc_latency
+        self.calls: Counter = Counter()
+        self.http_requests = 0
+        # HTTP status answered instead of a JSON-RPC response when not 200, e.g. 429 for a rate-limited provider
+        self.http_status = 200
+        # JSON-RPC error answered to every request with HTTP 200, e.g. {'code': -32005, 'message': 'limit exceeded'}
+        self.rpc_error: Optional[Dict[str, Any]] = None
+        self.produced_at: Dict[int, float] = {}
+        # Number of reorgs that replaced each block; it goes into the high bits of the block hash
+        self.forks: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def produce_block(self) -> int:
+        """
+        Advance the head by one block.
+
+        :return: The new head.
+        """
+        with self._lock:
+            self.head += 1
+            self.produced_at[self.head] = time.time()
+            return self.head
+
+    def reorg(self, depth: int) -> None:
+        """
+        Replace the top depth blocks with blocks of another fork: same numbers and
+        transactions, new hashes.
+
+        :param depth: Number of blocks replaced, counted from the head.
+        """
+        with self._lock:
+            for block_number in range(self.head - depth + 1, self.head + 1):
+                self.forks[block_number] += 1
+
+    def block_hash(self, block_number: int) -> str:
+        """
+        :param block_number: Number of a block.
+        :return: Hash of the canonical block at that height; the block number is in its low 64 bits.
+        """
+        return _hex32(self.forks[block_number] << 64 | block_number)
+
+    def _rng(self, block_number: int, salt: str = '') -> random.Random:
+        return random.Random(f"{self.seed}:{block_number}:{salt}")
+
+    def _pick(self, rng: random.Random) -> str:
+        if self.watched_count and rng.random() < self.hit_rate:
+            return watched_address(rng.randrange(self.watched_count))
+        return other_address(rng)
+
+    def transactions(self, block_number: int) -> List[Dict[str, Any]]:
+        rng = self._rng(block_number)
+        transactions = []
+        for index in range(self.tx_per_block):
+            sender, recipient = self._pick(rng), other_address(rng)
+            if rng.random() < 0.5:
+                sender, recipient = recipient, sender
+            transactions.append({
+                'hash': _hex32(block_number << 20 | index),
+                'from': sender,
+                'to': recipient,
+                'value': hex(rng.randrange(10 ** 15, 10 ** 19)),
+                'blockNumber': hex(block_number),
+                'blockHash': self.block_hash(block_number),
+                'transactionIndex': hex(index),
+                'nonce': hex(rng.randrange(1000)),
+                'gas': '0x5208',
+                'gasPrice': '0x3b9aca00',
+                'input': '0x',
+                'type': '0x0',
+                'v': '0x25',
+                'r': _hex32(1),
+                's': _hex32(1)
+            })
+        return transactions
+
+    def block(self, block_number: int, full_transactions: bool) -> Optional[Dict[str, Any]]:
+        if block_number > self.head or block_number < 0:
+            return None
+        transactions = self.transactions(block_number)
+        return {
+            'number': hex(block_number),
+            'hash': self.block_hash(block_number),
+            'parentHash': self.block_hash(block_number - 1),
+            'timestamp': hex(GENESIS_TIMESTAMP + 12 * block_number),
+            'transactions': transactions if full_transactions else [tx['hash'] for tx in transactions],
+            'miner': '0x' + '00' * 20,
+            'gasLimit': hex(30000000),
+            'gasUsed': hex(21000 * len(transactions)),
+            'difficulty': '0x0',
+            'totalDifficulty': '0x0',
+            'extraData': '0x',
+            'logsBloom': '0x' + '00' * 256,
+            'nonce': '0x0000000000000000',
+            'mixHash': _hex32(0),
+            'receiptsRoot': _hex32(0),
+            'sha3Uncles': _hex32(0),
+            'stateRoot': _hex32(0),
+            'transactionsRoot': _hex32(0),
+            'size': hex(500 + 110 * len(transactions)),
+            'uncles': [],
+            'baseFeePerGas': '0x3b9aca00'
+        }
+
+    def transaction(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        key = int(tx_hash, 16)
+        block_number, index = key >> 20, key & 0xfffff
+        if block_number > self.head or index >= self.tx_per_block:
+            return None
+        return self.transactions(block_number)[index]
+
+    def receipt(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        tx = self.transaction(tx_hash)
+        if tx is None:
+            return None
+        return {
+            'transactionHash': tx['hash'],
+            'transactionIndex': tx['transactionIndex'],
+            'blockNumber': tx['blockNumber'],
+            'blockHash': tx['blockHash'],
+            'from': tx['from'],
+            'to': tx['to'],
+            'status': '0x1',
+            'gasUsed': '0x5208',
+            'cumulativeGasUsed': '0x5208',
+            'effectiveGasPrice': '0x3b9aca00',
+            'contractAddress': None,
+            'logs': [],
+            'logsBloom': '0x' + '00' * 256,
+            'type': '0x0'
+        }
+
+    def transfer_logs(self, block_number: int) -> List[Dict[str, Any]]:
+        rng = self._rng(block_number, 'logs')
+        logs = []
+        for index in range(self.logs_per_block):
+            sender, recipient = self._pick(rng), other_address(rng)
+            if rng.random() < 0.5:
+                sender, recipient = recipient, sender
+            logs.append({
+                'address': TOKEN_ADDRESS,
+                'topics': [TRANSFER_EVENT_TOPIC, _topic(sender), _topic(recipient)],
+                'data': _hex32(rng.randrange(10 ** 6, 10 ** 12)),
+                'blockNumber': hex(block_number),
+                'blockHash': self.block_hash(block_number),
+                'transactionHash': _hex32(block_number << 20 | 0xf0000 | index),
+                'transactionIndex': hex(self.tx_per_block + index),
+                'logIndex': hex(index),
+                'removed': False
+            })
+        return logs
+
+    def get_logs(self, log_filter: Dict[str, Any]) -> List[Dict[str, Any]]:
+        from_block = int(log_filter.get('fromBlock', hex(self.head)), 16)
+        to_block = min(self.head, int(log_filter.get('toBlock', hex(self.head)), 16))
+        topics = log_filter.get('topics') or []
+        wanted = [set(t.lower() for t in topic) if isinstance(topic, list) else ({topic.lower()} if topic else None)
+                  for topic in topics]
+        matches = []
+        for block_number in range(from_block, to_block + 1):
+            for log in self.transfer_logs(block_number):
+                if all(allowed is None or log['topics'][position] in allowed
+                       for position, allowed in enumerate(wanted)):
+                    matches.append(log)
+        return matches
+
+    def call(self, request: Dict[str, Any]) -> str:
+        selector = request.get('data', request.get('input', '0x'))[:10]
+        if selector == '0x95d89b41':
+            # symbol() -> "BENCH"
+            return '0x' + format(32, '064x') + format(5, '064x') + b'BENCH'.hex().ljust(64, '0')
+        if selector == '0x313ce567':
+            # decimals() -> 6
+            return _hex32(6)
+        return '0x'
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        method = request.get('method')
+        params = request.get('params') or []
+        with self._lock:
+            self.calls[method] += 1
+        if self.rpc_error is not None:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': self.rpc_error}
+        if method == 'eth_blockNumber':
+            result = hex(self.head)
+        elif method == 'eth_getBlockByNumber':
+            result = self.block(self.head if params[0] == 'latest' else int(params[0], 16), params[1])
+        elif method == 'eth_getBlockByHash':
+            # Hashes encode the block number in their low 64 bits
+            result = self.block(int(params[0], 16) & 0xffffffffffffffff, params[1])
+            if result is not None and int(result['hash'], 16) != int(params[0], 16):
+                result = None
+        elif method == 'eth_getTransactionByHash':
+            result = self.transaction(params[0])
+        elif method == 'eth_getTransactionReceipt':
+            result = self.receipt(params[0])
+        elif method == 'eth_getLogs':
+            result = self.get_logs(params[0])
+        elif method == 'eth_getBalance':
+            result = hex(10 ** 18)
+        elif method == 'eth_call':
+            result = self.call(params[0])
+        elif method in ('eth_chainId', 'net_version'):
+            result = '0x1' if method == 'eth_chainId' else '1'
+        elif method == 'web3_clientVersion':
+            result = 'SyntheticChain/1.0'
+        else:
+            return {'jsonrpc': '2.0', 'id': request.get('id'),
+                    'error': {'code': -32601, 'message': f"Method {method} not supported"}}
+        return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+
+    def serve(self, host: str = '127.0.0.1', port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+        """
+        Serve the chain over HTTP JSON-RPC (single and batch requests) from a daemon thread.
+
+        :return: (server, URL)
+        """
+        chain = self
+
+        class NodeHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with chain._lock:
+                    chain.http_requests += 1
+                if chain.rpc_latency:
+                    time.sleep(chain.rpc_latency)
+                if chain.http_status != 200:
+                    self.send_error(chain.http_status)
+                    return
+                if isinstance(body, list):
+                    response = [chain.handle(request) for request in body]
+                else:
+                    response = chain.handle(body)
+                data = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), NodeHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='fake-node', daemon=True).start()
+        return server, f"http://{host}:{server.server_address[1]}"
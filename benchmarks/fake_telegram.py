@@ -0,0 +1,92 @@
+import json
+import time
+import threading
+from urllib.parse import parse_qs, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+
+class FakeTelegram:
+    """
+    Minimal Telegram Bot API server that accepts sendMessage and records every message.
+
+    throttle makes the next sendMessage calls fail with HTTP 429 and a retry_after,
+    as the Bot API does when a bot exceeds its limits.
+
+    Point telebot at it with telebot.apihelper.API_URL = the returned api_url.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        """
+        :param latency: Seconds added to every request, to simulate the real API.
+        """
+        self.latency = latency
+        # (wall-clock time received, chat_id, text)
+        self.messages: List[Tuple[float, str, str]] = []
+        # (wall-clock time received, chat_id, text) of the sendMessage calls answered with 429
+        self.rejected: List[Tuple[float, str, str]] = []
+        self._throttled = 0
+        self._retry_after = 1
+        self._lock = threading.Lock()
+
+    def throttle(self, count: int, retry_after: int = 1) -> None:
+        """
+        Answer the next count sendMessage calls with 429 Too Many Requests.
+
+        :param count: Number of calls to reject.
+        :param retry_after: Seconds the client is told to wait, as in the Bot API's parameters.retry_after.
+        """
+        with self._lock:
+            self._throttled = count
+            self._retry_after = retry_after
+
+    def serve(self, host: str = '127.0.0.1', port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+        """
+        Serve the Bot API from a daemon thread.
+
+        :return: (server, API URL template in the format of telebot.apihelper.API_URL)
+        """
+        telegram = self
+
+        class TelegramHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                params = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+                params.update({key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()})
+                if telegram.latency:
+                    time.sleep(telegram.latency)
+                method = self.path.split('?')[0].rsplit('/', 1)[-1]
+                status = 200
+                with telegram._lock:
+                    message = (time.time(), params.get('chat_id'), params.get('text', ''))
+                    if method == 'sendMessage' and telegram._throttled:
+                        telegram._throttled -= 1
+                        telegram.rejected.append(message)
+                        status = 429
+                        result = {'ok': False, 'error_code': 429,
+                                  'description': f"Too Many Requests: retry after {telegram._retry_after}",
+                                  'parameters': {'retry_after': telegram._retry_after}}
+                    else:
+                        if method == 'sendMessage':
+                            telegram.messages.append(message)
+                        result = {'ok': True, 'result': {
+                            'message_id': len(telegram.messages), 'date': int(time.time()),
+                            'chat': {'id': int(params.get('chat_id') or 0), 'type': 'private'},
+                            'text': params.get('text', '')
+                        }}
+                data = json.dumps(result).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), TelegramHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='fake-telegram', daemon=True).start()
+        return server, f"http://{host}:{server.server_address[1]}/bot{{0}}/{{1}}"
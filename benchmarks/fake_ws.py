@@ -0,0 +1,106 @@
+import json
+import socket
+import threading
+from typing import Set, Tuple
+
+from benchmarks.fake_node import SyntheticChain
+
+# Id of the single newHeads subscription of every connection
+SUBSCRIPTION_ID = '0xbe11'
+
+
+class FakeHeadStream:
+    """
+    Minimal newHeads WebSocket endpoint in front of a SyntheticChain.
+
+    A connection is subscribed once it sends eth_subscribe for newHeads. publish
+    produces a block on the chain and pushes its header to every subscriber, and
+    drop cuts every connection without a close frame, as a failing node or proxy would.
+    """
+
+    def __init__(self, chain: SyntheticChain) -> None:
+        """
+        :param chain: Chain whose new blocks are announced; also serve it over HTTP for polling.
+        """
+        self.chain = chain
+        # Number of connections and of newHeads subscriptions accepted so far
+        self.connections = 0
+        self.subscriptions = 0
+        self._subscribers: Set = set()
+        self._lock = threading.Lock()
+
+    def subscribers(self) -> int:
+        """
+        :return: Number of currently subscribed connections.
+        """
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self) -> int:
+        """
+        Produce a block and send its header to every subscriber.
+
+        :return: Number of the new block.
+        """
+        number = self.chain.produce_block()
+        block = self.chain.block(number, False)
+        message = json.dumps({'jsonrpc': '2.0', 'method': 'eth_subscription', 'params': {
+            'subscription': SUBSCRIPTION_ID,
+            'result': {field: block[field] for field in ('number', 'hash', 'parentHash', 'timestamp')}
+        }})
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for connection in subscribers:
+            try:
+                connection.send(message)
+            except Exception:
+                pass
+        return number
+
+    def drop(self) -> None:
+        """
+        Cut every connection at the TCP level.
+        """
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, set()
+        for connection in subscribers:
+            try:
+                connection.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _handle(self, connection) -> None:
+        from websockets.exceptions import ConnectionClosed
+
+        with self._lock:
+            self.connections += 1
+        try:
+            for message in connection:
+                request = json.loads(message)
+                if request.get('method') == 'eth_subscribe' and request.get('params') == ['newHeads']:
+                    reply = {'jsonrpc': '2.0', 'id': request.get('id'), 'result': SUBSCRIPTION_ID}
+                else:
+                    reply = {'jsonrpc': '2.0', 'id': request.get('id'),
+                             'error': {'code': -32601, 'message': f"Method {request.get('method')} not supported"}}
+                connection.send(json.dumps(reply))
+                if 'result' in reply:
+                    with self._lock:
+                        self.subscriptions += 1
+                        self._subscribers.add(connection)
+        except ConnectionClosed:
+            pass
+        finally:
+            with self._lock:
+                self._subscribers.discard(connection)
+
+    def serve(self, host: str = '127.0.0.1', port: int = 0) -> Tuple[object, str]:
+        """
+        Serve the stream from a daemon thread.
+
+        :return: (server, WebSocket URL)
+        """
+        from websockets.sync.server import serve
+
+        server = serve(self._handle, host, port)
+        threading.Thread(target=server.serve_forever, name='fake-ws', daemon=True).start()
+        return server, f"ws://{host}:{server.socket.getsockname()[1]}"
@@ -0,0 +1,418 @@
+"""
+Benchmark the monitor against a synthetic chain and a fake Telegram Bot API.
+
+Every scenario runs the real BlockScanner and NotificationDispatcher in a fresh
+worker process (so caches start cold and peak memory is the monitor's alone),
+while the fake JSON-RPC node and fake Telegram server run in this process.
+A scenario first catches up over a backlog of blocks to measure throughput,
+then follows a live chain producing a block every --block-interval seconds
+to measure the delay from block production to alert delivery.
+
+With --monitor-mode sharded the worker runs a ShardCoordinator instead of a single
+scanner, once for each --shards count, to measure how sharding scales.
+
+    python -m benchmarks.run --addresses 10,1000,100000 --output results.json
+    python -m benchmarks.run --compare results.json --output new.json
+    python -m benchmarks.run --monitor-mode sharded --shards 1,2,4 --addresses 100000
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.fake_node import SyntheticChain, watched_address
+from benchmarks.fake_telegram import FakeTelegram
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BLOCK_NUMBER_PATTERN = re.compile(r'Block Number: (\d+)')
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """
+    :return: Nearest-rank percentile of values, or None if there are none.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def current_rss_mb() -> float:
+    """
+    :return: Resident set size of this process in MiB.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb(children: bool = False) -> float:
+    """
+    :param children: Report the largest terminated child process (e.g. a shard worker) instead.
+    :return: Peak resident set size of this process in MiB.
+    """
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def emit(event: Dict[str, Any]) -> None:
+    print(json.dumps(event), flush=True)
+
+
+def run_worker(config: Dict[str, Any]) -> None:
+    """
+    Worker process: load the watched addresses, catch up to the head, then follow it until told to stop.
+    """
+    # The monitor writes monitor.log and addresses.db into the working directory
+    workdir = tempfile.mkdtemp(prefix='monitor-bench-')
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+    import telebot
+    import metrics
+    from storage import AddressStore
+    from registry import SubscriptionRegistry
+    from notifier import NotificationDispatcher
+    from web3_handler import init_web3
+    from chains import DEFAULT_CHAIN
+
+    rss_start = current_rss_mb()
+    telebot.apihelper.API_URL = config['api_url']
+    store = AddressStore(os.path.join(workdir, 'addresses.db'), json_path=None)
+    per_chat = config['addresses_per_chat']
+    addresses_by_user: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for index in range(config['watched_count']):
+        addresses_by_user.setdefault(str(1000 + index // per_chat), {})[f"address{index}"] = {
+            'ether_address': watched_address(index),
+            'last_seen_blocks': {DEFAULT_CHAIN: config['start_block'] - 1}
+        }
+    store.save_all(addresses_by_user)
+    del addresses_by_user
+
+    setup_started = time.perf_counter()
+    registry = SubscriptionRegistry(store)
+    registry_seconds = time.perf_counter() - setup_started
+    rss_registry = current_rss_mb()
+
+    web3 = init_web3(None, [config['node_url']])
+    bot = telebot.TeleBot('0:benchmark')
+    notifier = NotificationDispatcher(bot, max_queue_size=10 ** 6,
+                                      global_rate=config['global_rate'], per_chat_rate=config['per_chat_rate'])
+    notifier.start()
+    if config['shards']:
+        blocks, catchup_seconds = run_sharded(config, registry, notifier, web3)
+    else:
+        blocks, catchup_seconds = run_polling(config, registry, notifier, web3)
+    notifier.stop(timeout=60)
+
+    cycles = metrics.cycle_duration.summary().get((DEFAULT_CHAIN,), {})
+    emit({
+        'event': 'done',
+        'catchup_blocks': blocks,
+        'catchup_seconds': catchup_seconds,
+        'registry_load_seconds': registry_seconds,
+        'rss_start_mb': rss_start,
+        'rss_after_registry_mb': rss_registry,
+        'peak_rss_mb': peak_rss_mb(),
+        'shard_peak_rss_mb': peak_rss_mb(children=True) if config['shards'] else None,
+        'cycles': cycles.get('count', 0),
+        'mean_cycle_seconds': cycles.get('mean'),
+        'alerts_sent': notifier.sent,
+        'alerts_dropped': notifier.dropped
+    })
+
+
+def run_polling(config: Dict[str, Any], registry, notifier, web3) -> Tuple[int, float]:
+    """
+    Catch up and follow the chain with one BlockScanner, as MONITOR_MODE=polling does.
+
+    :return: Number of blocks scanned and seconds taken by the catch-up.
+    """
+    from scanner import BlockScanner
+
+    scanner = BlockScanner(web3, notifier, registry, max_blocks_per_cycle=config['max_blocks_per_cycle'],
+                           track_tokens=config['track_tokens'], batch_size=config['batch_size'])
+    started = time.perf_counter()
+    blocks = 0
+    while True:
+        scanned = scanner.scan_new_blocks()
+        if not scanned:
+            break
+        blocks += scanned
+    catchup_seconds = time.perf_counter() - started
+    emit({'event': 'caught_up', 'blocks': blocks, 'seconds': catchup_seconds})
+
+    stop = threading.Event()
+    threading.Thread(target=lambda: (sys.stdin.readline(), stop.set()), daemon=True).start()
+    while not stop.is_set():
+        try:
+            scanner.scan_new_blocks()
+        except Exception as e:
+            emit({'event': 'error', 'message': str(e)})
+        stop.wait(config['poll_interval'])
+    return blocks, catchup_seconds
+
+
+def run_sharded(config: Dict[str, Any], registry, notifier, web3) -> Tuple[int, float]:
+    """
+    Catch up and follow the chain with a ShardCoordinator, as MONITOR_MODE=sharded does.
+    Catch-up ends when every shard has scanned the backlog, including the time to start the workers.
+
+    :return: Number of blocks scanned and seconds taken by the catch-up.
+    """
+    from sharding import ShardCoordinator
+
+    coordinator = ShardCoordinator(registry, notifier, config['shards'], {
+        'infura_project_id': None,
+        'rpc_urls': [config['node_url']],
+        'db_path': registry.store.db_path,
+        'track_tokens': config['track_tokens'],
+        'batch_size': config['batch_size'],
+        'max_blocks_per_cycle': config['max_blocks_per_cycle'],
+        'poll_interval': config['poll_interval'],
+    })
+    started = time.perf_counter()
+    coordinator.start(web3)
+    while any((shard['next_block'] or 0) <= config['head'] for shard in coordinator.stats().values()):
+        time.sleep(0.01)
+    blocks = config['head'] - config['start_block'] + 1
+    catchup_seconds = time.perf_counter() - started
+    emit({'event': 'caught_up', 'blocks': blocks, 'seconds': catchup_seconds})
+
+    sys.stdin.readline()
+    coordinator.stop()
+    return blocks, catchup_seconds
+
+
+def run_scenario(args: argparse.Namespace, watched_count: int, shards: int = 0) -> Dict[str, Any]:
+    """
+    Run one scenario with watched_count addresses and return its measurements.
+    With shards above 0 the monitor runs as that many shard workers.
+    """
+
+    head = args.start_block + args.blocks - 1
+    chain = SyntheticChain(watched_count, head=head, tx_per_block=args.tx_per_block, hit_rate=args.hit_rate,
+                           logs_per_block=args.logs_per_block, seed=args.seed, rpc_latency=args.rpc_latency)
+    node_server, node_url = chain.serve()
+    telegram = FakeTelegram(args.telegram_latency)
+    telegram_server, api_url = telegram.serve()
+    config = {
+        'node_url': node_url,
+        'api_url': api_url,
+        'watched_count': watched_count,
+        'addresses_per_chat': args.addresses_per_chat,
+        'start_block': args.start_block,
+        'head': head,
+        'shards': shards,
+        'max_blocks_per_cycle': args.max_blocks_per_cycle,
+        'batch_size': args.batch_size,
+        'track_tokens': args.logs_per_block > 0,
+        'poll_interval': args.poll_interval,
+        'global_rate': 25 if args.telegram_rate_limits else 10 ** 4,
+        'per_chat_rate': 1 if args.telegram_rate_limits else 10 ** 4,
+    }
+    worker = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.run', '--worker', json.dumps(config)],
+        cwd=REPO_ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+
+    def read_event(name: str) -> Dict[str, Any]:
+        for line in worker.stdout:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get('event') == 'error':
+                print(f"  worker error: {event['message']}", file=sys.stderr)
+            elif event.get('event') == name:
+                return event
+        raise RuntimeError(f"Worker exited with {worker.wait()} before reporting {name}")
+
+    try:
+        read_event('caught_up')
+        catchup_calls = dict(chain.calls)
+        catchup_http_requests = chain.http_requests
+        for _ in range(args.live_blocks):
+            time.sleep(args.block_interval)
+            chain.produce_block()
+        time.sleep(args.block_interval + 2 * args.poll_interval)
+        worker.stdin.write('stop\n')
+        worker.stdin.flush()
+        result = read_event('done')
+        worker.wait(timeout=120)
+    finally:
+        if worker.poll() is None:
+            worker.kill()
+        node_server.shutdown()
+        telegram_server.shutdown()
+
+    latencies = []
+    for received_at, _, text in telegram.messages:
+        for block_number in BLOCK_NUMBER_PATTERN.findall(text):
+            produced_at = chain.produced_at.get(int(block_number))
+            if produced_at is not None:
+                latencies.append(received_at - produced_at)
+
+    catchup_seconds = result['catchup_seconds']
+    blocks = result['catchup_blocks']
+    return {
+        'addresses': watched_count,
+        'shards': shards,
+        'catchup': {
+            'blocks': blocks,
+            'seconds': round(catchup_seconds, 4),
+            'blocks_per_second': round(blocks / catchup_seconds, 2) if catchup_seconds else None,
+            'transactions_per_second': round(blocks * args.tx_per_block / catchup_seconds, 1) if catchup_seconds else None,
+            'rpc_calls': catchup_calls,
+            'rpc_calls_per_block': round(sum(catchup_calls.values()) / blocks, 2) if blocks else None,
+            'http_requests': catchup_http_requests,
+        },
+        'live': {
+            'blocks': args.live_blocks,
+            'alerts': len(latencies),
+            'latency_seconds': {
+                'p50': percentile(latencies, 0.50),
+                'p90': percentile(latencies, 0.90),
+                'p99': percentile(latencies, 0.99),
+                'max': max(latencies, default=None),
+            },
+        },
+        'rpc_calls': dict(chain.calls),
+        'http_requests': chain.http_requests,
+        'telegram_messages': len(telegram.messages),
+        'alerts_sent': result['alerts_sent'],
+        'alerts_dropped': result['alerts_dropped'],
+        'mean_cycle_seconds': result['mean_cycle_seconds'],
+        'registry_load_seconds': round(result['registry_load_seconds'], 4),
+        'registry_rss_mb': round(result['rss_after_registry_mb'] - result['rss_start_mb'], 2),
+        'peak_rss_mb': round(result['peak_rss_mb'], 2),
+        'shard_peak_rss_mb': round(result['shard_peak_rss_mb'], 2) if result['shard_peak_rss_mb'] else None,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def format_latency(value: Optional[float]) -> str:
+    return '-' if value is None else f"{value * 1000:.0f}ms"
+
+
+def scenario_key(scenario: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    :return: (addresses, shards) identifying a scenario across runs; shards is 0 without sharding.
+    """
+    return scenario['addresses'], scenario.get('shards') or 0
+
+
+def print_table(scenarios: List[Dict[str, Any]], baseline: Optional[Dict[Tuple[int, int], Dict[str, Any]]] = None) -> None:
+    """
+    Print one line per scenario, with the relative change from a previous run when one is given.
+    """
+    def change(current, previous) -> str:
+        if baseline is None or current is None or not previous:
+            return ''
+        return f" ({(current - previous) / previous:+.0%})"
+
+    print(f"{'addresses':>10} {'shards':>6} {'blocks/s':>16} {'rpc/block':>16} {'alert p50':>16} {'alert p99':>16} "
+          f"{'peak RSS MiB':>18}")
+    for scenario in scenarios:
+        previous = (baseline or {}).get(scenario_key(scenario), {})
+        latency = scenario['live']['latency_seconds']
+        previous_latency = previous.get('live', {}).get('latency_seconds', {})
+        columns = [
+            f"{scenario['catchup']['blocks_per_second']}"
+            + change(scenario['catchup']['blocks_per_second'], previous.get('catchup', {}).get('blocks_per_second')),
+            f"{scenario['catchup']['rpc_calls_per_block']}"
+            + change(scenario['catchup']['rpc_calls_per_block'], previous.get('catchup', {}).get('rpc_calls_per_block')),
+            format_latency(latency['p50']) + change(latency['p50'], previous_latency.get('p50')),
+            format_latency(latency['p99']) + change(latency['p99'], previous_latency.get('p99')),
+            f"{scenario['peak_rss_mb']}" + change(scenario['peak_rss_mb'], previous.get('peak_rss_mb')),
+        ]
+        print(f"{scenario['addresses']:>10} {scenario.get('shards') or '-':>6} " + ' '.join(f"{column:>16}" for column in columns[:4])
+              + f" {columns[4]:>18}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--addresses', default='10,1000,10000,100000',
+                        help="Comma-separated numbers of watched addresses, one scenario each")
+    parser.add_argument('--addresses-per-chat', type=int, default=10, help="Watched addresses per Telegram chat")
+    parser.add_argument('--blocks', type=int, default=100, help="Backlog of blocks scanned in the catch-up phase")
+    parser.add_argument('--live-blocks', type=int, default=10, help="Blocks produced in the live phase")
+    parser.add_argument('--block-interval', type=float, default=1.0, help="Seconds between live blocks")
+    parser.add_argument('--poll-interval', type=float, default=0.2, help="Seconds between live monitor cycles")
+    parser.add_argument('--tx-per-block', type=int, default=150, help="Transactions per block")
+    parser.add_argument('--hit-rate', type=float, default=0.01,
+                        help="Probability that a transaction involves a watched address")
+    parser.add_argument('--logs-per-block', type=int, default=0,
+                        help="ERC-20 Transfer logs per block; enables token tracking when above 0")
+    parser.add_argument('--start-block', type=int, default=1000000, help="First block of the backlog")
+    parser.add_argument('--max-blocks-per-cycle', type=int, default=50, help="Blocks scanned per monitor cycle")
+    parser.add_argument('--batch-size', type=int, default=50, help="JSON-RPC calls per batch request")
+    parser.add_argument('--rpc-latency', type=float, default=0.0, help="Seconds added to every node request")
+    parser.add_argument('--telegram-latency', type=float, default=0.0, help="Seconds added to every Telegram request")
+    parser.add_argument('--telegram-rate-limits', action='store_true',
+                        help="Keep the notifier's Telegram rate limits instead of lifting them")
+    parser.add_argument('--monitor-mode', choices=('polling', 'sharded'), default='polling',
+                        help="Run one scanner, or a ShardCoordinator with --shards workers")
+    parser.add_argument('--shards', default='2',
+                        help="Comma-separated numbers of shard workers in sharded mode, one scenario each")
+    parser.add_argument('--seed', type=int, default=1, help="Seed of the synthetic chain")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--compare', help="Previous JSON results to compare against")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.worker:
+        run_worker(json.loads(args.worker))
+        return
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = {scenario_key(scenario): scenario for scenario in json.load(file)['scenarios']}
+
+    shard_counts = [int(count) for count in args.shards.split(',')] if args.monitor_mode == 'sharded' else [0]
+    scenarios = []
+    for watched_count in (int(count) for count in args.addresses.split(',')):
+        for shards in shard_counts:
+            print(f"Running scenario with {watched_count} addresses"
+                  + (f" and {shards} shards..." if shards else "..."), file=sys.stderr)
+            scenarios.append(run_scenario(args, watched_count, shards))
+
+    results = {
+        'config': {key: value for key, value in vars(args).items() if key not in ('worker', 'output', 'compare')},
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'scenarios': scenarios,
+    }
+    print_table(scenarios, baseline)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
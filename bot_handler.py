@@ -1,21 +1,46 @@
-import telebot
+from __future__ import annotations
+
 import threading
-from telebot import types
-from typing import Dict
-from utils import is_allowed_user, save_addresses, show_addresses, load_addresses
-from web3_handler import is_valid_ethereum_address
+from typing import TYPE_CHECKING, Mapping, Optional
+import metrics
+from chains import DEFAULT_CHAIN
+from utils import logger, is_allowed_user, show_addresses
+from notifier import split_message
+from web3_handler import (
+    is_valid_ethereum_address, show_balances, show_address_history, parse_history_callback_data
+)
+
+if TYPE_CHECKING:
+    import telebot
+    from web3 import Web3
 
 
-def config_bot(token: str) -> telebot.TeleBot:
+def config_bot(token: str, num_threads: int = 2) -> telebot.TeleBot:
     """
     Configures and returns a new instance of the Telegram bot.
     
     :param token: The token for authenticating the bot with Telegram.
+    :param num_threads: Size of the thread pool running the command handlers.
     :return: A configured TeleBot instance.
     """
-    return telebot.TeleBot(token)
+    import telebot
+
+    return telebot.TeleBot(token, threaded=True, num_threads=num_threads)
+
+def register_handlers(bot, registry, allowed_users, user_state, web3: Optional[Web3], admin_users=(),
+                      chain_web3: Optional[Mapping[str, Web3]] = None):
+    from telebot import types
+
+    # Web3 instance of every monitored chain; new addresses get a checkpoint at each chain's head.
+    # A ChainConnections mapping connects a chain the first time a command needs it.
+    chain_web3 = chain_web3 or {DEFAULT_CHAIN: web3}
+
+    def primary_web3():
+        # Balances and RPC endpoint stats are served from web3, or else from Ethereum or the first chain without it
+        if web3 is not None:
+            return web3
+        return chain_web3[DEFAULT_CHAIN if DEFAULT_CHAIN in chain_web3 else next(iter(chain_web3))]
 
-def register_handlers(bot, lock, addresses_by_user, allowed_users, user_state, web3):
     @bot.message_handler(commands=['start'])
     def handle_start_help(message):
         chat_id = message.chat.id
@@ -29,6 +54,8 @@ def register_handlers(bot, lock, addresses_by_user, allowed_users, user_state, w
             "• /addAddress - 📥 Add a new Ethereum address to your monitoring list.\n"
             "• /rmAddress - ❌ Remove an Ethereum address from your monitoring list.\n"
             "• /show - 📊 Display a list of all Ethereum addresses currently being monitored.\n"
+            "• /history <name> [chain] - 📜 Browse the recorded transactions of one of your addresses.\n"
+            "• /balances - 💰 Show the balances of all your addresses (optionally `/balances <token>`).\n"
         )
         bot.send_message(chat_id, welcome_message, parse_mode='Markdown')
 
@@ -65,19 +92,21 @@ def register_handlers(bot, lock, addresses_by_user, allowed_users, user_state, w
             bot.send_message(chat_id, "Name cannot be empty.")
             return
 
-        addresses_by_user = load_addresses()
-        user_addresses = addresses_by_user.get(str(chat_id), {})
+        last_seen_blocks = {}
+        for chain in chain_web3:
+            try:
+                last_seen_blocks[chain] = chain_web3[chain].eth.block_number
+            except Exception as e:
+                # The chain's scanner gives the address a checkpoint once its node is reachable again
+                logger.error(f"Error fetching the {chain} head for new address '{name}': {e}")
+        if not last_seen_blocks:
+            bot.send_message(chat_id, "❌ Could not reach the network. Please try again later.")
+            return
 
-        if name in user_addresses:
+        if not registry.add(chat_id, name, address, last_seen_blocks):
             bot.send_message(chat_id, f"Address with name '{name}' already exists.")
             return
 
-        user_addresses[name] = {
-            'ether_address': address,
-            'last_seen_block': web3.eth.block_number
-        }
-        addresses_by_user[str(chat_id)] = user_addresses
-        save_addresses(addresses_by_user)
         bot.send_message(chat_id, f"✅ Added Ethereum address '{name}': '{address}'.")
         
     @bot.message_handler(commands=['rmAddress'])
@@ -87,8 +116,7 @@ def register_handlers(bot, lock, addresses_by_user, allowed_users, user_state, w
             bot.reply_to(message, "🚫 Unauthorized access.")
             return
 
-        addresses_by_user = load_addresses()
-        user_addresses = addresses_by_user.get(str(chat_id), {})
+        user_addresses = registry.get_user_addresses(chat_id)
 
         if not user_addresses:
             bot.send_message(chat_id, "❌ No addresses available to remove.")
@@ -110,16 +138,7 @@ def register_handlers(bot, lock, addresses_by_user, allowed_users, user_state, w
             bot.send_message(chat_id, "⚠️ Unexpected error. Please try the command again.")
             return
 
-        addresses_by_user = load_addresses()
-        user_addresses = addresses_by_user.get(str(chat_id), {})
-
-        if address_name in user_addresses:
-            del user_addresses[address_name]
-            if not user_addresses:
-                del addresses_by_user[str(chat_id)]
-            else:
-                addresses_by_user[str(chat_id)] = user_addresses
-            save_addresses(addresses_by_user)
+        if registry.remove(chat_id, address_name):
             bot.send_message(chat_id, f"✅ Removed address with name '{address_name}' from your monitoring list.")
         else:
             bot.send_message(chat_id, f"❌ Address with name '{address_name}' not found in your monitoring list.")
@@ -136,11 +155,104 @@ def register_handlers(bot, lock, addresses_by_user, allowed_users, user_state, w
             bot.reply_to(message, "🚫 Unauthorized access.")
             return
 
-        # Load the user-specific addresses from the JSON file
-        addresses_by_user = load_addresses()  # Ensure this function loads the data correctly
-
-        # Access the user's addresses
-        user_addresses = addresses_by_user.get(str(chat_id), {})
+        # Access the user's addresses from the shared registry
+        user_addresses = registry.get_user_addresses(chat_id)
 
         # Show addresses
         show_addresses(bot, message, user_addresses)
+
+    @bot.message_handler(commands=['balances'])
+    def handle_balances(message):
+        chat_id = message.chat.id
+        if not is_allowed_user(chat_id, allowed_users):
+            bot.reply_to(message, "🚫 Unauthorized access.")
+            return
+
+        args = message.text.split()[1:]
+        token = args[0] if args else None
+        if token and not is_valid_ethereum_address(token):
+            bot.send_message(chat_id, "❌ Invalid token contract address.")
+            return
+
+        show_balances(primary_web3(), bot, chat_id, registry.get_user_addresses(chat_id), token=token)
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith('bal_'))
+    def handle_balances_page(call):
+        chat_id = call.message.chat.id
+        if not is_allowed_user(chat_id, allowed_users):
+            bot.answer_callback_query(call.id, "🚫 Unauthorized access.")
+            return
+
+        page, block_number, *token = call.data[len('bal_'):].split('_')
+        show_balances(primary_web3(), bot, chat_id, registry.get_user_addresses(chat_id), int(page), int(block_number),
+                      token[0] if token else None, call.message.message_id)
+        bot.answer_callback_query(call.id)
+
+    @bot.message_handler(commands=['history'])
+    def handle_history(message):
+        chat_id = message.chat.id
+        if not is_allowed_user(chat_id, allowed_users):
+            bot.reply_to(message, "🚫 Unauthorized access.")
+            return
+
+        args = message.text.split()[1:]
+        if not args:
+            bot.send_message(chat_id, "Usage: /history <name> [chain]")
+            return
+        name = args[0]
+        chain = args[1].lower() if len(args) > 1 else DEFAULT_CHAIN
+        if chain not in chain_web3:
+            bot.send_message(chat_id, f"Unknown chain '{chain}', expected one of {', '.join(chain_web3)}.")
+            return
+        address_info = registry.get(chat_id, name)
+        if address_info is None:
+            bot.send_message(chat_id, f"Address with name '{name}' not found.")
+            return
+
+        show_address_history(bot, registry.store, chat_id, name, address_info['ether_address'], chain=chain)
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith(('hx_', 'hist_')))
+    def handle_history_page(call):
+        chat_id = call.message.chat.id
+        if not is_allowed_user(chat_id, allowed_users):
+            bot.answer_callback_query(call.id, "🚫 Unauthorized access.")
+            return
+
+        newer, cursor, address, chain = parse_history_callback_data(call.data)
+        names = sorted(name for owner_chat_id, name in registry.subscribers(address) if owner_chat_id == str(chat_id))
+        if not names:
+            bot.answer_callback_query(call.id, "Address is no longer monitored.")
+            return
+
+        address = registry.get(chat_id, names[0])['ether_address']
+        show_address_history(bot, registry.store, chat_id, names[0], address, cursor, newer,
+                             call.message.message_id, chain)
+        bot.answer_callback_query(call.id)
+
+    def send_long_message(chat_id, text):
+        for part in split_message(text):
+            bot.send_message(chat_id, part)
+
+    @bot.message_handler(commands=['stats'])
+    def handle_stats(message):
+        chat_id = message.chat.id
+        if chat_id not in admin_users:
+            bot.reply_to(message, "🚫 Unauthorized access.")
+            return
+
+        args = message.text.split()[1:]
+        if args and args[0] == 'profile':
+            metrics.profiler.request(lambda report: send_long_message(chat_id, f"⏱ Profile of the last cycle:\n{report}"))
+            bot.send_message(chat_id, "⏱ The next monitoring cycle will be profiled.")
+        elif args and args[0] == 'memory':
+            send_long_message(chat_id, metrics.memory_report())
+        else:
+            stats = metrics.summary()
+            pool = getattr(primary_web3().provider, 'pool', None)
+            if pool is not None:
+                stats += "\n\nRPC endpoints:\n" + "\n".join(
+                    f"• {e['url']}: {e['latency'] * 1000:.0f} ms, {e['requests']} requests, {e['errors']} errors"
+                    + ("" if e['available'] else " (backing off)")
+                    for e in pool.stats()
+                )
+            send_long_message(chat_id, stats)
@@ -0,0 +1,136 @@
+import threading
+from lru import LRU
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class LRUCache:
+    """
+    Thread-safe bounded LRU cache with hit/miss counters.
+    """
+
+    def __init__(self, name: str, max_size: int) -> None:
+        """
+        :param name: Name of the cache, used when reporting statistics.
+        :param max_size: Maximum number of entries before the least recently used one is evicted.
+        """
+        self.name = name
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = LRU(max_size)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return the cached value for key, counting a hit or a miss.
+
+        :param key: The cache key.
+        :param default: Value returned when the key is not cached.
+        :return: The cached value or default.
+        """
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entry if the cache is full.
+
+        :param key: The cache key.
+        :param value: The value to cache.
+        """
+        with self._lock:
+            self._data[key] = value
+
+    def discard(self, key: Hashable) -> None:
+        """
+        Remove key if it is cached, e.g. because the chain reorganized.
+
+        :param key: The cache key.
+        """
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for key, or load, cache and return it.
+
+        The loader runs outside the lock; results that are None are not cached.
+
+        :param key: The cache key.
+        :param loader: Callable producing the value on a miss.
+        :return: The cached or freshly loaded value.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        """
+        Drop every entry and reset the counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        :return: Dictionary with size, max_size, hits, misses and hit_rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+# Block headers keyed by (chain, block hash), see header_key. A hash always names the same block,
+# so entries stay valid across reorgs. Only header fields are kept, never transaction lists.
+block_header_cache = LRUCache('block_headers', 4096)
+# Transaction receipts keyed by transaction hash (hex string).
+receipt_cache = LRUCache('receipts', 20000)
+# Balances keyed by (lowercase address, block number); a new head means a new key, so entries never go stale.
+balance_cache = LRUCache('balances', 8192)
+
+BLOCK_HEADER_FIELDS = ('number', 'hash', 'parentHash', 'timestamp')
+
+
+def header_key(chain: str, block_hash) -> Tuple[str, bytes]:
+    """
+    :param chain: Name of the chain the block belongs to.
+    :param block_hash: Block hash as bytes or a 0x-prefixed hex string.
+    :return: Key of the block in block_header_cache.
+    """
+    return chain, bytes(block_hash) if isinstance(block_hash, (bytes, bytearray)) else bytes.fromhex(block_hash[2:])
+
+
+def block_header(block) -> Dict[str, Any]:
+    """
+    Reduce a block to the header fields worth caching.
+
+    :param block: Block as returned by get_block.
+    :return: Dictionary with number, hash, parentHash and timestamp.
+    """
+    return {field: block[field] for field in BLOCK_HEADER_FIELDS if field in block}
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Collect statistics of every shared cache.
+
+    :return: Dictionary of cache name -> statistics.
+    """
+    return {cache.name: cache.stats() for cache in (block_header_cache, receipt_cache, balance_cache)}
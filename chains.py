@@ -0,0 +1,111 @@
+from typing import Dict, List, Optional
+
+# Chain of subscriptions and transactions stored before multi-chain support
+DEFAULT_CHAIN = 'ethereum'
+
+
+class Chain:
+    """
+    Settings of one EVM chain scanned by its own BlockScanner.
+
+    Addresses are the same on every EVM chain, so every subscription is watched on
+    every configured chain, with a separate checkpoint per chain.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        label: str,
+        chain_id: int,
+        symbol: str,
+        infura_network: Optional[str],
+        block_time: float,
+        poll_interval: float,
+        max_blocks_per_cycle: int = 50,
+        batch_size: int = 50,
+        max_concurrency: int = 20,
+        confirmations: int = 0,
+        poa: bool = False,
+        rpc_urls: Optional[List[str]] = None
+    ) -> None:
+        """
+        :param name: Key used in the database, callback data and metric labels.
+        :param label: Name shown in alerts.
+        :param chain_id: EIP-155 chain ID.
+        :param symbol: Symbol of the native currency.
+        :param infura_network: Infura network name used with INFURA_PROJECT_ID, or None if Infura does not serve the chain.
+        :param block_time: Typical seconds between blocks.
+        :param poll_interval: Seconds between scan cycles in polling mode.
+        :param max_blocks_per_cycle: Upper bound of blocks scanned in a single cycle.
+        :param batch_size: Maximum number of JSON-RPC calls per batch request.
+        :param max_concurrency: Maximum number of RPC requests in flight at once in async mode.
+        :param confirmations: Number of blocks built on a block before it is scanned.
+        :param poa: Whether blocks carry proof-of-authority extraData longer than 32 bytes.
+        :param rpc_urls: Additional JSON-RPC endpoints of the chain.
+        """
+        self.name = name
+        self.label = label
+        self.chain_id = chain_id
+        self.symbol = symbol
+        self.infura_network = infura_network
+        self.block_time = block_time
+        self.poll_interval = poll_interval
+        self.max_blocks_per_cycle = max_blocks_per_cycle
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.confirmations = confirmations
+        self.poa = poa
+        self.rpc_urls = list(rpc_urls or [])
+
+    def __repr__(self) -> str:
+        return f"Chain({self.name!r})"
+
+    def configured(self, **settings) -> 'Chain':
+        """
+        :param settings: Attributes to override; None values keep the default.
+        :return: Copy of this chain with the given settings.
+        """
+        chain = Chain(**{key: value for key, value in vars(self).items()})
+        for key, value in settings.items():
+            if not hasattr(chain, key):
+                raise ValueError(f"Unknown chain setting: {key}")
+            if value is not None:
+                setattr(chain, key, value)
+        return chain
+
+
+ETHEREUM = Chain('ethereum', 'Ethereum', 1, 'ETH', 'mainnet', block_time=12, poll_interval=60)
+
+# Chains that can be enabled by name in CHAINS. Fast chains poll every couple of seconds
+# and scan more blocks per cycle, so a cycle covers the blocks produced since the last one.
+KNOWN_CHAINS: Dict[str, Chain] = {chain.name: chain for chain in (
+    ETHEREUM,
+    Chain('arbitrum', 'Arbitrum One', 42161, 'ETH', 'arbitrum-mainnet', block_time=0.25, poll_interval=2,
+          max_blocks_per_cycle=400, batch_size=100),
+    Chain('optimism', 'OP Mainnet', 10, 'ETH', 'optimism-mainnet', block_time=2, poll_interval=2,
+          max_blocks_per_cycle=100),
+    Chain('base', 'Base', 8453, 'ETH', 'base-mainnet', block_time=2, poll_interval=2, max_blocks_per_cycle=100),
+    Chain('polygon', 'Polygon', 137, 'POL', 'polygon-mainnet', block_time=2, poll_interval=2,
+          max_blocks_per_cycle=100, poa=True),
+)}
+
+
+def get_chain(name: str) -> Chain:
+    """
+    :param name: Name of a known chain, case-insensitive.
+    :return: The chain's default settings.
+    :raises ValueError: If the chain is unknown.
+    """
+    chain = KNOWN_CHAINS.get(name.strip().lower())
+    if chain is None:
+        raise ValueError(f"Unknown chain '{name}', expected one of {', '.join(KNOWN_CHAINS)}")
+    return chain
+
+
+def chain_label(name: str) -> str:
+    """
+    :param name: Name of a chain as stored in the database.
+    :return: Name of the chain shown to users.
+    """
+    chain = KNOWN_CHAINS.get(name)
+    return chain.label if chain else name
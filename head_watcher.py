@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import json
+import time
+import asyncio
+from utils import logger
+from typing import TYPE_CHECKING, AsyncIterator, Optional
+
+if TYPE_CHECKING:
+    from web3 import AsyncWeb3
+
+# Bounds of the fallback polling interval, in seconds
+MIN_POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 60.0
+# Initial block time estimate (Ethereum mainnet) when the chain's typical block time is not given
+DEFAULT_BLOCK_TIME = 12.0
+
+
+class BlockTimeEstimator:
+    """
+    Exponential moving average of the observed block time, used to tune the polling interval.
+    """
+
+    def __init__(self, initial_block_time: float = DEFAULT_BLOCK_TIME, smoothing: float = 0.2) -> None:
+        """
+        :param initial_block_time: Estimate used before two heads have been observed.
+        :param smoothing: Weight of the newest observation in the moving average.
+        """
+        self.block_time = initial_block_time
+        self.smoothing = smoothing
+        self._last_block: Optional[int] = None
+        self._last_timestamp: Optional[float] = None
+
+    def observe(self, block_number: int, timestamp: float) -> None:
+        """
+        Record a new head.
+
+        :param block_number: Number of the head.
+        :param timestamp: Block timestamp.
+        """
+        if self._last_block is not None and block_number > self._last_block:
+            sample = (timestamp - self._last_timestamp) / (block_number - self._last_block)
+            if sample > 0:
+                self.block_time += self.smoothing * (sample - self.block_time)
+        if self._last_block is None or block_number > self._last_block:
+            self._last_block = block_number
+            self._last_timestamp = timestamp
+
+    def poll_interval(self) -> float:
+        """
+        :return: Half the estimated block time, so a new block is seen half a block late on average.
+        """
+        return min(MAX_POLL_INTERVAL, max(MIN_POLL_INTERVAL, self.block_time / 2))
+
+
+async def subscribe_new_heads(ws_url: str, open_timeout: float = 10) -> AsyncIterator[dict]:
+    """
+    Subscribe to newHeads over a WebSocket and yield every head as it arrives.
+
+    :param ws_url: WebSocket endpoint of the Ethereum node.
+    :param open_timeout: Seconds to wait for the connection and the subscription reply.
+    :return: Async iterator of head objects with integer number and timestamp.
+    :raises ConnectionError: If the node rejects the subscription.
+    """
+    import websockets
+
+    async with websockets.connect(ws_url, open_timeout=open_timeout) as ws:
+        await ws.send(json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe', 'params': ['newHeads']}))
+        reply = json.loads(await asyncio.wait_for(ws.recv(), open_timeout))
+        if 'error' in reply:
+            raise ConnectionError(f"newHeads subscription rejected: {reply['error']}")
+        subscription_id = reply['result']
+        logger.info(f"Subscribed to newHeads ({subscription_id}) at {ws_url}")
+
+        async for message in ws:
+            notification = json.loads(message)
+            params = notification.get('params', {})
+            if params.get('subscription') != subscription_id:
+                continue
+            head = params['result']
+            yield {'number': int(head['number'], 16), 'timestamp': int(head['timestamp'], 16)}
+
+
+class HeadWatcher:
+    """
+    Yields new chain heads as soon as they are known.
+
+    Heads are pushed over a newHeads WebSocket subscription. When the socket drops,
+    the watcher falls back to HTTP polling at an interval tuned to the observed
+    block time and retries the socket with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        web3: AsyncWeb3,
+        ws_url: Optional[str] = None,
+        reconnect_delay: float = 5,
+        max_reconnect_delay: float = 300,
+        block_time: float = DEFAULT_BLOCK_TIME
+    ) -> None:
+        """
+        :param web3: AsyncWeb3 instance used for fallback polling.
+        :param ws_url: WebSocket endpoint; without one the watcher only polls.
+        :param reconnect_delay: Initial delay before retrying the WebSocket.
+        :param max_reconnect_delay: Upper bound of the reconnect backoff.
+        :param block_time: Typical seconds between blocks of the chain, the estimate until heads have been observed.
+        """
+        self.web3 = web3
+        self.ws_url = ws_url
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.estimator = BlockTimeEstimator(block_time)
+        self.last_head: Optional[int] = None
+        self.mode = 'polling'
+
+    def _is_new(self, block_number: int) -> bool:
+        if self.last_head is not None and block_number <= self.last_head:
+            return False
+        self.last_head = block_number
+        return True
+
+    async def _poll(self, duration: Optional[float]) -> AsyncIterator[int]:
+        """
+        Poll the chain head over HTTP, for duration seconds or forever if None.
+        """
+        deadline = None if duration is None else time.monotonic() + duration
+        while deadline is None or time.monotonic() < deadline:
+            try:
+                # The latest header rather than eth_blockNumber, so block times are measured
+                # on the chain's clock in both modes
+                head = await self.web3.eth.get_block('latest')
+                self.estimator.observe(head['number'], head['timestamp'])
+                if self._is_new(head['number']):
+                    yield head['number']
+            except Exception as e:
+                logger.error(f"Error polling chain head: {e}")
+            await asyncio.sleep(self.estimator.poll_interval())
+
+    async def heads(self) -> AsyncIterator[int]:
+        """
+        Yield the number of every new head, forever.
+        """
+        if not self.ws_url:
+            async for block_number in self._poll(None):
+                yield block_number
+            return
+
+        delay = self.reconnect_delay
+        while True:
+            try:
+                async for head in subscribe_new_heads(self.ws_url):
+                    self.mode = 'subscription'
+                    delay = self.reconnect_delay
+                    self.estimator.observe(head['number'], head['timestamp'])
+                    if self._is_new(head['number']):
+                        yield head['number']
+                logger.warning("newHeads subscription closed by the node")
+            except Exception as e:
+                logger.error(f"newHeads subscription failed: {e}")
+
+            self.mode = 'polling'
+            logger.info(f"Falling back to HTTP polling every {self.estimator.poll_interval():.1f}s "
+                        f"for {delay:.0f}s before reconnecting")
+            async for block_number in self._poll(delay):
+                yield block_number
+            delay = min(delay * 2, self.max_reconnect_delay)
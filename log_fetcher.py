@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import logger
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Tuple, Union
+
+if TYPE_CHECKING:
+    from web3 import Web3
+
+# Substrings of provider errors meaning the block range returned too many results
+TOO_MANY_RESULTS_MARKERS = (
+    'query returned more than',
+    'too many results',
+    'log response size exceeded',
+    'response size exceeded',
+    'limit exceeded',
+    'block range is too large',
+    'range too large',
+    '-32005',
+)
+
+
+def is_too_many_results_error(error: Exception) -> bool:
+    """
+    Check whether an eth_getLogs error means the block range must be narrowed.
+
+    :param error: The exception raised by get_logs.
+    :return: True if the provider rejected the range as too large.
+    """
+    message = str(error).lower()
+    return any(marker in message for marker in TOO_MANY_RESULTS_MARKERS)
+
+
+class AdaptiveLogFetcher:
+    """
+    Fetch eth_getLogs results over a long block range in adaptively sized windows.
+
+    The window grows while results are sparse and shrinks when a window returns many
+    results or the provider rejects it with a "too many results" error, in which case
+    the window is split in half and retried. Windows are fetched in parallel but
+    delivered in block order, so callers can checkpoint after each window.
+
+    Keep one fetcher per scanner so the window size learned in one cycle carries over
+    to the next.
+    """
+
+    def __init__(
+        self,
+        web3: Web3,
+        initial_window: int = 2000,
+        min_window: int = 1,
+        max_window: int = 100000,
+        target_results: int = 1000,
+        max_workers: int = 4,
+        max_retries: int = 3
+    ) -> None:
+        """
+        :param web3: Web3 instance used for interacting with the Ethereum network.
+        :param initial_window: Number of blocks in the first window.
+        :param min_window: Smallest window; a single block that still fails raises the error.
+        :param max_window: Largest window.
+        :param target_results: Number of logs per window the sizing aims for.
+        :param max_workers: Number of windows fetched in parallel.
+        :param max_retries: Attempts per window for errors other than "too many results".
+        """
+        self.web3 = web3
+        self.window = initial_window
+        self.min_window = min_window
+        self.max_window = max_window
+        self.configured_max_window = max_window
+        self.target_results = target_results
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        # Windows are fetched by pool threads, which shrink the window when a span is rejected
+        self._lock = threading.Lock()
+
+    def _resize(self, result_count: int) -> None:
+        with self._lock:
+            if result_count > self.target_results:
+                self.window = max(self.min_window, self.window // 2)
+            elif result_count < self.target_results // 4:
+                self.window = min(self.max_window, self.window * 2)
+
+    def _fetch_window(
+        self,
+        filters: List[Dict[str, Any]],
+        from_block: int,
+        to_block: int
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Fetch one window of every filter. While the provider reports too many results the
+        window is halved and only its first half is fetched; the caller fetches the rest.
+
+        :return: (last block fetched, logs)
+        """
+        attempt = 0
+        while True:
+            try:
+                logs = []
+                for params in filters:
+                    logs.extend(self.web3.eth.get_logs(dict(params, fromBlock=from_block, toBlock=to_block)))
+                return to_block, logs
+            except Exception as e:
+                if is_too_many_results_error(e) and to_block > from_block:
+                    middle = (from_block + to_block) // 2
+                    # Never grow back to a span the provider has already rejected during this fetch
+                    with self._lock:
+                        self.max_window = min(self.max_window, max(self.min_window, (to_block - from_block + 1) // 2))
+                        self.window = min(self.window, self.max_window)
+                    logger.info(f"Too many results for blocks {from_block}-{to_block}, splitting at {middle}")
+                    return self._fetch_window(filters, from_block, middle)
+                attempt += 1
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"get_logs for blocks {from_block}-{to_block} failed (attempt {attempt}): {e}")
+
+    def iter_windows(
+        self,
+        params: Union[Dict[str, Any], List[Dict[str, Any]]],
+        from_block: int,
+        to_block: int
+    ) -> Iterator[Tuple[int, int, List[Dict[str, Any]]]]:
+        """
+        Yield (window_from, window_to, logs) for consecutive windows covering the range, in block order.
+
+        :param params: get_logs filter without fromBlock/toBlock (address, topics), or a list of
+                       filters fetched over the same windows, so a window is complete for all of them.
+        :param from_block: First block of the range, inclusive.
+        :param to_block: Last block of the range, inclusive.
+        :raises Exception: The provider error of a window that could not be fetched;
+                           every window yielded before it is complete.
+        """
+        filters = params if isinstance(params, list) else [params]
+        with self._lock:
+            self.max_window = self.configured_max_window
+        next_start = from_block
+        in_flight: List[Tuple[int, int, Any]] = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while next_start <= to_block or in_flight:
+                while next_start <= to_block and len(in_flight) < self.max_workers:
+                    window_to = min(to_block, next_start + self.window - 1)
+                    future = executor.submit(self._fetch_window, filters, next_start, window_to)
+                    in_flight.append((next_start, window_to, future))
+                    next_start = window_to + 1
+                window_from, window_to, future = in_flight.pop(0)
+                try:
+                    fetched_to, logs = future.result()
+                except Exception:
+                    for _, _, pending in in_flight:
+                        pending.cancel()
+                    raise
+                if fetched_to < window_to:
+                    # The window was split, and already shrunk; its rest goes before the windows in flight
+                    in_flight.insert(0, (fetched_to + 1, window_to,
+                                         executor.submit(self._fetch_window, filters, fetched_to + 1, window_to)))
+                else:
+                    self._resize(len(logs))
+                yield window_from, fetched_to, logs
@@ -1,80 +1,241 @@
 import os
-import time
+import asyncio
 import threading
-import telebot
 from dotenv import load_dotenv
 from bot_handler import config_bot, register_handlers
-from utils import logger, load_addresses, save_addresses, load_allowed_users
-from web3_handler import init_web3, get_eth_transactions, process_transaction
+from utils import logger, load_allowed_users
+from storage import get_address_store
+from registry import SubscriptionRegistry
+from notifier import NotificationDispatcher
+from metrics import REGISTRY, notifier_collector, registry_collector, start_metrics_server
+from web3_handler import ChainConnections, DEFAULT_BATCH_SIZE
+from scanner import BlockScanner
+from async_monitor import run_async_monitor, DEFAULT_MAX_CONCURRENCY, DEFAULT_REQUEST_TIMEOUT
+from sharding import ShardCoordinator, default_shard_count
+from runtime import Component, Runtime
+from webhook import WebhookReceiver
+from mempool import MempoolWatcher, PendingTracker
+from chains import Chain, ETHEREUM, DEFAULT_CHAIN, get_chain
 
+# Seconds between checks for dead notification workers
+NOTIFIER_SUPERVISE_INTERVAL = 5
 
-def monitor_addresses(web3, bot, addresses_to_monitor, allowed_users, lock):
+
+def monitor_addresses(web3, bot, registry, allowed_users, track_tokens=False, batch_size=None,
+                      stop_event=None, pending=None, confirmations=None, chain: Chain = ETHEREUM):
     """
     Continuously monitor Ethereum addresses for new transactions and handle errors.
-    
-    :param addresses_to_monitor: Dictionary of addresses to monitor.
+
+    Each new block is fetched once and matched against every watched address,
+    so the RPC cost does not grow with the number of addresses.
+
+    :param bot: TeleBot or NotificationDispatcher used to send alerts.
+    :param registry: Shared subscription registry of the addresses to monitor.
     :param allowed_users: Dictionary of allowed users.
-    :param lock: Thread lock for synchronized access.
+    :param track_tokens: Also alert on ERC-20/ERC-721 transfers to or from watched addresses.
+    :param batch_size: Maximum number of JSON-RPC calls per batch request; the chain's setting when omitted.
+    :param stop_event: Event that ends the loop when set; runs forever when omitted.
+    :param pending: PendingTracker of the mempool watcher, if pending alerts are enabled.
+    :param confirmations: Number of blocks built on a block before it is scanned; the chain's setting when omitted.
+    :param chain: Chain web3 is connected to; sets the polling interval.
     """
-    while True:
+    stop_event = stop_event or threading.Event()
+    scanner = BlockScanner(web3, bot, registry, track_tokens=track_tokens, batch_size=batch_size, pending=pending,
+                           confirmations=confirmations, chain=chain)
+    while not stop_event.is_set():
         try:
-            with lock:
-                for name, info in addresses_to_monitor.items():
-                    from_block = info['last_seen_block'] + 1
-                    logger.info(f"Checking for new transactions for {name} ({info['ether_address']}) from block {from_block}")
-                    
-                    try:
-                        transactions = get_eth_transactions(info['ether_address'], from_block)
-                        if transactions:
-                            for tx in transactions:
-                                process_transaction(web3, bot, tx, name, info['ether_address'], allowed_users, addresses_to_monitor)
-                                # Update the last seen block after processing transactions
-                                addresses_to_monitor[name]['last_seen_block'] = tx['blockNumber']
-                                save_addresses()  # Save changes after processing transactions
-                    except Exception as e:
-                        logger.error(f"Error fetching transactions for {name}: {e}")
-        
+            scanned = scanner.scan_new_blocks()
+            logger.info(f"{chain.label}: scanned {scanned} new block(s), next block {scanner.next_block}")
         except Exception as e:
-            logger.error(f"Unexpected error in monitoring loop: {e}")
+            logger.error(f"Unexpected error in {chain.label} monitoring loop: {e}")
+        else:
+            # While catching up, the next cycle starts at once instead of after poll_interval
+            if scanned and not scanner.caught_up():
+                continue
+
+        # Wait before checking for new blocks
+        stop_event.wait(chain.poll_interval)
+
+def configure_chain(name, **settings):
+    """
+    Build the settings of a chain from its preset, overridden by settings and then by
+    <NAME>_RPC_URLS, <NAME>_POLL_INTERVAL, <NAME>_CONFIRMATIONS, <NAME>_BATCH_SIZE,
+    <NAME>_MAX_BLOCKS_PER_CYCLE and <NAME>_MAX_CONCURRENCY environment variables.
+
+    :param name: Name of a known chain.
+    :param settings: Chain attributes to override before the environment variables.
+    :return: The configured Chain.
+    :raises ValueError: If the chain is unknown.
+    """
+    chain = get_chain(name).configured(**settings)
+    prefix = chain.name.upper()
+
+    def env(key, cast):
+        value = os.getenv(f'{prefix}_{key}')
+        return cast(value) if value else None
 
-        # Wait before checking for new transactions
-        time.sleep(60)
+    rpc_urls = [url.strip() for url in os.getenv(f'{prefix}_RPC_URLS', '').split(',') if url.strip()]
+    return chain.configured(
+        rpc_urls=rpc_urls or None,
+        poll_interval=env('POLL_INTERVAL', float),
+        confirmations=env('CONFIRMATIONS', int),
+        batch_size=env('BATCH_SIZE', int),
+        max_blocks_per_cycle=env('MAX_BLOCKS_PER_CYCLE', int),
+        max_concurrency=env('MAX_CONCURRENCY', int)
+    )
+
+def run_notifier(notifier, stop_event):
+    """
+    Run the notification workers, replacing any that die, until stop_event is set.
+    """
+    notifier.start()
+    while not stop_event.wait(NOTIFIER_SUPERVISE_INTERVAL):
+        notifier.ensure_workers()
+
+def run_polling(bot, stop_event):
+    """
+    Long-poll Telegram for updates until stop_event is set.
+    """
+    # Updates are not delivered by getUpdates while a webhook is registered
+    bot.remove_webhook()
+    bot.infinity_polling(timeout=20)
+
+def add_monitor(runtime, chain, connections, notifier, registry, allowed_users, monitor_mode, infura_project_id,
+                track_tokens, request_timeout, shard_count, pending=None, ws_url=None):
+    """
+    Add the monitor component of one chain to the runtime, in the configured MONITOR_MODE.
+
+    Sharding is only available for Ethereum; other chains fall back to polling in sharded mode.
+
+    :param runtime: Runtime supervising the components.
+    :param chain: Configured chain to monitor.
+    :param connections: ChainConnections of the configured chains; the chain is connected when its monitor
+                        first runs, and a failed connection is retried when the runtime restarts the monitor.
+    :param notifier: NotificationDispatcher shared by every chain.
+    :param registry: Subscription registry shared by every chain.
+    :param allowed_users: Dictionary of allowed users.
+    :param monitor_mode: polling, async, subscribe or sharded.
+    :param infura_project_id: Infura project ID, for async mode and shard workers.
+    :param track_tokens: Also alert on ERC-20/ERC-721 transfers to or from watched addresses.
+    :param request_timeout: Seconds before an individual request is cancelled in async mode.
+    :param shard_count: Number of shard workers in sharded mode.
+    :param pending: PendingTracker of the mempool watcher, if pending alerts are enabled for this chain.
+    :param ws_url: WebSocket endpoint for newHeads in subscribe mode; the chain is polled when omitted.
+    """
+    name = f'monitor-{chain.name}'
+    if monitor_mode == 'sharded' and chain.name == DEFAULT_CHAIN:
+        coordinator = ShardCoordinator(registry, notifier, shard_count, {
+            'infura_project_id': infura_project_id,
+            'rpc_urls': chain.rpc_urls,
+            'db_path': registry.store.db_path,
+            'track_tokens': track_tokens,
+            'batch_size': chain.batch_size,
+            'confirmations': chain.confirmations,
+            'poll_interval': chain.poll_interval
+        })
+
+        def run_shards(stopping):
+            coordinator.start(connections[chain.name])
+            stopping.wait()
+
+        runtime.add(Component(name, run_shards, coordinator.stop))
+        logger.info(f"Running the {chain.label} monitor as {shard_count} shards")
+    elif monitor_mode in ('async', 'subscribe'):
+        ws_url = ws_url if monitor_mode == 'subscribe' else None
+        scanner = None
+
+        def run_async(stopping):
+            nonlocal scanner
+            # Built on the first run, once the chain is connected, and kept across restarts
+            if scanner is None:
+                scanner = BlockScanner(connections[chain.name], notifier, registry, track_tokens=track_tokens,
+                                       pending=pending, chain=chain)
+            asyncio.run(run_async_monitor(
+                infura_project_id, scanner, chain.max_concurrency, request_timeout, ws_url, stopping))
+
+        runtime.add(Component(name, run_async))
+    else:
+        runtime.add(Component(name, lambda stopping: monitor_addresses(
+            connections[chain.name], notifier, registry, allowed_users, track_tokens, stop_event=stopping,
+            pending=pending, chain=chain)))
 
 def main():
     TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
     INFURA_PROJECT_ID = os.getenv('INFURA_PROJECT_ID')
-    
-    web3 = init_web3(INFURA_PROJECT_ID)
-    bot = config_bot(TELEGRAM_BOT_TOKEN)
-    lock = threading.Lock()
-    addresses_by_user = load_addresses()
+    RPC_URLS = [url.strip() for url in os.getenv('RPC_URLS', '').split(',') if url.strip()]
+    TRACK_TOKEN_TRANSFERS = os.getenv('TRACK_TOKEN_TRANSFERS', 'false').lower() == 'true'
+    RPC_BATCH_SIZE = int(os.getenv('RPC_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+    MONITOR_MODE = os.getenv('MONITOR_MODE', 'polling')
+    RPC_MAX_CONCURRENCY = int(os.getenv('RPC_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
+    RPC_REQUEST_TIMEOUT = float(os.getenv('RPC_REQUEST_TIMEOUT', DEFAULT_REQUEST_TIMEOUT))
+    METRICS_PORT = os.getenv('METRICS_PORT')
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+    SHARD_COUNT = int(os.getenv('SHARD_COUNT', default_shard_count()))
+    ADMIN_CHAT_IDS = {int(chat_id) for chat_id in os.getenv('ADMIN_CHAT_IDS', '').split(',') if chat_id.strip()}
+    BOT_THREADS = int(os.getenv('BOT_THREADS', 4))
+    WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+    WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+    WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8443))
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+    CONFIRMATIONS = int(os.getenv('CONFIRMATIONS', 0))
+    MEMPOOL_ALERTS = os.getenv('MEMPOOL_ALERTS', 'false').lower() == 'true'
+    WS_PROVIDER_URL = os.getenv('WS_PROVIDER_URL', f'wss://mainnet.infura.io/ws/v3/{INFURA_PROJECT_ID}')
+    CHAINS = [name.strip() for name in os.getenv('CHAINS', DEFAULT_CHAIN).split(',') if name.strip()]
+
+    # Ethereum keeps the settings that predate multi-chain support
+    chains = [configure_chain(name, rpc_urls=RPC_URLS, batch_size=RPC_BATCH_SIZE, confirmations=CONFIRMATIONS,
+                              max_concurrency=RPC_MAX_CONCURRENCY)
+              if get_chain(name).name == DEFAULT_CHAIN else configure_chain(name) for name in CHAINS]
+    # Chains are connected by their monitors or the first command that needs them, so intake starts at once
+    chain_web3 = ChainConnections(INFURA_PROJECT_ID, chains)
+    bot = config_bot(TELEGRAM_BOT_TOKEN, BOT_THREADS)
+    registry = SubscriptionRegistry(get_address_store())
+    notifier = NotificationDispatcher(bot)
     allowed_users = load_allowed_users()
     user_state = {}
 
-    register_handlers(bot, lock, addresses_by_user, allowed_users, user_state, web3)
-    
-    logger.info("Starting bot polling...")
-    try:
-        bot.polling(none_stop=True, interval=0, timeout=20)
-    except Exception as e:
-        logger.error(f"Bot polling failed with error: {e}")
-        bot.stop_polling()
-
-    polling_interval = 60  # seconds
-    while True:
-        for chat_id in addresses_by_user:
-            for name, info in addresses_by_user[chat_id].items():
-                address = info['ether_address']
-                last_seen_block = info['last_seen_block']
-                latest_block = web3.eth.block_number
-                if latest_block > last_seen_block:
-                    transactions = get_eth_transactions(web3, address, last_seen_block + 1)
-                    for tx in transactions:
-                        process_transaction(web3, bot, tx, name, address, allowed_users, addresses_by_user)
-                    addresses_by_user[chat_id][name]['last_seen_block'] = latest_block
-                    save_addresses(addresses_by_user)
-
-        time.sleep(polling_interval)
+    REGISTRY.register_collector(notifier_collector(notifier))
+    REGISTRY.register_collector(registry_collector(registry))
+    if METRICS_PORT:
+        start_metrics_server(int(METRICS_PORT), METRICS_HOST)
+
+    register_handlers(bot, registry, allowed_users, user_state, None, ADMIN_CHAT_IDS, chain_web3)
+
+    # Components stop in reverse order: intake, then the monitor, then the notifier drains its queue
+    runtime = Runtime()
+    runtime.add(Component('notifier', lambda stopping: run_notifier(notifier, stopping), notifier.stop))
+
+    pending = None
+    if MEMPOOL_ALERTS and MONITOR_MODE == 'sharded':
+        logger.warning("MEMPOOL_ALERTS is not supported with MONITOR_MODE=sharded, ignoring it")
+    elif MEMPOOL_ALERTS and DEFAULT_CHAIN not in chain_web3:
+        logger.warning("MEMPOOL_ALERTS watches the Ethereum mempool, which is not in CHAINS, ignoring it")
+    elif MEMPOOL_ALERTS:
+        pending = PendingTracker()
+        runtime.add(Component('mempool', lambda stopping: asyncio.run(MempoolWatcher(
+            chain_web3[DEFAULT_CHAIN], notifier, registry, pending, WS_PROVIDER_URL, batch_size=RPC_BATCH_SIZE
+        ).run(stopping))))
+
+    # One monitor per chain, each with its own provider, cadence, checkpoints and concurrency budget
+    for chain in chains:
+        add_monitor(runtime, chain, chain_web3, notifier, registry, allowed_users, MONITOR_MODE,
+                    INFURA_PROJECT_ID, TRACK_TOKEN_TRANSFERS, RPC_REQUEST_TIMEOUT, SHARD_COUNT,
+                    pending if chain.name == DEFAULT_CHAIN else None,
+                    WS_PROVIDER_URL if chain.name == DEFAULT_CHAIN else os.getenv(f'{chain.name.upper()}_WS_URL'))
+
+    if WEBHOOK_URL:
+        receiver = WebhookReceiver(bot, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET)
+        runtime.add(Component('intake', receiver.run))
+    else:
+        runtime.add(Component('intake', lambda stopping: run_polling(bot, stopping), bot.stop_polling))
+
+    runtime.run()
+
+    # Sharded workers persist their own Ethereum checkpoints when they stop
+    sharded = MONITOR_MODE == 'sharded' and DEFAULT_CHAIN in chain_web3
+    registry.flush([chain.name for chain in chains if not (sharded and chain.name == DEFAULT_CHAIN)])
+    registry.store.close()
+    logger.info("Shutdown complete")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+import metrics
+from utils import logger, emojize
+from address import to_checksum_address
+from registry import SubscriptionRegistry
+from web3_handler import fetch_transactions, RPC_ERROR, DEFAULT_BATCH_SIZE
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from web3 import Web3
+
+# Upper bound of pending alerts waiting for their transaction to be mined
+MAX_TRACKED = 10000
+# Seconds a pending transaction may stay unmined before the node is asked whether it still knows it
+DEFAULT_DROP_AFTER = 1800
+# Successful lookups in a row that must find nothing before a pending transaction is reported dropped
+DROP_CHECKS = 2
+# JSON-RPC error codes meaning the node does not support a subscription (method not found, invalid params)
+UNSUPPORTED_ERROR_CODES = (-32601, -32602)
+
+
+class UnsupportedNodeError(ValueError):
+    """
+    The node cannot stream full pending transactions; reconnecting will not help.
+    """
+
+
+async def subscribe_pending_transactions(ws_url: str, open_timeout: float = 10) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Subscribe to newPendingTransactions with full transaction bodies over a WebSocket.
+
+    Nodes that only stream hashes, as Infura does, are rejected: fetching every body would
+    cost one RPC call per pending transaction, thousands per second on mainnet.
+
+    :param ws_url: WebSocket endpoint of the Ethereum node.
+    :param open_timeout: Seconds to wait for the connection and the subscription reply.
+    :return: Async iterator of raw transactions, with hex string fields as sent by the node.
+    :raises UnsupportedNodeError: If the node does not stream full pending transactions.
+    :raises ConnectionError: If the node rejects the subscription for another reason.
+    """
+    import websockets
+
+    async with websockets.connect(ws_url, open_timeout=open_timeout, max_queue=4096) as ws:
+        await ws.send(json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe',
+                                  'params': ['newPendingTransactions', True]}))
+        reply = json.loads(await asyncio.wait_for(ws.recv(), open_timeout))
+        if 'error' in reply:
+            if reply['error'].get('code') in UNSUPPORTED_ERROR_CODES:
+                raise UnsupportedNodeError(f"{ws_url} does not support newPendingTransactions with full bodies: {reply['error']}")
+            raise ConnectionError(f"newPendingTransactions subscription rejected: {reply['error']}")
+        subscription_id = reply['result']
+        logger.info(f"Subscribed to newPendingTransactions ({subscription_id}) at {ws_url}")
+
+        async for message in ws:
+            params = json.loads(message).get('params', {})
+            if params.get('subscription') != subscription_id:
+                continue
+            tx = params['result']
+            # Nodes without full-body support send bare hashes despite the flag
+            if not isinstance(tx, dict):
+                raise UnsupportedNodeError(f"{ws_url} streams pending transaction hashes only, full bodies are required")
+            yield tx
+
+
+class PendingTracker:
+    """
+    Pending alerts waiting for their transaction to be mined, dropped or replaced.
+
+    The mempool watcher adds a transaction after alerting its owners; the block
+    scanner resolves it when the transaction, or another one with the same sender
+    and nonce, is mined. Shared between both, so every method takes the lock.
+    """
+
+    def __init__(self, max_tracked: int = MAX_TRACKED) -> None:
+        """
+        :param max_tracked: Upper bound of tracked transactions; the oldest are forgotten beyond it.
+        """
+        self.max_tracked = max_tracked
+        self._lock = threading.Lock()
+        # hash -> (tx, owners, monotonic time of the pending alert)
+        self._pending: 'OrderedDict[str, Tuple[Dict[str, Any], List[Tuple[str, str, str]], float]]' = OrderedDict()
+        # (sender, nonce) -> hash
+        self._by_nonce: Dict[Tuple[str, int], str] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, tx_hash: str) -> bool:
+        return tx_hash.lower() in self._pending
+
+    def add(self, tx: Dict[str, Any], owners: List[Tuple[str, str, str]]) -> None:
+        """
+        :param tx: Raw pending transaction.
+        :param owners: (chat_id, name, address) of every subscription alerted about it.
+        """
+        tx_hash = tx['hash'].lower()
+        with self._lock:
+            self._pending[tx_hash] = (tx, owners, time.monotonic())
+            self._by_nonce[(tx['from'].lower(), int(tx['nonce'], 16))] = tx_hash
+            while len(self._pending) > self.max_tracked:
+                self._forget(next(iter(self._pending)))
+
+    def _forget(self, tx_hash: str):
+        tx, owners, alerted_at = self._pending.pop(tx_hash)
+        key = (tx['from'].lower(), int(tx['nonce'], 16))
+        if self._by_nonce.get(key) == tx_hash:
+            del self._by_nonce[key]
+        return tx, owners, alerted_at
+
+    def resolve(self, tx) -> Tuple[Optional[float], Optional[Tuple[Dict[str, Any], List[Tuple[str, str, str]]]]]:
+        """
+        Resolve the pending alerts a mined transaction settles.
+
+        :param tx: Transaction from a block fetched with full transactions.
+        :return: (seconds since the pending alert if tx itself was tracked,
+                  (replaced tx, owners) if it used the nonce of another tracked transaction).
+        """
+        if not self._pending:
+            return None, None
+        tx_hash = '0x' + bytes(tx['hash']).hex()
+        with self._lock:
+            pending_for = None
+            if tx_hash in self._pending:
+                pending_for = time.monotonic() - self._forget(tx_hash)[2]
+            replaced = None
+            other = self._by_nonce.get((tx['from'].lower(), tx['nonce']))
+            if other is not None:
+                replaced_tx, owners, _ = self._forget(other)
+                replaced = (replaced_tx, owners)
+            return pending_for, replaced
+
+    def expired(self, max_age: float) -> List[str]:
+        """
+        :return: Hashes of the transactions alerted more than max_age seconds ago.
+        """
+        deadline = time.monotonic() - max_age
+        with self._lock:
+            return [tx_hash for tx_hash, (_, _, alerted_at) in self._pending.items() if alerted_at < deadline]
+
+    def drop(self, tx_hash: str) -> Optional[Tuple[Dict[str, Any], List[Tuple[str, str, str]]]]:
+        """
+        Stop tracking a transaction the node no longer knows.
+
+        :return: (tx, owners), or None if it was resolved in the meantime.
+        """
+        with self._lock:
+            if tx_hash not in self._pending:
+                return None
+            tx, owners, _ = self._forget(tx_hash)
+            return tx, owners
+
+    def touch(self, tx_hash: str) -> None:
+        """
+        Restart the drop timeout of a transaction the node still holds.
+        """
+        with self._lock:
+            if tx_hash in self._pending:
+                tx, owners, _ = self._pending.pop(tx_hash)
+                self._pending[tx_hash] = (tx, owners, time.monotonic())
+
+
+class MempoolWatcher:
+    """
+    Sends an early alert for every pending transaction from or to a watched address.
+
+    Matching runs on the event loop for every pending transaction the node announces,
+    so it is kept to two lookups in the registry's address index; addresses are only
+    checksummed for the transactions that match.
+
+    The node behind ws_url must stream full pending transactions. If it does not, pending
+    alerts are disabled with an error in the log instead of reconnecting forever.
+    """
+
+    def __init__(
+        self,
+        web3: Web3,
+        bot,
+        registry: SubscriptionRegistry,
+        tracker: PendingTracker,
+        ws_url: str,
+        drop_after: float = DEFAULT_DROP_AFTER,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        reconnect_delay: float = 5,
+        max_reconnect_delay: float = 300
+    ) -> None:
+        """
+        :param web3: Web3 instance used to check on transactions that stay pending.
+        :param bot: TeleBot or NotificationDispatcher used to send alerts.
+        :param registry: Shared subscription registry.
+        :param tracker: PendingTracker shared with the block scanner.
+        :param ws_url: WebSocket endpoint streaming full pending transactions.
+        :param drop_after: Seconds before an unmined transaction is checked for having been dropped.
+        :param batch_size: Maximum number of JSON-RPC calls per batch request.
+        :param reconnect_delay: Initial delay before reconnecting the WebSocket.
+        :param max_reconnect_delay: Upper bound of the reconnect backoff.
+        """
+        self.web3 = web3
+        self.bot = bot
+        self.registry = registry
+        self.tracker = tracker
+        self.ws_url = ws_url
+        self.drop_after = drop_after
+        self.batch_size = batch_size
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        # hash -> successful lookups in a row that found nothing
+        self._not_found: Dict[str, int] = {}
+
+    def match(self, tx: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+        """
+        :param tx: Raw pending transaction.
+        :return: (chat_id, name, address) of every subscription the transaction is from or to.
+        """
+        from_address = tx.get('from')
+        to_address = tx.get('to')
+        from_owners = self.registry.subscribers(from_address) if from_address else ()
+        to_owners = self.registry.subscribers(to_address) if to_address else ()
+        if not (from_owners or to_owners):
+            return []
+        owners = [(chat_id, name, to_checksum_address(from_address)) for chat_id, name in from_owners]
+        owners.extend((chat_id, name, to_checksum_address(to_address))
+                      for chat_id, name in to_owners if (chat_id, name) not in from_owners)
+        return owners
+
+    def handle(self, tx: Dict[str, Any]) -> int:
+        """
+        Alert the owners of a pending transaction and track it until it is resolved.
+
+        :param tx: Raw pending transaction.
+        :return: Number of alerts sent.
+        """
+        metrics.pending_transactions.inc()
+        owners = self.match(tx)
+        if not owners or tx['hash'] in self.tracker:
+            return 0
+        self.tracker.add(tx, owners)
+        for chat_id, name, address in owners:
+            send_pending_alert(self.bot, tx, chat_id, name, address)
+        metrics.pending_alerts.inc(amount=len(owners))
+        return len(owners)
+
+    def check_dropped(self) -> int:
+        """
+        Ask the node about transactions pending for longer than drop_after, alerting on those it no longer knows.
+
+        A transaction is reported dropped only after DROP_CHECKS lookups in a row answered that
+        it is unknown; failed lookups count neither way, so an RPC error never causes an alert.
+
+        :return: Number of transactions found dropped.
+        """
+        expired = self.tracker.expired(self.drop_after)
+        self._not_found = {tx_hash: self._not_found[tx_hash] for tx_hash in expired if tx_hash in self._not_found}
+        if not expired:
+            return 0
+        dropped = 0
+        for tx_hash, tx in fetch_transactions(self.web3, expired, self.batch_size, RPC_ERROR).items():
+            if tx is RPC_ERROR:
+                continue
+            if tx is not None:
+                # Still pending, or mined and about to be confirmed by the scanner
+                self._not_found.pop(tx_hash, None)
+                self.tracker.touch(tx_hash)
+                continue
+            self._not_found[tx_hash] = self._not_found.get(tx_hash, 0) + 1
+            if self._not_found[tx_hash] < DROP_CHECKS:
+                continue
+            del self._not_found[tx_hash]
+            resolved = self.tracker.drop(tx_hash)
+            if resolved is not None:
+                dropped += 1
+                for chat_id, name, address in resolved[1]:
+                    _send_message(self.bot, chat_id,
+                                 f"{emojize(':wastebasket:')} Pending transaction {tx_hash} for {name} ({address}) "
+                                 f"was dropped from the mempool without being mined.")
+        return dropped
+
+    async def _check_dropped_forever(self) -> None:
+        while True:
+            await asyncio.sleep(min(60.0, self.drop_after))
+            try:
+                dropped = await asyncio.to_thread(self.check_dropped)
+                if dropped:
+                    logger.info(f"{dropped} pending transaction(s) were dropped")
+            except Exception as e:
+                logger.error(f"Error checking for dropped transactions: {e}")
+
+    async def run(self, stop_event: Optional[threading.Event] = None) -> None:
+        """
+        Watch the mempool until stop_event is set, reconnecting with exponential backoff.
+        """
+        checker = asyncio.create_task(self._check_dropped_forever())
+        delay = self.reconnect_delay
+        try:
+            while stop_event is None or not stop_event.is_set():
+                try:
+                    async for tx in subscribe_pending_transactions(self.ws_url):
+                        delay = self.reconnect_delay
+                        try:
+                            self.handle(tx)
+                        except Exception as e:
+                            logger.error(f"Error handling pending transaction {tx.get('hash')}: {e}")
+                        if stop_event is not None and stop_event.is_set():
+                            return
+                    logger.warning("newPendingTransactions subscription closed by the node")
+                except UnsupportedNodeError as e:
+                    logger.error(f"Pending transaction alerts are disabled: {e}. Set WS_PROVIDER_URL to a node "
+                                 f"that streams full pending transactions, or MEMPOOL_ALERTS=false.")
+                    while stop_event is None or not stop_event.is_set():
+                        await asyncio.sleep(0.5)
+                    return
+                except Exception as e:
+                    logger.error(f"newPendingTransactions subscription failed: {e}")
+                logger.info(f"Reconnecting to the mempool in {delay:.0f}s")
+                deadline = time.monotonic() + delay
+                while time.monotonic() < deadline and not (stop_event is not None and stop_event.is_set()):
+                    await asyncio.sleep(0.5)
+                delay = min(delay * 2, self.max_reconnect_delay)
+        finally:
+            checker.cancel()
+
+
+def _send_message(bot, chat_id, message: str) -> None:
+    try:
+        bot.send_message(chat_id, message)
+    except Exception as e:
+        logger.error(f"Failed to send message to {chat_id}: {str(e)}")
+
+
+def send_pending_alert(bot, tx: Dict[str, Any], chat_id, name: str, address: str) -> None:
+    """
+    Alert a chat about a pending transaction of one of its addresses.
+
+    :param bot: TeleBot or NotificationDispatcher used to send the alert.
+    :param tx: Raw pending transaction.
+    :param chat_id: Chat ID of the user watching the address.
+    :param name: Name under which the address is watched.
+    :param address: The watched Ethereum address.
+    """
+    from web3 import Web3
+
+    value = Web3.from_wei(int(tx['value'], 16), 'ether')
+    _send_message(bot, chat_id,
+                 f"{emojize(':hourglass_not_done:')} Pending transaction for {name} ({address}):\n"
+                 f"Hash: {tx['hash']}\n"
+                 f"From: {tx['from']}\n"
+                 f"To: {tx.get('to')}\n"
+                 f"Value: {value} ETH\n"
+                 "Not mined yet; you will be alerted again when it is confirmed, dropped or replaced.\n"
+                 "------")
+
+
+def send_replaced_alert(bot, replaced_tx: Dict[str, Any], owners: List[Tuple[str, str, str]], tx) -> None:
+    """
+    Tell the owners of a pending transaction that another transaction with its nonce was mined instead.
+
+    :param bot: TeleBot or NotificationDispatcher used to send the alerts.
+    :param replaced_tx: Raw pending transaction that was replaced.
+    :param owners: (chat_id, name, address) alerted about replaced_tx.
+    :param tx: Mined transaction that replaced it.
+    """
+    for chat_id, name, address in owners:
+        _send_message(bot, chat_id,
+                     f"{emojize(':counterclockwise_arrows_button:')} Pending transaction {replaced_tx['hash']} "
+                     f"for {name} ({address}) was replaced by {'0x' + bytes(tx['hash']).hex()} "
+                     f"in block {tx['blockNumber']}.")
@@ -0,0 +1,486 @@
+import io
+import time
+import bisect
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils import logger
+from cache import cache_stats
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Above this many watched addresses only the aggregate lag is exported, to bound series cardinality
+MAX_ADDRESS_SERIES = 1000
+
+# (labels, value) pairs of one metric family
+Samples = List[Tuple[Dict[str, str], float]]
+# (name, type, help, samples) produced by a collector at scrape time
+Family = Tuple[str, str, str, Samples]
+
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label_value(value)}"' for key, value in labels.items()) + '}'
+
+
+class Metric:
+    """
+    Base class of a labelled metric family.
+    """
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        """
+        :param name: Prometheus metric name.
+        :param documentation: Help text.
+        :param label_names: Names of the labels; values are passed positionally.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _labels(self, label_values: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.label_names, label_values))
+
+    def label_values(self) -> List[Tuple[str, ...]]:
+        """
+        :return: Label values of every series recorded so far.
+        """
+        with self._lock:
+            return list(self._values)
+
+    def families(self) -> Iterable[Family]:
+        with self._lock:
+            return [(self.name, self.type, self.documentation,
+                     [(self._labels(key), value) for key, value in self._values.items()])]
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing count.
+    """
+    type = 'counter'
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down.
+    """
+    type = 'gauge'
+
+    def set(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+    def value(self, *label_values: str) -> Optional[float]:
+        with self._lock:
+            return self._values.get(label_values)
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in cumulative buckets, as Prometheus expects.
+    """
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        """
+        :param buckets: Increasing upper bounds of the buckets; +Inf is implied.
+        """
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            state['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        """
+        Observe the duration of the with block.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def summary(self) -> Dict[Tuple[str, ...], Dict[str, float]]:
+        """
+        :return: Dictionary of label values -> count, mean and the bucket bound holding the 95th percentile.
+        """
+        with self._lock:
+            summaries = {}
+            for key, state in self._values.items():
+                threshold = 0.95 * state['count']
+                cumulative = 0
+                p95 = float('inf')
+                for bound, count in zip(self.buckets, state['counts']):
+                    cumulative += count
+                    if cumulative >= threshold:
+                        p95 = bound
+                        break
+                summaries[key] = {
+                    'count': state['count'],
+                    'mean': state['sum'] / state['count'] if state['count'] else 0.0,
+                    'p95': p95
+                }
+            return summaries
+
+    def families(self) -> Iterable[Family]:
+        with self._lock:
+            samples: Samples = []
+            for key, state in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), state['counts']):
+                    cumulative += count
+                    samples.append((dict(labels, le='+Inf' if bound == float('inf') else repr(bound)), cumulative))
+                samples.append((dict(labels, __suffix__='_sum'), state['sum']))
+                samples.append((dict(labels, __suffix__='_count'), state['count']))
+            return [(self.name, self.type, self.documentation, samples)]
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics and scrape-time collectors, rendered in the Prometheus text format.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """
+        Add a callable producing (name, type, help, samples) families when metrics are read,
+        for values owned by other components such as queue depths.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def families(self) -> List[Family]:
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        families: List[Family] = []
+        for metric in metrics:
+            families.extend(metric.families())
+        for collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                logger.error(f"Metrics collector {collector} failed: {e}")
+        return families
+
+    def render(self) -> str:
+        """
+        :return: Every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for name, metric_type, documentation, samples in self.families():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                labels = dict(labels)
+                suffix = labels.pop('__suffix__', '_bucket' if 'le' in labels else '')
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {float(value)!r}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+rpc_requests = REGISTRY.register(Counter(
+    'rpc_requests_total', 'JSON-RPC calls sent, including calls inside batches.', ['method']))
+rpc_errors = REGISTRY.register(Counter(
+    'rpc_errors_total', 'JSON-RPC calls that failed.', ['method']))
+rpc_latency = REGISTRY.register(Histogram(
+    'rpc_request_duration_seconds', 'Duration of JSON-RPC HTTP requests; batches are labelled "batch".', ['method']))
+cycle_duration = REGISTRY.register(Histogram(
+    'scan_cycle_duration_seconds', 'Duration of a monitoring cycle.', ['chain']))
+blocks_scanned = REGISTRY.register(Counter(
+    'blocks_scanned_total', 'Blocks scanned for watched addresses.', ['chain']))
+chain_head = REGISTRY.register(Gauge(
+    'chain_head_block', 'Latest block number seen on the chain.', ['chain']))
+next_block = REGISTRY.register(Gauge(
+    'scanner_next_block', 'Next block the scanner will process.', ['chain']))
+send_latency = REGISTRY.register(Histogram(
+    'notification_send_latency_seconds', 'Time from queuing an alert to its delivery to Telegram.'))
+chain_reorgs = REGISTRY.register(Counter(
+    'chain_reorgs_total', 'Chain reorganizations detected by the scanner.', ['chain']))
+pending_transactions = REGISTRY.register(Counter(
+    'mempool_transactions_total', 'Pending transactions received from the mempool subscription.'))
+pending_alerts = REGISTRY.register(Counter(
+    'mempool_alerts_total', 'Pending-transaction alerts sent.'))
+
+
+def cache_collector() -> Iterable[Family]:
+    """
+    Export the hit and miss counters and hit rate of every LRU cache.
+    """
+    stats = cache_stats()
+    return [
+        ('cache_hits_total', 'counter', 'Cache lookups served from memory.',
+         [({'cache': name}, s['hits']) for name, s in stats.items()]),
+        ('cache_misses_total', 'counter', 'Cache lookups that missed.',
+         [({'cache': name}, s['misses']) for name, s in stats.items()]),
+        ('cache_hit_ratio', 'gauge', 'Fraction of cache lookups served from memory.',
+         [({'cache': name}, s['hit_rate']) for name, s in stats.items()]),
+        ('cache_entries', 'gauge', 'Entries held by the cache.',
+         [({'cache': name}, s['size']) for name, s in stats.items()]),
+    ]
+
+
+def notifier_collector(notifier) -> Callable[[], Iterable[Family]]:
+    """
+    :param notifier: NotificationDispatcher whose queue is exported.
+    :return: Collector exporting the queue depth and the sent and dropped counters.
+    """
+    def collect() -> Iterable[Family]:
+        return [
+            ('notification_queue_depth', 'gauge', 'Alerts waiting to be sent.', [({}, notifier.queue_depth())]),
+            ('notifications_sent_total', 'counter', 'Alerts delivered to Telegram.', [({}, notifier.sent)]),
+            ('notifications_dropped_total', 'counter', 'Alerts dropped after failures or a full queue.',
+             [({}, notifier.dropped)]),
+        ]
+    return collect
+
+
+def registry_collector(registry) -> Callable[[], Iterable[Family]]:
+    """
+    :param registry: SubscriptionRegistry whose checkpoints are compared with the chain head.
+    :return: Collector exporting how many blocks each watched address is behind the head of each chain.
+    """
+    def collect() -> Iterable[Family]:
+        lags_by_chain = {}
+        for (chain,) in chain_head.label_values():
+            head = chain_head.value(chain)
+            checkpoints = registry.checkpoints(chain)
+            lags_by_chain[chain] = {address: max(0, head - last_seen_block)
+                                    for address, last_seen_block in checkpoints.items()}
+        if not lags_by_chain:
+            return []
+        families = [
+            ('watched_addresses', 'gauge', 'Distinct watched addresses.', [({}, len(registry.addresses()))]),
+            ('max_blocks_behind', 'gauge', 'Largest number of blocks any watched address is behind the head.',
+             [({'chain': chain}, max(lags.values(), default=0)) for chain, lags in lags_by_chain.items()]),
+        ]
+        if sum(len(lags) for lags in lags_by_chain.values()) <= MAX_ADDRESS_SERIES:
+            families.append(('address_blocks_behind', 'gauge', 'Blocks a watched address is behind the head.',
+                             [({'chain': chain, 'address': address}, lag)
+                              for chain, lags in lags_by_chain.items() for address, lag in lags.items()]))
+        return families
+    return collect
+
+
+REGISTRY.register_collector(cache_collector)
+
+
+def summary() -> str:
+    """
+    :return: Human-readable digest of every metric, for the /stats command.
+    """
+    lines = ["📈 Monitor statistics"]
+    cycles = cycle_duration.summary()
+    for (chain,) in sorted(chain_head.label_values()):
+        lines.append(f"{chain}: head {chain_head.value(chain):.0f}, next block: {next_block.value(chain) or 0:.0f}, "
+                     f"blocks scanned: {blocks_scanned.value(chain):.0f}"
+                     + (f", reorgs: {chain_reorgs.value(chain):.0f}" if chain_reorgs.value(chain) else ''))
+        stats = cycles.get((chain,))
+        if stats:
+            lines.append(f"  Cycles: {stats['count']}, mean {stats['mean']:.2f}s, p95 ≤ {stats['p95']}s")
+
+    rpc_summaries = rpc_latency.summary()
+    if rpc_summaries:
+        lines.append("\nRPC (count, mean latency, p95 bucket):")
+        for (method,), stats in sorted(rpc_summaries.items(), key=lambda item: -item[1]['count']):
+            errors = rpc_errors.value(method)
+            lines.append(f"• {method}: {rpc_requests.value(method) or stats['count']:.0f} calls, "
+                         f"{stats['mean'] * 1000:.0f} ms, p95 ≤ {stats['p95']}s"
+                         + (f", {errors:.0f} errors" if errors else ''))
+
+    sent = send_latency.summary().get(())
+    gauges = {name: samples for name, _, _, samples in REGISTRY.families() if name in (
+        'notification_queue_depth', 'notifications_sent_total', 'notifications_dropped_total',
+        'max_blocks_behind', 'watched_addresses', 'cache_hit_ratio', 'cache_hits_total', 'cache_misses_total'
+    )}
+    if 'notification_queue_depth' in gauges:
+        lines.append(f"\nNotifications: queue {gauges['notification_queue_depth'][0][1]:.0f}, "
+                     f"sent {gauges['notifications_sent_total'][0][1]:.0f}, "
+                     f"dropped {gauges['notifications_dropped_total'][0][1]:.0f}"
+                     + (f", mean latency {sent['mean']:.2f}s, p95 ≤ {sent['p95']}s" if sent else ''))
+    if 'max_blocks_behind' in gauges:
+        lines.append(f"Addresses: {gauges['watched_addresses'][0][1]:.0f}, max blocks behind head: "
+                     + ', '.join(f"{labels['chain']} {value:.0f}" for labels, value in gauges['max_blocks_behind']))
+    if 'cache_hit_ratio' in gauges:
+        lines.append("\nCaches:")
+        hits = {labels['cache']: value for labels, value in gauges['cache_hits_total']}
+        misses = {labels['cache']: value for labels, value in gauges['cache_misses_total']}
+        for labels, ratio in gauges['cache_hit_ratio']:
+            name = labels['cache']
+            lines.append(f"• {name}: {ratio:.1%} hits ({hits[name]:.0f}/{hits[name] + misses[name]:.0f})")
+    return '\n'.join(lines)
+
+
+class CycleProfiler:
+    """
+    Profiles monitoring cycles with cProfile on demand.
+
+    A request arms the profiler for the next cycle; when that cycle ends the
+    report is passed to every callback that asked for it. Cycles run without
+    profiling overhead otherwise.
+    """
+
+    def __init__(self, limit: int = 25) -> None:
+        """
+        :param limit: Number of functions listed in a report.
+        """
+        self.limit = limit
+        self._callbacks: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+
+    def request(self, callback: Callable[[str], None]) -> None:
+        """
+        Profile the next cycle and pass the report to callback.
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+
+    @contextmanager
+    def cycle(self) -> Iterator[None]:
+        """
+        Wrap one monitoring cycle; profiles it if a report was requested.
+        """
+        with self._lock:
+            callbacks, self._callbacks = self._callbacks, []
+        if not callbacks:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).strip_dirs().sort_stats('cumulative').print_stats(self.limit)
+            report = output.getvalue().strip()
+            for callback in callbacks:
+                try:
+                    callback(report)
+                except Exception as e:
+                    logger.error(f"Error delivering profile report: {e}")
+
+
+profiler = CycleProfiler()
+_memory_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def memory_report(limit: int = 10) -> str:
+    """
+    Report the largest allocation sites with tracemalloc.
+
+    The first call starts tracing; later calls also show the growth since the previous report.
+
+    :param limit: Number of allocation sites listed.
+    :return: The report text.
+    """
+    global _memory_snapshot
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _memory_snapshot = tracemalloc.take_snapshot()
+        return "🧠 Memory tracing started; run it again to see allocations."
+
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f"🧠 Traced memory: {current / 2 ** 20:.1f} MiB (peak {peak / 2 ** 20:.1f} MiB)", "\nLargest allocation sites:"]
+    lines.extend(str(stat) for stat in snapshot.statistics('lineno')[:limit])
+    if _memory_snapshot is not None:
+        lines.append("\nGrowth since the previous report:")
+        lines.extend(str(stat) for stat in snapshot.compare_to(_memory_snapshot, 'lineno')[:limit])
+    _memory_snapshot = snapshot
+    return '\n'.join(lines)
+
+
+def rpc_metrics_middleware(make_request, web3):
+    """
+    Web3 middleware counting and timing every JSON-RPC request by method.
+    """
+    def middleware(method, params):
+        started = time.perf_counter()
+        try:
+            response = make_request(method, params)
+        except Exception:
+            rpc_errors.inc(method)
+            raise
+        finally:
+            rpc_requests.inc(method)
+            rpc_latency.observe(time.perf_counter() - started, method)
+        if isinstance(response, dict) and 'error' in response:
+            rpc_errors.inc(method)
+        return response
+    return middleware
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """
+    Serve the metrics in the Prometheus text format on http://host:port/metrics from a daemon thread.
+
+    :param port: TCP port to listen on.
+    :param host: Interface to bind; local only by default.
+    :return: The running server.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+from utils import logger
+from metrics import send_latency
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import telebot
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+# Separator placed between coalesced alerts
+COALESCE_SEPARATOR = '\n\n'
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: rate tokens per second, bursting up to capacity.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        :param rate: Tokens added per second.
+        :param capacity: Maximum number of stored tokens.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """
+        :return: Seconds until a token is available, without consuming it.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def acquire(self) -> None:
+        """
+        Consume one token, sleeping until one is available.
+        """
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """
+    Split a message into parts no longer than limit, preferring line breaks.
+
+    :param text: The message text.
+    :param limit: Maximum length of a part.
+    :return: List of message parts.
+    """
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    parts.append(text)
+    return parts
+
+
+class NotificationDispatcher:
+    """
+    Bounded, rate-limited outbound queue for Telegram messages.
+
+    Exposes send_message with the TeleBot signature, so it can be passed wherever
+    alerts are sent through a bot. Messages are delivered by worker threads under
+    a global and a per-chat token bucket. Alerts queued for the same chat while it
+    waits for its rate limit are merged into one message under 4096 characters.
+    HTTP 429 responses are retried after the server's retry_after.
+    """
+
+    def __init__(
+        self,
+        bot: telebot.TeleBot,
+        max_queue_size: int = 1000,
+        workers: int = 2,
+        global_rate: float = 25,
+        per_chat_rate: float = 1,
+        max_retries: int = 5
+    ) -> None:
+        """
+        :param bot: TeleBot instance used to deliver messages.
+        :param max_queue_size: Maximum number of queued messages; further messages are dropped.
+        :param workers: Number of worker threads.
+        :param global_rate: Messages per second across all chats (Telegram allows about 30).
+        :param per_chat_rate: Messages per second to a single chat (Telegram allows about 1).
+        :param max_retries: Delivery attempts per message before it is dropped.
+        """
+        self.bot = bot
+        self.max_queue_size = max_queue_size
+        self.worker_count = workers
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.sent = 0
+        self.dropped = 0
+
+        self._cond = threading.Condition()
+        # chat_id -> queued (text, kwargs, attempts, time queued)
+        self._pending: Dict[Any, Deque[Tuple[str, Dict[str, Any], int, float]]] = {}
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self._not_before: Dict[Any, float] = {}
+        self._schedule: List[Tuple[float, int, Any]] = []
+        self._scheduled: set = set()
+        self._in_flight: set = set()
+        self._sequence = itertools.count()
+        self._size = 0
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+
+    def queue_depth(self) -> int:
+        """
+        :return: Number of messages waiting to be sent.
+        """
+        with self._cond:
+            return self._size
+
+    def start(self) -> None:
+        """
+        Start the worker threads.
+        """
+        self._stopping = False
+        for index in range(self.worker_count):
+            thread = threading.Thread(target=self._run, name=f"notifier-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def ensure_workers(self) -> int:
+        """
+        Replace worker threads that have died.
+
+        :return: Number of workers restarted.
+        """
+        alive = [thread for thread in self._threads if thread.is_alive()]
+        restarted = 0
+        if not self._stopping:
+            for index in range(len(alive), self.worker_count):
+                thread = threading.Thread(target=self._run, name=f"notifier-{index}", daemon=True)
+                thread.start()
+                alive.append(thread)
+                restarted += 1
+        self._threads = alive
+        if restarted:
+            logger.error(f"Restarted {restarted} notification worker(s)")
+        return restarted
+
+    def stop(self, timeout: Optional[float] = 10) -> None:
+        """
+        Stop the workers after the queue has drained or timeout has elapsed.
+
+        :param timeout: Seconds to wait for pending messages to be sent.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._size and (deadline is None or time.monotonic() < deadline):
+                self._cond.wait(0.1)
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self._size:
+            logger.warning(f"Notification dispatcher stopped with {self._size} unsent message(s)")
+
+    def send_message(self, chat_id, text: str, **kwargs) -> bool:
+        """
+        Queue a message for delivery.
+
+        :param chat_id: Chat to send the message to.
+        :param text: Message text.
+        :param kwargs: Extra arguments passed to TeleBot.send_message; such messages are never merged.
+        :return: False if the queue is full and the message was dropped.
+        """
+        with self._cond:
+            if self._size >= self.max_queue_size:
+                self.dropped += 1
+                logger.error(f"Notification queue full, dropping message to {chat_id}")
+                return False
+            self._pending.setdefault(chat_id, deque()).append((text, kwargs, 0, time.monotonic()))
+            self._size += 1
+            self._schedule_chat(chat_id)
+            self._cond.notify()
+        return True
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, 1)
+        return bucket
+
+    def _schedule_chat(self, chat_id) -> None:
+        """
+        Put a chat with pending messages on the schedule at the time its limits allow.
+        Must be called with the condition held.
+        """
+        if chat_id in self._scheduled or chat_id in self._in_flight or not self._pending.get(chat_id):
+            return
+        now = time.monotonic()
+        due = max(now + self._chat_bucket(chat_id).delay(), self._not_before.get(chat_id, now))
+        heapq.heappush(self._schedule, (due, next(self._sequence), chat_id))
+        self._scheduled.add(chat_id)
+
+    def _take_batch(self, chat_id) -> Tuple[str, Dict[str, Any], int, float, int]:
+        """
+        Pop the next message of a chat, merged with following plain messages while under the length limit.
+        Must be called with the condition held.
+
+        :return: (text, kwargs, attempts, time the oldest part was queued, number of queued messages consumed)
+        """
+        pending = self._pending[chat_id]
+        text, kwargs, attempts, queued_at = pending.popleft()
+        count = 1
+        if len(text) > MAX_MESSAGE_LENGTH:
+            parts = split_message(text)
+            text = parts[0]
+            for part in reversed(parts[1:]):
+                pending.appendleft((part, kwargs, attempts, queued_at))
+                self._size += 1
+        elif not kwargs:
+            while pending and not pending[0][1]:
+                next_text = pending[0][0]
+                if len(text) + len(COALESCE_SEPARATOR) + len(next_text) > MAX_MESSAGE_LENGTH:
+                    break
+                pending.popleft()
+                text = text + COALESCE_SEPARATOR + next_text
+                count += 1
+        return text, kwargs, attempts, queued_at, count
+
+    def _next_chat(self) -> Optional[Any]:
+        """
+        Wait for the next chat whose limits allow a send. Returns None when stopping.
+        """
+        with self._cond:
+            while not self._stopping:
+                if not self._schedule:
+                    self._cond.wait()
+                    continue
+                due = self._schedule[0][0]
+                now = time.monotonic()
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                _, _, chat_id = heapq.heappop(self._schedule)
+                self._scheduled.discard(chat_id)
+                self._in_flight.add(chat_id)
+                return chat_id
+        return None
+
+    def _run(self) -> None:
+        while True:
+            chat_id = self._next_chat()
+            if chat_id is None:
+                return
+            self._chat_bucket(chat_id).acquire()
+            self.global_bucket.acquire()
+            with self._cond:
+                text, kwargs, attempts, queued_at, count = self._take_batch(chat_id)
+            sent, retry_after = self._deliver(chat_id, text, kwargs)
+            with self._cond:
+                self._size -= count
+                if sent:
+                    self.sent += count
+                    send_latency.observe(time.monotonic() - queued_at)
+                elif retry_after is not None and attempts + 1 < self.max_retries:
+                    self._pending[chat_id].appendleft((text, kwargs, attempts + 1, queued_at))
+                    self._size += 1
+                    self._not_before[chat_id] = time.monotonic() + retry_after
+                else:
+                    self.dropped += count
+                    if retry_after is not None:
+                        logger.error(f"Giving up on message to {chat_id} after {self.max_retries} attempts")
+                if not self._pending[chat_id]:
+                    del self._pending[chat_id]
+                self._in_flight.discard(chat_id)
+                self._schedule_chat(chat_id)
+                self._cond.notify_all()
+
+    def _deliver(self, chat_id, text: str, kwargs: Dict[str, Any]) -> Tuple[bool, Optional[float]]:
+        """
+        Send one message.
+
+        :return: (sent, retry_after); retry_after is None when the failure is permanent.
+        """
+        from telebot.apihelper import ApiTelegramException
+
+        try:
+            self.bot.send_message(chat_id, text, **kwargs)
+            return True, None
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                retry_after = (e.result_json or {}).get('parameters', {}).get('retry_after', 1)
+                logger.warning(f"Rate limited sending to {chat_id}, retrying after {retry_after}s")
+                return False, float(retry_after)
+            logger.error(f"Failed to send message to {chat_id}: {str(e)}")
+            return False, None
+        except Exception as e:
+            logger.error(f"Error sending message to {chat_id}, will retry: {str(e)}")
+            return False, 1.0
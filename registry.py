@@ -0,0 +1,357 @@
+import sys
+import zlib
+import threading
+from utils import logger
+from storage import AddressStore
+from chains import DEFAULT_CHAIN
+from address import AddressKey, normalize_address, to_checksum_address
+from typing import Dict, Any, Callable, List, Optional, Set, Tuple, Union
+
+Owner = Tuple[str, str]
+# (shard index, shard count)
+Shard = Tuple[int, int]
+
+
+def shard_of(address: Union[str, AddressKey], shard_count: int) -> int:
+    """
+    Assign an address to a shard by a hash of its 20 bytes, stable across processes and restarts.
+
+    :param address: The Ethereum address in any casing, or its 20-byte key.
+    :param shard_count: Number of shards.
+    :return: Index of the shard owning the address.
+    """
+    return zlib.crc32(address if isinstance(address, bytes) else normalize_address(address)) % shard_count
+
+
+class Subscription:
+    """
+    In-memory record of one watched address of one chat.
+
+    The address is kept only as its 20-byte key, shared with the reverse index, and
+    formatted with its checksum when it is shown.
+    """
+    __slots__ = ('key', 'last_seen_blocks')
+
+    def __init__(self, key: AddressKey, last_seen_blocks: Dict[str, int]) -> None:
+        """
+        :param key: The 20 raw address bytes.
+        :param last_seen_blocks: Dictionary of chain -> checkpoint.
+        """
+        self.key = key
+        # Chain names are interned so every record shares the same few strings
+        self.last_seen_blocks = {sys.intern(chain): block for chain, block in last_seen_blocks.items()}
+
+    @property
+    def ether_address(self) -> str:
+        return to_checksum_address(self.key)
+
+    def info(self) -> Dict[str, Any]:
+        """
+        :return: Address info in the shape the store and handlers use.
+        """
+        return {'ether_address': self.ether_address, 'last_seen_blocks': dict(self.last_seen_blocks)}
+
+
+class SubscriptionRegistry:
+    """
+    Shared in-memory view of every subscription, backed by the AddressStore.
+
+    Holds chat_id -> name -> Subscription, plus a reverse index from the 20-byte
+    address to the (chat_id, name) owners watching it, so matching a transaction
+    is a dictionary lookup and an address watched by several chats is scanned once.
+    Owners are stored as immutable tuples, which subscribers returns without copying.
+    Handlers and scanners share one instance; every change is written through to
+    the store and visible to the scanner immediately.
+
+    Every subscription has a checkpoint per chain, in last_seen_blocks, and
+    each chain's scanner reads and moves only the checkpoints of its own chain.
+
+    A registry created with a shard holds only the addresses of that shard, for a
+    sharded worker process; listeners are told about every add and remove, so
+    changes can be forwarded to the processes that mirror them.
+    """
+
+    def __init__(self, store: AddressStore, shard: Optional[Shard] = None) -> None:
+        """
+        :param store: AddressStore persisting the subscriptions.
+        :param shard: (index, count) to hold only the addresses assigned to that shard.
+        """
+        self.store = store
+        self.shard = shard
+        self._lock = threading.RLock()
+        self._by_chat: Dict[str, Dict[str, Subscription]] = {}
+        self._by_address: Dict[AddressKey, Tuple[Owner, ...]] = {}
+        self._listeners: List[Callable[..., None]] = []
+        self.version = 0
+        for chat_id, user_addresses in store.load_all().items():
+            for name, info in user_addresses.items():
+                if self.owns(info['ether_address']):
+                    self._insert(chat_id, name, info['ether_address'], info['last_seen_blocks'])
+        logger.info(f"Loaded {len(self)} subscriptions for {len(self._by_address)} unique addresses"
+                    + (f" (shard {shard[0] + 1}/{shard[1]})" if shard else ''))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(user_addresses) for user_addresses in self._by_chat.values())
+
+    def owns(self, address: str) -> bool:
+        """
+        :return: Whether address belongs in this registry, i.e. to its shard if it has one.
+        """
+        return self.shard is None or shard_of(address, self.shard[1]) == self.shard[0]
+
+    def add_listener(self, listener: Callable[..., None]) -> None:
+        """
+        Call listener('add', chat_id, name, address, last_seen_blocks) after every add and
+        listener('remove', chat_id, name, address) after every remove.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, *event) -> None:
+        for listener in self._listeners:
+            try:
+                listener(*event)
+            except Exception as e:
+                logger.error(f"Registry listener failed on {event[0]}: {e}")
+
+    def _insert(self, chat_id: str, name: str, address: str, last_seen_blocks: Dict[str, int]) -> None:
+        key = normalize_address(address)
+        # Reuse the key already in the index, so an address watched by several chats is stored once
+        owners = self._by_address.get(key, ())
+        if owners:
+            chat_id_key, first_name = owners[0]
+            key = self._by_chat[chat_id_key][first_name].key
+        self._by_chat.setdefault(chat_id, {})[name] = Subscription(key, last_seen_blocks)
+        self._by_address[key] = owners + ((chat_id, name),)
+        self.version += 1
+
+    def add(self, chat_id, name: str, address: str, last_seen_blocks: Dict[str, int], persist: bool = True) -> bool:
+        """
+        Add a subscription and persist it.
+
+        :param chat_id: Chat ID of the subscribing user.
+        :param name: Name of the address, unique per chat.
+        :param address: The Ethereum address.
+        :param last_seen_blocks: Dictionary of chain -> block from which the address is considered up to date.
+        :param persist: False to only mirror a subscription another process already stored.
+        :return: False if the chat already has an address with this name.
+        """
+        chat_id = str(chat_id)
+        with self._lock:
+            if name in self._by_chat.get(chat_id, {}):
+                return False
+            if persist:
+                self.store.add_address(chat_id, name, address, last_seen_blocks)
+            self._insert(chat_id, name, address, last_seen_blocks)
+        self._notify('add', chat_id, name, address, dict(last_seen_blocks))
+        return True
+
+    def remove(self, chat_id, name: str, persist: bool = True) -> bool:
+        """
+        Remove a subscription on every chain and persist the removal.
+
+        :param chat_id: Chat ID of the subscribing user.
+        :param name: Name of the address.
+        :param persist: False to only mirror a removal another process already stored.
+        :return: False if no such subscription exists.
+        """
+        chat_id = str(chat_id)
+        with self._lock:
+            user_addresses = self._by_chat.get(chat_id, {})
+            subscription = user_addresses.pop(name, None)
+            if subscription is None:
+                return False
+            if not user_addresses:
+                del self._by_chat[chat_id]
+            owners = tuple(owner for owner in self._by_address[subscription.key] if owner != (chat_id, name))
+            if owners:
+                self._by_address[subscription.key] = owners
+            else:
+                del self._by_address[subscription.key]
+            if persist:
+                self.store.remove_address(chat_id, name)
+            self.version += 1
+        self._notify('remove', chat_id, name, subscription.ether_address)
+        return True
+
+    def ensure_chain(self, chain: str, block_number: int) -> int:
+        """
+        Give every subscription without a checkpoint on chain one at block_number, e.g. when
+        a chain is enabled for the first time or the node of a chain was down when an address was added.
+
+        :param chain: Name of the chain.
+        :param block_number: Block from which those subscriptions are considered up to date.
+        :return: Number of subscriptions that got a checkpoint.
+        """
+        with self._lock:
+            missing = []
+            chain = sys.intern(chain)
+            for chat_id, user_addresses in self._by_chat.items():
+                for name, subscription in user_addresses.items():
+                    if chain not in subscription.last_seen_blocks:
+                        subscription.last_seen_blocks[chain] = block_number
+                        missing.append((chat_id, name, subscription.ether_address))
+            if missing:
+                self.store.add_checkpoints(chain, block_number, missing)
+                logger.info(f"Watching {len(missing)} address(es) on {chain} from block {block_number}")
+            return len(missing)
+
+    def get(self, chat_id, name: str) -> Optional[Dict[str, Any]]:
+        """
+        :return: Copy of the address info of a subscription, or None if it does not exist.
+        """
+        with self._lock:
+            subscription = self._by_chat.get(str(chat_id), {}).get(name)
+            return subscription.info() if subscription else None
+
+    def get_user_addresses(self, chat_id) -> Dict[str, Dict[str, Any]]:
+        """
+        :param chat_id: Chat ID of the user.
+        :return: Copy of name -> address info for that user.
+        """
+        with self._lock:
+            return {name: subscription.info() for name, subscription in self._by_chat.get(str(chat_id), {}).items()}
+
+    def subscribers(self, address: Union[str, AddressKey]) -> Tuple[Owner, ...]:
+        """
+        A string address is converted to its 20-byte key on every call (a short-lived bytes object);
+        the index itself is keyed by bytes to keep it small.
+
+        :param address: An Ethereum address in any casing, or its 20-byte key.
+        :return: The (chat_id, name) owners watching it; the tuple is immutable, so it is returned as is.
+        """
+        return self._by_address.get(address if isinstance(address, bytes) else normalize_address(address), ())
+
+    def addresses(self) -> List[str]:
+        """
+        :return: Every distinct watched address, as lowercase 0x-prefixed hex.
+        """
+        with self._lock:
+            return ['0x' + key.hex() for key in self._by_address]
+
+    def chains(self) -> Set[str]:
+        """
+        :return: Names of the chains any subscription has a checkpoint on.
+        """
+        with self._lock:
+            return {chain for user_addresses in self._by_chat.values()
+                    for subscription in user_addresses.values() for chain in subscription.last_seen_blocks}
+
+    def last_seen_block(self, chat_id, name: str, chain: str = DEFAULT_CHAIN) -> Optional[int]:
+        """
+        :return: Checkpoint of a subscription on chain, or None if it does not exist.
+        """
+        subscription = self._by_chat.get(str(chat_id), {}).get(name)
+        return subscription.last_seen_blocks.get(chain) if subscription else None
+
+    def min_last_seen_block(self, chain: str = DEFAULT_CHAIN) -> Optional[int]:
+        """
+        :return: The oldest checkpoint on chain of any subscription, or None if there are none.
+        """
+        with self._lock:
+            return min(
+                (subscription.last_seen_blocks[chain] for user_addresses in self._by_chat.values()
+                 for subscription in user_addresses.values() if chain in subscription.last_seen_blocks),
+                default=None
+            )
+
+    def checkpoints(self, chain: str = DEFAULT_CHAIN) -> Dict[str, int]:
+        """
+        :return: Dictionary of every distinct watched address (lowercase 0x-prefixed hex) -> the oldest
+                 checkpoint on chain among the subscriptions watching it.
+        """
+        with self._lock:
+            checkpoints = {}
+            for key, owners in self._by_address.items():
+                blocks = [self._by_chat[chat_id][name].last_seen_blocks.get(chain) for chat_id, name in owners]
+                blocks = [block for block in blocks if block is not None]
+                if blocks:
+                    checkpoints['0x' + key.hex()] = min(blocks)
+            return checkpoints
+
+    def rewind_last_seen_block(self, block_number: int, chain: str = DEFAULT_CHAIN) -> None:
+        """
+        Undo scanning past block_number after a reorg of chain orphaned the blocks after it.
+
+        Checkpoints past block_number are moved back to it and indexed transactions of the
+        orphaned blocks are removed, both limited to this registry's shard if it has one.
+
+        :param block_number: Last block still on the canonical chain.
+        :param chain: Chain that reorganized.
+        """
+        with self._lock:
+            ahead = []
+            for chat_id, user_addresses in self._by_chat.items():
+                for name, subscription in user_addresses.items():
+                    if subscription.last_seen_blocks.get(chain, block_number) > block_number:
+                        subscription.last_seen_blocks[chain] = block_number
+                        ahead.append((chat_id, name))
+            if self.shard is None:
+                self.store.rewind_last_seen_block(block_number, chain=chain)
+                self.store.delete_transactions_after(block_number, chain=chain)
+            else:
+                if ahead:
+                    self.store.rewind_last_seen_block(block_number, ahead, chain)
+                self.store.delete_transactions_after(block_number, list(self._by_address), chain)
+
+    def flush(self, chains: Optional[List[str]] = None) -> None:
+        """
+        Persist every in-memory checkpoint that is ahead of the store, e.g. before shutdown.
+
+        Checkpoints only ever move forward, so a checkpoint another process has already advanced is never moved back.
+
+        :param chains: Chains whose checkpoints to persist; all chains when omitted.
+        """
+        with self._lock:
+            keys_by_block: Dict[Tuple[str, int], List[Owner]] = {}
+            for chat_id, user_addresses in self._by_chat.items():
+                for name, subscription in user_addresses.items():
+                    for chain, block_number in subscription.last_seen_blocks.items():
+                        if chains is None or chain in chains:
+                            keys_by_block.setdefault((chain, block_number), []).append((chat_id, name))
+            for (chain, block_number), keys in keys_by_block.items():
+                self.store.advance_last_seen_block(block_number, keys, chain)
+
+    def update_last_seen_block(self, chat_id, name: str, block_number: int, chain: str = DEFAULT_CHAIN) -> None:
+        """
+        Move the checkpoint of one subscription on chain forward and persist it.
+        """
+        with self._lock:
+            subscription = self._by_chat.get(str(chat_id), {}).get(name)
+            if subscription is None or subscription.last_seen_blocks.get(chain, block_number) >= block_number:
+                return
+            subscription.last_seen_blocks[chain] = block_number
+            self.store.update_last_seen_block(chat_id, name, block_number, chain)
+
+    def advance_last_seen_block(
+        self,
+        block_number: int,
+        persist: bool = True,
+        shard: Optional[Shard] = None,
+        chain: str = DEFAULT_CHAIN
+    ) -> None:
+        """
+        Move every checkpoint on chain that is behind block_number up to it and persist them in one statement.
+
+        A sharded registry persists only its own subscriptions, since other shards progress independently.
+
+        :param block_number: Block every checkpoint has been scanned up to.
+        :param persist: False to only mirror progress another process already stored.
+        :param shard: (index, count) to move only the checkpoints of addresses in that shard.
+        :param chain: Chain that was scanned.
+        """
+        with self._lock:
+            behind = []
+            for chat_id, user_addresses in self._by_chat.items():
+                for name, subscription in user_addresses.items():
+                    if subscription.last_seen_blocks.get(chain, block_number) < block_number and (
+                        shard is None or shard_of(subscription.key, shard[1]) == shard[0]
+                    ):
+                        subscription.last_seen_blocks[chain] = block_number
+                        behind.append((chat_id, name))
+            if not persist:
+                return
+            if self.shard is None and shard is None:
+                self.store.advance_last_seen_block(block_number, chain=chain)
+            elif behind:
+                self.store.advance_last_seen_block(block_number, behind, chain)
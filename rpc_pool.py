@@ -0,0 +1,262 @@
+import json
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from web3.providers import JSONBaseProvider
+from utils import logger
+from metrics import rpc_latency
+from typing import Any, Dict, List, Optional, Sequence
+
+# Weight of the newest sample in the rolling latency and error-rate averages
+EWMA_ALPHA = 0.2
+# JSON-RPC error codes that reflect the endpoint's state rather than the request: rate limits
+# (429 as sent by some providers, -32005 limit exceeded), resource unavailable and internal errors
+ENDPOINT_ERROR_CODES = frozenset({429, -32002, -32005, -32603})
+
+
+def endpoint_error(response: Any) -> Optional[Dict[str, Any]]:
+    """
+    :param response: A decoded JSON-RPC response or batch response.
+    :return: The first error with one of ENDPOINT_ERROR_CODES, or None if there is none.
+    """
+    for item in response if isinstance(response, list) else [response]:
+        error = item.get('error') if isinstance(item, dict) else None
+        if isinstance(error, dict) and error.get('code') in ENDPOINT_ERROR_CODES:
+            return error
+    return None
+
+
+class RPCEndpoint:
+    """
+    One JSON-RPC endpoint with its own keep-alive session and rolling health statistics.
+    """
+
+    def __init__(self, url: str, pool_size: int = 10) -> None:
+        """
+        :param url: HTTP(S) URL of the endpoint.
+        :param pool_size: Number of keep-alive connections kept open to the endpoint.
+        """
+        self.url = url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+        self.latency = 0.1
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.disabled_until = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.disabled_until
+
+    def score(self) -> float:
+        """
+        :return: Routing cost; lower is healthier. Penalizes latency, recent errors and queued requests.
+        """
+        return self.latency * (1 + self.in_flight) * (1 + 10 * self.error_rate)
+
+    def record_success(self, latency: float) -> None:
+        self.latency += EWMA_ALPHA * (latency - self.latency)
+        self.error_rate -= EWMA_ALPHA * self.error_rate
+        self.consecutive_failures = 0
+
+    def record_failure(self, base_backoff: float, max_backoff: float) -> float:
+        """
+        Count a failure and take the endpoint out of rotation with exponential backoff.
+
+        :return: Seconds the endpoint is disabled for.
+        """
+        self.errors += 1
+        self.error_rate += EWMA_ALPHA * (1 - self.error_rate)
+        self.consecutive_failures += 1
+        backoff = min(max_backoff, base_backoff * 2 ** (self.consecutive_failures - 1))
+        self.disabled_until = time.monotonic() + backoff
+        return backoff
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'latency': self.latency,
+            'error_rate': self.error_rate,
+            'requests': self.requests,
+            'errors': self.errors,
+            'available': self.is_available(time.monotonic())
+        }
+
+
+class RPCPool:
+    """
+    Pool of JSON-RPC endpoints with latency-aware routing and failover.
+
+    Each request goes to the available endpoint with the lowest score. Failing
+    endpoints (connection errors, timeouts, HTTP errors such as 429, and JSON-RPC
+    rate-limit or server errors returned with HTTP 200) are taken out of rotation
+    with exponential backoff and the request is retried on the next one.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        timeout: float = 10,
+        base_backoff: float = 1,
+        max_backoff: float = 300
+    ) -> None:
+        """
+        :param urls: Endpoint URLs.
+        :param timeout: Seconds before a request to one endpoint is abandoned.
+        :param base_backoff: Seconds a failing endpoint is first taken out of rotation.
+        :param max_backoff: Upper bound of the backoff.
+        :raises ValueError: If no URL is given.
+        """
+        if not urls:
+            raise ValueError("RPCPool needs at least one endpoint")
+        self.endpoints = [RPCEndpoint(url) for url in urls]
+        self.timeout = timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(2, len(self.endpoints) * 2),
+                                            thread_name_prefix='rpc-pool')
+        self._health_thread: Optional[threading.Thread] = None
+
+    def _choose(self, exclude: Sequence[RPCEndpoint] = ()) -> RPCEndpoint:
+        """
+        Pick the healthiest available endpoint; if all are backing off, the one that recovers first.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude] or list(self.endpoints)
+            available = [e for e in candidates if e.is_available(now)]
+            if available:
+                endpoint = min(available, key=RPCEndpoint.score)
+            else:
+                endpoint = min(candidates, key=lambda e: e.disabled_until)
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def post(self, payload: Any) -> Any:
+        """
+        Send a JSON-RPC request or batch, failing over across endpoints.
+
+        :param payload: A JSON-RPC request object or a list of them.
+        :return: The decoded JSON response.
+        :raises ConnectionError: If every endpoint failed.
+        """
+        data = json.dumps(payload)
+        tried: List[RPCEndpoint] = []
+        last_error: Optional[Exception] = None
+        for _ in range(len(self.endpoints)):
+            endpoint = self._choose(tried)
+            tried.append(endpoint)
+            started = time.monotonic()
+            try:
+                response = endpoint.session.post(endpoint.url, data=data, timeout=self.timeout)
+                response.raise_for_status()
+                result = response.json()
+                error = endpoint_error(result)
+                if error is not None:
+                    raise ValueError(f"JSON-RPC error {error['code']}: {error.get('message')}")
+                with self._lock:
+                    endpoint.record_success(time.monotonic() - started)
+                return result
+            except Exception as e:
+                last_error = e
+                with self._lock:
+                    backoff = endpoint.record_failure(self.base_backoff, self.max_backoff)
+                logger.warning(f"RPC endpoint {endpoint.url} failed ({e}); out of rotation for {backoff:.0f}s")
+            finally:
+                with self._lock:
+                    endpoint.in_flight -= 1
+        raise ConnectionError(f"All RPC endpoints failed: {last_error}")
+
+    def post_batches(self, batches: List[List[Dict[str, Any]]]) -> List[Any]:
+        """
+        Send several JSON-RPC batches concurrently, spreading them across endpoints.
+
+        The duration of every batch, including any failover, is recorded in the 'batch'
+        latency histogram as it completes, so concurrent batches are not averaged together.
+
+        :param batches: List of JSON-RPC batch payloads.
+        :return: The decoded responses, in the order of batches.
+        """
+        if len(batches) == 1:
+            return [self._post_timed(batches[0])]
+        return list(self._executor.map(self._post_timed, batches))
+
+    def _post_timed(self, batch: List[Dict[str, Any]]) -> Any:
+        started = time.perf_counter()
+        try:
+            return self.post(batch)
+        finally:
+            rpc_latency.observe(time.perf_counter() - started, 'batch')
+
+    def health_check(self) -> None:
+        """
+        Probe every endpoint with eth_blockNumber, updating its statistics.
+        Endpoints that answer are put back into rotation.
+        """
+        for endpoint in self.endpoints:
+            started = time.monotonic()
+            try:
+                response = endpoint.session.post(
+                    endpoint.url,
+                    data=json.dumps({'jsonrpc': '2.0', 'id': 0, 'method': 'eth_blockNumber', 'params': []}),
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                if 'result' not in response.json():
+                    raise ValueError(response.text[:200])
+                with self._lock:
+                    endpoint.record_success(time.monotonic() - started)
+                    endpoint.disabled_until = 0.0
+            except Exception as e:
+                with self._lock:
+                    endpoint.record_failure(self.base_backoff, self.max_backoff)
+                logger.warning(f"Health check of {endpoint.url} failed: {e}")
+
+    def start_health_checks(self, interval: float = 30) -> None:
+        """
+        Run health_check every interval seconds in a daemon thread.
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                self.health_check()
+
+        if self._health_thread is None:
+            self._health_thread = threading.Thread(target=run, name='rpc-health', daemon=True)
+            self._health_thread.start()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """
+        :return: Health statistics of every endpoint.
+        """
+        with self._lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+
+class PooledHTTPProvider(JSONBaseProvider):
+    """
+    Web3 provider that routes every request through an RPCPool.
+    """
+
+    def __init__(self, pool: RPCPool) -> None:
+        """
+        :param pool: The RPCPool requests are sent through.
+        """
+        self.pool = pool
+        super().__init__()
+
+    def __str__(self) -> str:
+        return f"RPC pool {[endpoint.url for endpoint in self.pool.endpoints]}"
+
+    def make_request(self, method, params):
+        request = json.loads(self.encode_rpc_request(method, params))
+        return self.pool.post(request)
@@ -0,0 +1,118 @@
+import signal
+import threading
+from utils import logger
+from typing import Callable, List, Optional
+
+
+class Component:
+    """
+    A long-running part of the bot (command intake, monitor, notifier) run by the Runtime.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[threading.Event], None],
+        stop: Optional[Callable[[], None]] = None
+    ) -> None:
+        """
+        :param name: Name used for the thread and in log messages.
+        :param run: Blocking callable running the component until the event passed to it is set.
+        :param stop: Callable interrupting run, for components that cannot watch the event.
+        """
+        self.name = name
+        self.run = run
+        self.stop = stop
+        self.stopping = threading.Event()
+        self.restarts = 0
+        self.thread: Optional[threading.Thread] = None
+
+
+class Runtime:
+    """
+    Supervisor running every component concurrently in its own thread.
+
+    A component that raises or returns before it was asked to stop is logged and
+    restarted after an exponential backoff, without affecting the others. Shutdown,
+    on SIGINT/SIGTERM or request_shutdown, stops the components one at a time in the
+    reverse order they were added, so intake stops before the monitor and the
+    monitor before the notifier drains its queue.
+    """
+
+    def __init__(self, base_backoff: float = 1, max_backoff: float = 60) -> None:
+        """
+        :param base_backoff: Seconds before a failed component is first restarted.
+        :param max_backoff: Upper bound of the restart backoff.
+        """
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.components: List[Component] = []
+        self._shutdown = threading.Event()
+
+    def add(self, component: Component) -> Component:
+        self.components.append(component)
+        return component
+
+    def _supervise(self, component: Component) -> None:
+        failures = 0
+        while not component.stopping.is_set():
+            try:
+                component.run(component.stopping)
+                if component.stopping.is_set():
+                    break
+                raise RuntimeError("exited unexpectedly")
+            except Exception as e:
+                if component.stopping.is_set():
+                    break
+                failures += 1
+                component.restarts += 1
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** (failures - 1))
+                logger.error(f"Component {component.name} failed ({e}); restarting in {backoff:.0f}s")
+                component.stopping.wait(backoff)
+        logger.info(f"Component {component.name} stopped")
+
+    def start(self) -> None:
+        """
+        Start every component in its own thread.
+        """
+        for component in self.components:
+            component.thread = threading.Thread(target=self._supervise, args=(component,),
+                                                name=component.name, daemon=True)
+            component.thread.start()
+            logger.info(f"Started component {component.name}")
+
+    def request_shutdown(self, *_) -> None:
+        """
+        Ask the runtime to shut down; usable as a signal handler.
+        """
+        self._shutdown.set()
+
+    def stop(self, timeout: float = 30) -> None:
+        """
+        Stop the components in reverse order, waiting up to timeout seconds for each.
+        """
+        for component in reversed(self.components):
+            component.stopping.set()
+            if component.stop is not None:
+                try:
+                    component.stop()
+                except Exception as e:
+                    logger.error(f"Error stopping component {component.name}: {e}")
+            if component.thread is not None:
+                component.thread.join(timeout)
+                if component.thread.is_alive():
+                    logger.warning(f"Component {component.name} did not stop within {timeout}s")
+
+    def run(self) -> None:
+        """
+        Start the components and block until SIGINT or SIGTERM, then stop them gracefully.
+        Must be called from the main thread.
+        """
+        signal.signal(signal.SIGINT, self.request_shutdown)
+        signal.signal(signal.SIGTERM, self.request_shutdown)
+        self.start()
+        # Wait with a timeout so signal handlers get to run in the main thread
+        while not self._shutdown.wait(1):
+            pass
+        logger.info("Shutting down...")
+        self.stop()
@@ -0,0 +1,490 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from utils import logger
+import metrics
+from registry import SubscriptionRegistry
+from mempool import PendingTracker, send_replaced_alert
+from chains import Chain, ETHEREUM
+from cache import receipt_cache
+from log_fetcher import AdaptiveLogFetcher
+from web3_handler import (
+    process_transaction, process_token_transfer, iter_token_transfers, decode_transfer_log,
+    fetch_blocks, fetch_receipts, transaction_index_row, transfer_index_row,
+    DEFAULT_TOPIC_CHUNK_SIZE
+)
+from typing import TYPE_CHECKING, Callable, Dict, Any, Deque, FrozenSet, List, Set, Tuple, Optional
+
+if TYPE_CHECKING:
+    from web3 import Web3
+
+# Number of recently processed blocks whose hashes are kept to detect reorgs
+REORG_BUFFER_SIZE = 64
+# Seconds of chain history a restart may go back to; older checkpoints resume from this far back
+MAX_RESUME_AGE = 24 * 3600
+
+
+class BlockScanner:
+    """
+    Block-driven scanner that fetches every new block once and matches its transactions
+    against the registry's reverse index of all watched addresses.
+
+    The RPC cost of a cycle depends on how many blocks were produced since the last cycle,
+    not on how many addresses are being monitored.
+
+    The hashes of recently processed blocks are kept in a ring buffer. A block whose
+    parentHash does not match the buffer reveals a reorg: one batch of headers locates
+    the fork point and only the blocks after it are processed again, without repeating
+    alerts already sent. Blocks can also be held back until they have a number of
+    confirmations.
+
+    Each scanner covers one chain and moves only that chain's checkpoints; several
+    scanners, one per chain, can share a registry and notifier.
+    """
+
+    def __init__(
+        self,
+        web3: Web3,
+        bot,
+        registry: SubscriptionRegistry,
+        max_blocks_per_cycle: Optional[int] = None,
+        track_tokens: bool = False,
+        topic_chunk_size: int = DEFAULT_TOPIC_CHUNK_SIZE,
+        batch_size: Optional[int] = None,
+        pending: Optional[PendingTracker] = None,
+        confirmations: Optional[int] = None,
+        reorg_buffer_size: int = REORG_BUFFER_SIZE,
+        chain: Chain = ETHEREUM,
+        block_source: Optional[Callable[[range], Dict[int, Any]]] = None,
+        max_resume_blocks: Optional[int] = None
+    ) -> None:
+        """
+        :param web3: Web3 instance used for interacting with the Ethereum network.
+        :param bot: TeleBot or NotificationDispatcher used to send alerts.
+        :param registry: Shared subscription registry.
+        :param max_blocks_per_cycle: Upper bound of blocks scanned in a single cycle; the chain's setting when omitted.
+        :param track_tokens: Also alert on ERC-20/ERC-721 transfers to or from watched addresses.
+        :param topic_chunk_size: Maximum number of addresses OR-ed in one Transfer log filter.
+        :param batch_size: Maximum number of JSON-RPC calls per batch request; the chain's setting when omitted.
+        :param pending: PendingTracker of the mempool watcher, to confirm or replace its pending alerts.
+        :param confirmations: Number of blocks that must be built on a block before it is scanned;
+                              the chain's setting when omitted.
+        :param reorg_buffer_size: Number of recent block hashes kept; deeper reorgs rescan the whole buffer.
+        :param chain: Chain web3 is connected to.
+        :param block_source: Callable returning the blocks of a range with full transactions, used instead of
+                             fetching them from web3 (shard workers receive them from their coordinator).
+        :param max_resume_blocks: How far behind the head scanning may resume, so one stale checkpoint does not
+                                  hold back every subscription; MAX_RESUME_AGE of the chain's blocks when omitted.
+        """
+        self.web3 = web3
+        self.bot = bot
+        self.registry = registry
+        # Serializes cycles; the registry has its own lock, so handlers never wait on a scan
+        self.lock = threading.Lock()
+        self.chain = chain
+        self.max_blocks_per_cycle = max_blocks_per_cycle or chain.max_blocks_per_cycle
+        self.track_tokens = track_tokens
+        self.topic_chunk_size = topic_chunk_size
+        # Kept across cycles, so the log window size it learns carries over
+        self.log_fetcher = AdaptiveLogFetcher(web3)
+        self.batch_size = batch_size or chain.batch_size
+        self.pending = pending
+        self.confirmations = chain.confirmations if confirmations is None else confirmations
+        self.block_source = block_source
+        self.max_resume_blocks = max_resume_blocks or max(1, int(MAX_RESUME_AGE / chain.block_time))
+        self.next_block: Optional[int] = None
+        # Highest block the last planned cycle could scan, i.e. the head minus confirmations
+        self.scan_head: Optional[int] = None
+        # Registry version for which every subscription was last given a checkpoint on this chain
+        self._checked_version: Optional[int] = None
+        # (number, hash, keys of the alerts sent) of the most recently processed blocks
+        self.recent_blocks: Deque[Tuple[int, Any, FrozenSet[tuple]]] = deque(maxlen=reorg_buffer_size)
+        # Alerts sent for orphaned blocks, not repeated when their transactions are mined again
+        self._orphaned_alerts: Set[tuple] = set()
+        self._orphaned_until: Optional[int] = None
+
+    def _start_block(self, latest_block: int) -> int:
+        """
+        Determine where scanning resumes: one past the oldest last_seen_block of any watched address.
+        """
+        oldest = self.registry.min_last_seen_block(self.chain.name)
+        if oldest is None:
+            return latest_block + 1
+        if latest_block - oldest > self.max_resume_blocks:
+            logger.warning(f"{self.chain.label}: oldest checkpoint is {latest_block - oldest} blocks behind, "
+                           f"resuming {self.max_resume_blocks} blocks back; older blocks are not scanned")
+            return latest_block - self.max_resume_blocks + 1
+        return oldest + 1
+
+    def caught_up(self) -> bool:
+        """
+        :return: False while blocks up to the head remain after the last cycle, so the next cycle can start at once.
+        """
+        return self.next_block is None or self.scan_head is None or self.next_block > self.scan_head
+
+    def match_transactions(self, block) -> List[Tuple[Dict[str, Any], str, str, str]]:
+        """
+        Match the transactions of a block against the address index.
+
+        :param block: Block fetched with full_transactions=True.
+        :return: List of (transaction, chat_id, name, address) tuples, one per owner.
+        """
+        matches = []
+        subscribers = self.registry.subscribers
+        for tx in block['transactions']:
+            from_address = tx.get('from')
+            to_address = tx.get('to')
+            from_owners = subscribers(from_address) if from_address else ()
+            to_owners = subscribers(to_address) if to_address else ()
+            # Most transactions match nobody and cost only the two index lookups
+            if from_owners or to_owners:
+                self._append_matches(matches, tx, from_address, from_owners, to_address, to_owners)
+        return matches
+
+    @staticmethod
+    def _append_matches(matches: List[tuple], item, from_address: str, from_owners: Tuple[tuple, ...],
+                        to_address: str, to_owners: Tuple[tuple, ...]) -> None:
+        """
+        Append one match per owner of either side, once for an owner of both sides.
+        """
+        for owner in from_owners:
+            matches.append((item, owner[0], owner[1], from_address))
+        for owner in to_owners:
+            if owner not in from_owners:
+                matches.append((item, owner[0], owner[1], to_address))
+
+    def match_transfer_logs(self, logs) -> List[Tuple[Dict[str, Any], str, str, str]]:
+        """
+        Match decoded Transfer logs against the address index.
+
+        :param logs: Transfer logs returned by get_token_transfers.
+        :return: List of (log, chat_id, name, address) tuples, one per owner.
+        """
+        matches = []
+        subscribers = self.registry.subscribers
+        for log in logs:
+            transfer = decode_transfer_log(log)
+            if transfer is None:
+                continue
+            from_owners = subscribers(transfer['from'])
+            to_owners = subscribers(transfer['to'])
+            if from_owners or to_owners:
+                self._append_matches(matches, log, transfer['from'], from_owners, transfer['to'], to_owners)
+        return matches
+
+    def _unseen_matches(self, block_number: int, matches: List[tuple]) -> List[tuple]:
+        """
+        Drop matches for owners whose last_seen_block already covers block_number.
+
+        The checkpoints are snapshotted before any match is processed: processing advances
+        last_seen_block to this block, which must not suppress further matches within it.
+        """
+        already_seen = set()
+        for _, chat_id, name, _ in matches:
+            last_seen_block = self.registry.last_seen_block(chat_id, name, self.chain.name)
+            # Owners removed since the match count as seen
+            if last_seen_block is None or block_number <= last_seen_block:
+                already_seen.add((chat_id, name))
+        return [match for match in matches if (match[1], match[2]) not in already_seen]
+
+    def index_matches(self, block, matches: List[tuple], token_matches: List[tuple]) -> None:
+        """
+        Write every matched transaction and token transfer of a block to the transaction index,
+        once per watched address however many chats watch it.
+
+        :param block: Block fetched with full transactions.
+        :param matches: Transaction matches returned by match_transactions.
+        :param token_matches: Transfer log matches returned by match_transfer_logs.
+        """
+        rows = {}
+        for tx, _, _, address in matches:
+            row = transaction_index_row(self.web3, tx, address, block['timestamp'], self.chain)
+            rows[(row['address'], row['tx_index'], row['log_index'])] = row
+        for log, _, _, address in token_matches:
+            row = transfer_index_row(self.web3, log, address, self.chain.name)
+            if row is not None:
+                rows[(row['address'], row['tx_index'], row['log_index'])] = row
+        try:
+            self.registry.store.index_transactions(list(rows.values()))
+        except Exception as e:
+            logger.error(f"Error indexing transactions of block {block['number']}: {e}")
+
+    def resolve_pending(self, block) -> Dict[Any, float]:
+        """
+        Settle the pending alerts of the mempool watcher that a block resolves, alerting on replaced transactions.
+
+        :param block: Block fetched with full transactions.
+        :return: Dictionary of hash -> seconds pending, for tracked transactions mined in this block.
+        """
+        confirmed = {}
+        if not self.pending:
+            return confirmed
+        for tx in block['transactions']:
+            pending_for, replaced = self.pending.resolve(tx)
+            if pending_for is not None:
+                confirmed[tx['hash']] = pending_for
+            if replaced is not None:
+                send_replaced_alert(self.bot, *replaced, tx)
+        return confirmed
+
+    def process_block(self, block, token_logs=(), receipts=None, matches=None) -> int:
+        """
+        Send alerts for every matching transaction and token transfer of a block.
+
+        :param block: Block fetched with full transactions.
+        :param token_logs: Transfer logs of this block, when token tracking is enabled.
+        :param receipts: Prefetched receipts keyed by transaction hash.
+        :param matches: Result of match_transactions for this block, when already computed.
+        :return: Number of matches found in the block.
+        """
+        block_number = block['number']
+        receipts = receipts or {}
+        all_matches = self.match_transactions(block) if matches is None else matches
+        all_token_matches = self.match_transfer_logs(token_logs)
+        self.index_matches(block, all_matches, all_token_matches)
+        matches = self._unseen_matches(block_number, all_matches)
+        token_matches = self._unseen_matches(block_number, all_token_matches)
+        if self._orphaned_alerts:
+            matches = [m for m in matches if self._alert_key(m, 'tx') not in self._orphaned_alerts]
+            token_matches = [m for m in token_matches if self._alert_key(m, 'token') not in self._orphaned_alerts]
+        confirmed = self.resolve_pending(block)
+        for tx, chat_id, name, address in matches:
+            process_transaction(self.web3, self.bot, tx, chat_id, name, address, self.registry,
+                                receipts.get(tx['hash']), block['timestamp'], confirmed.get(tx['hash']), self.chain)
+        for log, chat_id, name, address in token_matches:
+            process_token_transfer(self.web3, self.bot, log, chat_id, name, address, self.registry, self.chain)
+        self.recent_blocks.append((block_number, block['hash'], frozenset(
+            [self._alert_key(m, 'tx') for m in matches] + [self._alert_key(m, 'token') for m in token_matches]
+        )))
+        return len(matches) + len(token_matches)
+
+    @staticmethod
+    def _alert_key(match: tuple, kind: str) -> tuple:
+        """
+        Identify an alert independently of the block its transaction was mined in.
+        """
+        tx, chat_id, name, _ = match
+        tx_hash = tx['hash'] if kind == 'tx' else tx['transactionHash']
+        return tx_hash.hex(), chat_id, name, kind
+
+    def extends_chain(self, block) -> bool:
+        """
+        :param block: The next block to process.
+        :return: False if block's parent is not the block processed before it, i.e. the chain reorganized.
+        """
+        if not self.recent_blocks:
+            return True
+        number, block_hash, _ = self.recent_blocks[-1]
+        return number != block['number'] - 1 or block['parentHash'] == block_hash
+
+    def handle_reorg(self, block_number: int) -> int:
+        """
+        Find the last buffered block still on the canonical chain and rewind scanning to it.
+        Must be called with the lock held.
+
+        :param block_number: Number of the block whose parent did not match.
+        :return: The fork point; scanning resumes at the block after it.
+        """
+        headers = fetch_blocks(self.web3, [number for number, _, _ in self.recent_blocks],
+                               batch_size=self.batch_size, chain=self.chain.name)
+        orphaned = []
+        fork = None
+        while self.recent_blocks:
+            number, block_hash, alerts = self.recent_blocks[-1]
+            header = headers.get(number)
+            if header is not None and header['hash'] == block_hash:
+                fork = number
+                break
+            self.recent_blocks.pop()
+            orphaned.append((number, alerts))
+        if fork is None:
+            fork = (orphaned[-1][0] if orphaned else block_number) - 1
+            logger.warning(f"Reorg deeper than {self.recent_blocks.maxlen} blocks, rescanning from block {fork + 1}")
+
+        # Cached headers are keyed by hash, so only the receipts of orphaned blocks must be dropped
+        for number, alerts in orphaned:
+            for tx_hash, _, _, _ in alerts:
+                receipt_cache.discard(tx_hash)
+            self._orphaned_alerts.update(alerts)
+        if orphaned:
+            self._orphaned_until = max(self._orphaned_until or 0, orphaned[0][0])
+        self.registry.rewind_last_seen_block(fork, self.chain.name)
+        self.next_block = fork + 1
+        metrics.chain_reorgs.inc(self.chain.name)
+        logger.warning(f"{self.chain.label} reorg detected at block {block_number}: {len(orphaned)} block(s) orphaned, "
+                       f"resuming from block {fork + 1}")
+        return fork
+
+    def plan_cycle(self, latest_block: int) -> range:
+        """
+        Determine which blocks the next cycle should scan.
+        Must be called with the lock held.
+
+        :param latest_block: Current chain head; blocks without enough confirmations are left for later.
+        :return: Range of block numbers to scan, possibly empty.
+        """
+        # Only blocks with enough blocks built on them are scanned
+        latest_block -= self.confirmations
+        self.scan_head = latest_block
+        if not len(self.registry):
+            self.next_block = latest_block + 1
+            return range(0)
+        if self._checked_version != self.registry.version:
+            # Subscriptions without a checkpoint on this chain (e.g. the chain was just enabled) start at the head
+            self._checked_version = self.registry.version
+            self.registry.ensure_chain(self.chain.name, latest_block)
+        if self.next_block is None:
+            self.next_block = self._start_block(latest_block)
+        to_block = min(latest_block, self.next_block + self.max_blocks_per_cycle - 1)
+        return range(self.next_block, to_block + 1)
+
+    def match_blocks(self, blocks: Dict[int, Any]) -> Dict[int, List[tuple]]:
+        """
+        Match the transactions of every block once, so the receipts of the matches can
+        be fetched together before process_blocks sends the alerts.
+
+        Blocks from the first one that does not extend the chain on are skipped, since
+        process_blocks stops there to handle the reorg.
+
+        :param blocks: Dictionary of block number -> block with full transactions.
+        :return: Dictionary of block number -> matches of match_transactions.
+        """
+        matches_by_block = {}
+        parent_hash = None
+        for block_number in sorted(blocks):
+            block = blocks[block_number]
+            if not (self.extends_chain(block) if parent_hash is None else block['parentHash'] == parent_hash):
+                break
+            parent_hash = block['hash']
+            matches_by_block[block_number] = self.match_transactions(block)
+        return matches_by_block
+
+    def matched_tx_hashes(self, matches_by_block: Dict[int, List[tuple]]) -> List[Any]:
+        """
+        Collect the hashes of every matched transaction that will produce an alert.
+
+        :param matches_by_block: Matches returned by match_blocks.
+        :return: List of transaction hashes.
+        """
+        return [
+            match[0]['hash']
+            for block_number, matches in matches_by_block.items()
+            for match in self._unseen_matches(block_number, matches)
+            if self._alert_key(match, 'tx') not in self._orphaned_alerts
+        ]
+
+    @staticmethod
+    def group_logs_by_block(logs) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        :param logs: Logs ordered by block number.
+        :return: Dictionary of block number -> logs of that block.
+        """
+        logs_by_block: Dict[int, List[Dict[str, Any]]] = {}
+        for log in logs:
+            logs_by_block.setdefault(log['blockNumber'], []).append(log)
+        return logs_by_block
+
+    def process_blocks(
+        self,
+        block_numbers: range,
+        blocks: Dict[int, Any],
+        token_logs_by_block: Dict[int, List[Dict[str, Any]]],
+        receipts: Dict[Any, Any],
+        matches_by_block: Optional[Dict[int, List[tuple]]] = None
+    ) -> int:
+        """
+        Process fetched blocks in order, advancing checkpoints after each one.
+        Must be called with the lock held.
+
+        :param block_numbers: Range of blocks planned for this cycle.
+        :param blocks: Dictionary of block number -> block with full transactions.
+        :param token_logs_by_block: Transfer logs grouped by block number.
+        :param receipts: Prefetched receipts keyed by transaction hash.
+        :param matches_by_block: Matches returned by match_blocks; missing blocks are matched here.
+        :return: Number of blocks processed.
+        """
+        scanned = 0
+        for block_number in block_numbers:
+            block = blocks[block_number]
+            if not self.extends_chain(block):
+                # The rest of the range was fetched from the old fork; the next cycle resumes after the fork point
+                self.handle_reorg(block_number)
+                break
+            matches = self.process_block(
+                block, token_logs_by_block.get(block_number, ()), receipts,
+                (matches_by_block or {}).get(block_number)
+            )
+            if matches:
+                logger.info(f"{self.chain.label} block {block_number}: {matches} matching transaction(s)")
+            self.next_block = block_number + 1
+            scanned += 1
+            if self._orphaned_until is not None and block_number >= self._orphaned_until:
+                if self._orphaned_alerts:
+                    logger.info(f"{len(self._orphaned_alerts)} alerted transaction(s) were not mined again after the reorg")
+                self._orphaned_alerts.clear()
+                self._orphaned_until = None
+
+        if scanned:
+            self.registry.advance_last_seen_block(self.next_block - 1, chain=self.chain.name)
+            metrics.blocks_scanned.inc(self.chain.name, amount=scanned)
+            metrics.next_block.set(self.next_block, self.chain.name)
+        return scanned
+
+    def scan_new_blocks(self) -> int:
+        """
+        Scan every block produced since the previous cycle, bounded by max_blocks_per_cycle.
+
+        :return: Number of blocks scanned.
+        """
+        with metrics.profiler.cycle(), metrics.cycle_duration.time(self.chain.name):
+            return self._scan_new_blocks()
+
+    def _scan_new_blocks(self) -> int:
+        latest_block = self.web3.eth.block_number
+        metrics.chain_head.set(latest_block, self.chain.name)
+        with self.lock:
+            block_numbers = self.plan_cycle(latest_block)
+            if not block_numbers:
+                return 0
+            if not self.track_tokens:
+                return self.scan_range(block_numbers, {})
+
+            # Blocks are processed one Transfer log window at a time and the checkpoints advance
+            # after each window, so a restart during a long catch-up resumes after the last complete window
+            scanned = 0
+            for window_from, window_to, logs in iter_token_transfers(
+                self.web3, self.registry.addresses(), block_numbers.start, block_numbers.stop - 1,
+                self.topic_chunk_size, self.log_fetcher
+            ):
+                window = range(window_from, window_to + 1)
+                window_scanned = self.scan_range(window, self.group_logs_by_block(logs))
+                scanned += window_scanned
+                if window_scanned < len(window):
+                    # A reorg was found; the next cycle resumes after the fork point
+                    break
+            return scanned
+
+    def scan_range(self, block_numbers: range, token_logs_by_block: Dict[int, List[Dict[str, Any]]]) -> int:
+        """
+        Fetch the blocks of a range and the receipts of their matches, then process them.
+        Must be called with the lock held.
+
+        :param block_numbers: Consecutive blocks to scan.
+        :param token_logs_by_block: Transfer logs of the range grouped by block number.
+        :return: Number of blocks processed.
+        """
+        # One batch for every block in the range, then one batch for the receipts of all matches
+        if self.block_source is not None:
+            blocks = self.block_source(block_numbers)
+        else:
+            blocks = fetch_blocks(self.web3, block_numbers, full_transactions=True, batch_size=self.batch_size,
+                                  chain=self.chain.name)
+        missing = [n for n, block in blocks.items() if block is None]
+        if missing:
+            raise ValueError(f"Node did not return blocks {missing}")
+        matches_by_block = self.match_blocks(blocks)
+        matched_hashes = self.matched_tx_hashes(matches_by_block)
+        receipts = fetch_receipts(self.web3, matched_hashes, self.batch_size) if matched_hashes else {}
+
+        return self.process_blocks(block_numbers, blocks, token_logs_by_block, receipts, matches_by_block)
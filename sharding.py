@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from collections import OrderedDict
+import metrics
+from utils import logger
+from registry import SubscriptionRegistry, shard_of
+from chains import DEFAULT_CHAIN
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from web3 import Web3
+
+# Seconds between checks for dead workers
+SUPERVISE_INTERVAL = 5
+# Blocks kept by the coordinator for workers that are behind the others
+BLOCK_BUFFER_SIZE = 1024
+# Seconds a worker waits for the blocks it asked the coordinator for
+BLOCK_REQUEST_TIMEOUT = 120
+
+
+class QueueNotifier:
+    """
+    Stand-in for the bot inside a shard worker: alerts are put on a queue read by the
+    coordinator, which delivers them through the single NotificationDispatcher.
+    """
+
+    def __init__(self, alerts: multiprocessing.Queue) -> None:
+        """
+        :param alerts: Queue shared with the coordinator.
+        """
+        self.alerts = alerts
+
+    def send_message(self, chat_id, text: str, **kwargs) -> bool:
+        self.alerts.put(('alert', chat_id, text, kwargs))
+        return True
+
+
+def run_shard(index: int, shard_count: int, config: Dict[str, Any], alerts: multiprocessing.Queue,
+              control: multiprocessing.Queue, requests: multiprocessing.Queue, blocks: multiprocessing.Queue) -> None:
+    """
+    Entry point of a shard worker process.
+
+    The worker loads only the addresses of its shard from the store and runs its own
+    BlockScanner and RPC sessions. Blocks are fetched once by the coordinator, which sends
+    each worker only the transactions touching its addresses; receipts, token log queries
+    and alert formatting are split between the workers. Subscription changes arrive on
+    the control queue.
+
+    :param index: Index of this shard.
+    :param shard_count: Total number of shards.
+    :param config: Monitor settings: infura_project_id, rpc_urls, db_path, track_tokens,
+                   batch_size, confirmations, poll_interval and optionally max_blocks_per_cycle.
+    :param alerts: Queue for alerts and progress reports to the coordinator.
+    :param control: Queue of ('add', ...), ('remove', ...) and ('stop',) messages for this worker.
+    :param requests: Queue on which the worker asks the coordinator for blocks.
+    :param blocks: Queue of the coordinator's replies to this worker's requests.
+    """
+    from storage import AddressStore
+    from scanner import BlockScanner
+    from web3_handler import init_web3
+
+    def receive_blocks(block_numbers: range) -> Dict[int, Any]:
+        requests.put((index, block_numbers.start, block_numbers.stop))
+        deadline = time.monotonic() + BLOCK_REQUEST_TIMEOUT
+        while True:
+            try:
+                start, stop, received, error = blocks.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise TimeoutError(f"No blocks {block_numbers.start}-{block_numbers.stop - 1} from the coordinator")
+            # Replies to an earlier request that timed out are skipped
+            if (start, stop) == (block_numbers.start, block_numbers.stop):
+                break
+        if error is not None:
+            raise ValueError(error)
+        return received
+
+    web3 = init_web3(config['infura_project_id'], config['rpc_urls'])
+    store = AddressStore(config['db_path'], json_path=None)
+    registry = SubscriptionRegistry(store, shard=(index, shard_count))
+    scanner = BlockScanner(web3, QueueNotifier(alerts), registry, max_blocks_per_cycle=config.get('max_blocks_per_cycle'),
+                           track_tokens=config['track_tokens'], batch_size=config['batch_size'],
+                           confirmations=config.get('confirmations', 0), block_source=receive_blocks)
+
+    while True:
+        scanned = 0
+        try:
+            scanned = scanner.scan_new_blocks()
+            if scanned:
+                logger.info(f"Shard {index + 1}/{shard_count}: scanned {scanned} block(s), next block {scanner.next_block}")
+            alerts.put(('progress', index, scanner.next_block, metrics.chain_head.value(DEFAULT_CHAIN)))
+        except Exception as e:
+            logger.error(f"Unexpected error in shard {index + 1}/{shard_count}: {e}")
+
+        # While catching up, only pending control messages are handled before the next cycle
+        deadline = time.monotonic() + (0 if scanned and not scanner.caught_up() else config['poll_interval'])
+        while True:
+            try:
+                message = control.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if message[0] == 'stop':
+                store.close()
+                return
+            if message[0] == 'add':
+                registry.add(*message[1:], persist=False)
+            elif message[0] == 'remove':
+                registry.remove(*message[1:3], persist=False)
+
+
+class ShardCoordinator:
+    """
+    Runs the monitor as N worker processes, each owning the addresses whose hash maps to it.
+
+    Adds and removes made through the shared registry (by the bot handlers) are forwarded
+    to the owning worker, so shards stay balanced by hash as the address set changes.
+    Alerts from every worker are delivered by the single notifier of this process, and
+    workers that die are restarted and reload their shard from the store.
+
+    Blocks are fetched from the node once, by this process, whatever the number of
+    workers. Each worker asks for the blocks it is about to scan and receives their
+    headers with only the transactions that touch an address of its shard. Recently
+    fetched blocks are kept for workers that are behind the others, and refetched for
+    a worker that goes back after a reorg.
+
+    The workers scan Ethereum; other configured chains are scanned in this process.
+    """
+
+    def __init__(
+        self,
+        registry: SubscriptionRegistry,
+        notifier,
+        shard_count: int,
+        config: Dict[str, Any]
+    ) -> None:
+        """
+        :param registry: The registry of every subscription, shared with the bot handlers.
+        :param notifier: NotificationDispatcher delivering every shard's alerts.
+        :param shard_count: Number of worker processes.
+        :param config: Monitor settings passed to run_shard.
+        """
+        self.registry = registry
+        self.notifier = notifier
+        self.shard_count = shard_count
+        self.config = config
+        self._context = multiprocessing.get_context('spawn')
+        self._alerts = self._context.Queue()
+        self._controls = [self._context.Queue() for _ in range(shard_count)]
+        self._requests = self._context.Queue()
+        self._replies = [self._context.Queue() for _ in range(shard_count)]
+        self.web3: Optional[Web3] = None
+        # Block number -> (header, [(transaction, shards of its watched addresses)])
+        self._blocks: OrderedDict[int, Tuple[Dict[str, Any], List[Tuple[Any, Set[int]]]]] = OrderedDict()
+        # Shard index -> last block sent to that worker
+        self._sent: Dict[int, int] = {}
+        self._workers: List[Optional[multiprocessing.Process]] = [None] * shard_count
+        self._progress: Dict[int, int] = {}
+        self._stopping = threading.Event()
+        self._workers_stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+        registry.add_listener(self._on_registry_change)
+
+    def _spawn(self, index: int) -> None:
+        worker = self._context.Process(
+            target=run_shard, name=f"shard-{index}",
+            args=(index, self.shard_count, self.config, self._alerts, self._controls[index], self._requests,
+                  self._replies[index]), daemon=True
+        )
+        worker.start()
+        self._workers[index] = worker
+        logger.info(f"Started shard {index + 1}/{self.shard_count} (pid {worker.pid})")
+
+    def start(self, web3: Web3) -> None:
+        """
+        Start the workers, the alert pump, the block server and the supervisor.
+
+        :param web3: Web3 instance the blocks of every shard are fetched with.
+        """
+        self.web3 = web3
+        for index in range(self.shard_count):
+            self._spawn(index)
+        for target, name in ((self._pump, 'shard-alerts'), (self._serve_blocks, 'shard-blocks'),
+                             (self._supervise, 'shard-supervisor')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10) -> None:
+        """
+        Ask every worker to stop after its current cycle, terminating those that do not.
+        """
+        self._stopping.set()
+        for control in self._controls:
+            control.put(('stop',))
+        for worker in self._workers:
+            if worker is not None:
+                worker.join(timeout)
+                if worker.is_alive():
+                    worker.terminate()
+        # Let the pump hand the workers' last alerts to the notifier before it exits
+        self._workers_stopped.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _on_registry_change(self, action: str, chat_id, name: str, address: str, *rest) -> None:
+        self._controls[shard_of(address, self.shard_count)].put((action, chat_id, name, address, *rest))
+
+    def _pump(self) -> None:
+        """
+        Deliver alerts from the workers and mirror their progress into this process.
+        """
+        while True:
+            try:
+                message = self._alerts.get(timeout=1)
+            except queue.Empty:
+                if self._workers_stopped.is_set():
+                    return
+                continue
+            try:
+                if message[0] == 'alert':
+                    _, chat_id, text, kwargs = message
+                    self.notifier.send_message(chat_id, text, **kwargs)
+                elif message[0] == 'progress':
+                    _, index, next_block, head = message
+                    if next_block is not None and self._progress.get(index) != next_block:
+                        self._progress[index] = next_block
+                        self.registry.advance_last_seen_block(next_block - 1, persist=False,
+                                                              shard=(index, self.shard_count))
+                        metrics.next_block.set(min(self._progress.values()), DEFAULT_CHAIN)
+                    if head is not None:
+                        metrics.chain_head.set(head, DEFAULT_CHAIN)
+            except Exception as e:
+                logger.error(f"Error handling shard message {message[0]}: {e}")
+
+    def _serve_blocks(self) -> None:
+        """
+        Answer the workers' requests for blocks until the coordinator stops.
+        """
+        while not self._stopping.is_set():
+            try:
+                index, start, stop = self._requests.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                reply = (start, stop, self.shard_blocks(index, range(start, stop)), None)
+            except Exception as e:
+                logger.error(f"Error fetching blocks {start}-{stop - 1} for shard {index + 1}/{self.shard_count}: {e}")
+                reply = (start, stop, None, str(e))
+            self._replies[index].put(reply)
+
+    def shard_blocks(self, index: int, block_numbers: range) -> Dict[int, Dict[str, Any]]:
+        """
+        Get the blocks of a range as seen by one shard, fetching those not already buffered.
+
+        :param index: Index of the shard asking for the blocks.
+        :param block_numbers: Consecutive blocks the worker is about to scan.
+        :return: Dictionary of block number -> header fields and the transactions touching the shard.
+        """
+        from web3_handler import fetch_blocks
+
+        if block_numbers.start <= self._sent.get(index, -1):
+            # The worker went back, after a reorg or a restart: what was buffered may be orphaned
+            for number in [number for number in self._blocks if number >= block_numbers.start]:
+                del self._blocks[number]
+        missing = [number for number in block_numbers if number not in self._blocks]
+        if missing:
+            fetched = fetch_blocks(self.web3, missing, full_transactions=True, batch_size=self.config['batch_size'])
+            for number in missing:
+                if fetched.get(number) is None:
+                    raise ValueError(f"Node did not return block {number}")
+                self._blocks[number] = self._split_block(fetched[number])
+
+        shard_view = {}
+        for number in block_numbers:
+            header, transactions = self._blocks[number]
+            shard_view[number] = dict(header, transactions=[tx for tx, shards in transactions if index in shards])
+        self._sent[index] = block_numbers.stop - 1
+        while len(self._blocks) > BLOCK_BUFFER_SIZE:
+            self._blocks.popitem(last=False)
+        return shard_view
+
+    def _split_block(self, block) -> Tuple[Dict[str, Any], List[Tuple[Any, Set[int]]]]:
+        """
+        Keep the header fields of a block and its transactions touching a watched address,
+        each with the shards of the addresses it touches.
+        """
+        subscribers = self.registry.subscribers
+        transactions = []
+        for tx in block['transactions']:
+            shards = {shard_of(address, self.shard_count) for address in (tx.get('from'), tx.get('to'))
+                      if address and subscribers(address)}
+            if shards:
+                transactions.append((tx, shards))
+        header = {field: block[field] for field in ('number', 'hash', 'parentHash', 'timestamp')}
+        return header, transactions
+
+    def _supervise(self) -> None:
+        while not self._stopping.wait(SUPERVISE_INTERVAL):
+            for index, worker in enumerate(self._workers):
+                if worker is not None and not worker.is_alive() and not self._stopping.is_set():
+                    logger.error(f"Shard {index + 1}/{self.shard_count} exited with {worker.exitcode}, restarting")
+                    self._spawn(index)
+
+    def stats(self) -> Dict[int, Dict[str, Any]]:
+        """
+        :return: Dictionary of shard index -> pid, liveness and next block.
+        """
+        return {
+            index: {
+                'pid': worker.pid if worker else None,
+                'alive': bool(worker and worker.is_alive()),
+                'next_block': self._progress.get(index)
+            }
+            for index, worker in enumerate(self._workers)
+        }
+
+
+def default_shard_count() -> int:
+    """
+    :return: One shard per available CPU core.
+    """
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
@@ -0,0 +1,418 @@
+import os
+import json
+import sqlite3
+import threading
+from utils import logger
+from chains import DEFAULT_CHAIN
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+ADDRESSES_TABLE = """
+CREATE TABLE IF NOT EXISTS addresses (
+    chat_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    chain TEXT NOT NULL DEFAULT 'ethereum',
+    ether_address TEXT NOT NULL,
+    last_seen_block INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, name, chain)
+);
+"""
+TRANSACTIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS transactions (
+    chain TEXT NOT NULL DEFAULT 'ethereum',
+    address BLOB NOT NULL,
+    block_number INTEGER NOT NULL,
+    tx_index INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    from_address TEXT,
+    to_address TEXT,
+    amount TEXT NOT NULL,
+    timestamp INTEGER,
+    PRIMARY KEY (address, chain, block_number, tx_index, log_index)
+) WITHOUT ROWID;
+"""
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_addresses_chat_id ON addresses (chat_id);
+CREATE INDEX IF NOT EXISTS idx_addresses_ether_address ON addresses (ether_address COLLATE NOCASE);
+"""
+SCHEMA = ADDRESSES_TABLE + TRANSACTIONS_TABLE + INDEXES
+
+# Columns of a transactions row, in insert order
+TRANSACTION_COLUMNS = (
+    'chain', 'address', 'block_number', 'tx_index', 'log_index', 'tx_hash',
+    'from_address', 'to_address', 'amount', 'timestamp'
+)
+# Position of an indexed transaction within an address's history: (block_number, tx_index, log_index)
+Cursor = Tuple[int, int, int]
+
+
+class AddressStore:
+    """
+    SQLite-backed store of the watched addresses, in WAL mode.
+
+    Writes touch only the rows that changed, so updating a checkpoint no longer
+    rewrites every address, and every write is an atomic transaction.
+
+    An address has one row per chain it is watched on, each with its own checkpoint.
+    """
+
+    def __init__(self, db_path: str = 'addresses.db', json_path: Optional[str] = 'addresses.json') -> None:
+        """
+        :param db_path: Path to the SQLite database file.
+        :param json_path: Legacy JSON file imported once when the database is empty.
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate_schema()
+        self._conn.executescript(SCHEMA)
+        if json_path:
+            self.migrate_from_json(json_path)
+
+    def _columns(self, table: str) -> List[str]:
+        return [row[1] for row in self._query(f"PRAGMA table_info({table})")]
+
+    def _migrate_schema(self) -> None:
+        """
+        Add the chain column to tables created before multi-chain support; existing rows belong to Ethereum.
+
+        The column is part of the primary keys, so each table is rebuilt in one transaction.
+        """
+        statements = []
+        for table, ddl in (('addresses', ADDRESSES_TABLE), ('transactions', TRANSACTIONS_TABLE)):
+            columns = self._columns(table)
+            if not columns or 'chain' in columns:
+                continue
+            statements += [
+                (f"ALTER TABLE {table} RENAME TO {table}_v1", ()),
+                (ddl.strip().rstrip(';'), ()),
+                (f"INSERT INTO {table} (chain, {', '.join(columns)}) "
+                 f"SELECT '{DEFAULT_CHAIN}', {', '.join(columns)} FROM {table}_v1", ()),
+                (f"DROP TABLE {table}_v1", ()),
+            ]
+        if statements:
+            self._transaction(statements)
+            logger.info(f"Migrated {self.db_path} to per-chain addresses and transactions")
+
+    def _transaction(self, statements: Iterable[Tuple[str, Any]]) -> None:
+        """
+        Run (sql, params) statements in a single transaction; params may be a list of rows for executemany.
+        """
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    if isinstance(params, list):
+                        cursor.executemany(sql, params)
+                    else:
+                        cursor.execute(sql, params)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def _query(self, sql: str, params: Tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        Import addresses from the legacy JSON file if the database is still empty.
+
+        Legacy records have a single last_seen_block, which becomes their Ethereum checkpoint.
+        The JSON file is renamed to <json_path>.migrated afterwards, so the import runs once.
+
+        :param json_path: Path to the legacy addresses.json file.
+        :return: Number of imported addresses.
+        """
+        if not os.path.exists(json_path) or self._query("SELECT 1 FROM addresses LIMIT 1"):
+            return 0
+        try:
+            with open(json_path, 'r') as file:
+                addresses_by_user = json.load(file)
+        except Exception as e:
+            logger.error(f"Error reading {json_path} for migration: {e}")
+            return 0
+
+        rows = []
+        for chat_id, user_addresses in addresses_by_user.items():
+            for name, info in user_addresses.items():
+                checkpoints = info.get('last_seen_blocks') or {info.get('chain', DEFAULT_CHAIN): info['last_seen_block']}
+                rows += [(str(chat_id), name, chain, info['ether_address'], block_number)
+                         for chain, block_number in checkpoints.items()]
+        self._transaction([(
+            "INSERT OR REPLACE INTO addresses (chat_id, name, chain, ether_address, last_seen_block) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows
+        )])
+        os.replace(json_path, f"{json_path}.migrated")
+        logger.info(f"Migrated {len(rows)} address checkpoints from {json_path} to {self.db_path}")
+        return len(rows)
+
+    @staticmethod
+    def _group(rows) -> Dict[str, Dict[str, Any]]:
+        """
+        Fold (name, chain, ether_address, last_seen_block) rows into name -> address info.
+        """
+        addresses: Dict[str, Dict[str, Any]] = {}
+        for name, chain, ether_address, last_seen_block in rows:
+            info = addresses.setdefault(name, {'ether_address': ether_address, 'last_seen_blocks': {}})
+            info['last_seen_blocks'][chain] = last_seen_block
+        return addresses
+
+    def load_all(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        :return: Dictionary of chat_id -> name -> {'ether_address', 'last_seen_blocks': {chain: block}}.
+        """
+        rows_by_user: Dict[str, list] = {}
+        for chat_id, *row in self._query(
+            "SELECT chat_id, name, chain, ether_address, last_seen_block FROM addresses"
+        ):
+            rows_by_user.setdefault(chat_id, []).append(row)
+        return {chat_id: self._group(rows) for chat_id, rows in rows_by_user.items()}
+
+    def get_user_addresses(self, chat_id) -> Dict[str, Dict[str, Any]]:
+        """
+        :param chat_id: Chat ID of the user.
+        :return: Dictionary of name -> {'ether_address', 'last_seen_blocks'} for that user.
+        """
+        return self._group(self._query(
+            "SELECT name, chain, ether_address, last_seen_block FROM addresses WHERE chat_id = ?", (str(chat_id),)
+        ))
+
+    def save_all(self, addresses_by_user: Dict[str, Dict[str, Dict[str, Any]]]) -> int:
+        """
+        Make the database match addresses_by_user, writing only the rows that differ.
+
+        :param addresses_by_user: Dictionary of chat_id -> name -> address info.
+        :return: Number of rows inserted, updated or deleted.
+        """
+        existing = {
+            (chat_id, name, chain): (ether_address, last_seen_block)
+            for chat_id, name, chain, ether_address, last_seen_block in self._query(
+                "SELECT chat_id, name, chain, ether_address, last_seen_block FROM addresses"
+            )
+        }
+        wanted = {
+            (str(chat_id), name, chain): (info['ether_address'], last_seen_block)
+            for chat_id, user_addresses in addresses_by_user.items()
+            for name, info in user_addresses.items()
+            for chain, last_seen_block in info['last_seen_blocks'].items()
+        }
+        upserts = [key + value for key, value in wanted.items() if existing.get(key) != value]
+        deletes = [key for key in existing if key not in wanted]
+        if upserts or deletes:
+            self._transaction([
+                ("INSERT OR REPLACE INTO addresses (chat_id, name, chain, ether_address, last_seen_block) "
+                 "VALUES (?, ?, ?, ?, ?)", upserts),
+                ("DELETE FROM addresses WHERE chat_id = ? AND name = ? AND chain = ?", deletes),
+            ])
+        return len(upserts) + len(deletes)
+
+    def add_address(self, chat_id, name: str, ether_address: str, last_seen_blocks: Dict[str, int]) -> None:
+        """
+        Insert or replace a watched address, with one checkpoint per chain.
+        """
+        self._transaction([(
+            "INSERT OR REPLACE INTO addresses (chat_id, name, chain, ether_address, last_seen_block) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(str(chat_id), name, chain, ether_address, block_number)
+             for chain, block_number in last_seen_blocks.items()]
+        )])
+
+    def add_checkpoints(self, chain: str, block_number: int, subscriptions: List[Tuple[str, str, str]]) -> None:
+        """
+        Give watched addresses a checkpoint on a chain they have none on yet.
+
+        :param chain: Name of the chain.
+        :param block_number: Block from which the addresses are considered up to date.
+        :param subscriptions: (chat_id, name, ether_address) of the addresses.
+        """
+        self._transaction([(
+            "INSERT OR IGNORE INTO addresses (chat_id, name, chain, ether_address, last_seen_block) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(str(chat_id), name, chain, ether_address, block_number)
+             for chat_id, name, ether_address in subscriptions]
+        )])
+
+    def remove_address(self, chat_id, name: str) -> bool:
+        """
+        Delete a watched address on every chain.
+
+        :return: True if the address existed.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM addresses WHERE chat_id = ? AND name = ?", (str(chat_id), name)
+            )
+            return cursor.rowcount > 0
+
+    def update_last_seen_block(self, chat_id, name: str, block_number: int, chain: str = DEFAULT_CHAIN) -> None:
+        """
+        Update the checkpoint of a single watched address on one chain.
+        """
+        self._transaction([(
+            "UPDATE addresses SET last_seen_block = ? WHERE chat_id = ? AND name = ? AND chain = ?",
+            (block_number, str(chat_id), name, chain)
+        )])
+
+    def advance_last_seen_block(
+        self,
+        block_number: int,
+        keys: Optional[List[Tuple[str, str]]] = None,
+        chain: str = DEFAULT_CHAIN
+    ) -> None:
+        """
+        Move the checkpoint of every address that is behind block_number up to it, in one statement.
+
+        :param block_number: Block every checkpoint has been scanned up to.
+        :param keys: (chat_id, name) of the addresses to move; all addresses when omitted.
+        :param chain: Chain the checkpoints belong to.
+        """
+        if keys is None:
+            self._transaction([(
+                "UPDATE addresses SET last_seen_block = ? WHERE chain = ? AND last_seen_block < ?",
+                (block_number, chain, block_number)
+            )])
+            return
+        self._transaction([(
+            "UPDATE addresses SET last_seen_block = ? "
+            "WHERE chat_id = ? AND name = ? AND chain = ? AND last_seen_block < ?",
+            [(block_number, str(chat_id), name, chain, block_number) for chat_id, name in keys]
+        )])
+
+    def rewind_last_seen_block(
+        self,
+        block_number: int,
+        keys: Optional[List[Tuple[str, str]]] = None,
+        chain: str = DEFAULT_CHAIN
+    ) -> None:
+        """
+        Move every checkpoint that is past block_number back to it, after a chain reorg.
+
+        :param block_number: Last block still on the canonical chain.
+        :param keys: (chat_id, name) of the addresses to move; all addresses when omitted.
+        :param chain: Chain that reorganized.
+        """
+        if keys is None:
+            self._transaction([(
+                "UPDATE addresses SET last_seen_block = ? WHERE chain = ? AND last_seen_block > ?",
+                (block_number, chain, block_number)
+            )])
+            return
+        self._transaction([(
+            "UPDATE addresses SET last_seen_block = ? "
+            "WHERE chat_id = ? AND name = ? AND chain = ? AND last_seen_block > ?",
+            [(block_number, str(chat_id), name, chain, block_number) for chat_id, name in keys]
+        )])
+
+    def delete_transactions_after(
+        self,
+        block_number: int,
+        addresses: Optional[List[bytes]] = None,
+        chain: str = DEFAULT_CHAIN
+    ) -> None:
+        """
+        Remove indexed transactions of blocks past block_number, orphaned by a chain reorg.
+
+        :param block_number: Last block still on the canonical chain.
+        :param addresses: 20-byte addresses whose rows to remove; all addresses when omitted.
+        :param chain: Chain that reorganized.
+        """
+        if addresses is None:
+            self._transaction([(
+                "DELETE FROM transactions WHERE chain = ? AND block_number > ?", (chain, block_number)
+            )])
+            return
+        self._transaction([(
+            "DELETE FROM transactions WHERE address = ? AND chain = ? AND block_number > ?",
+            [(address, chain, block_number) for address in addresses]
+        )])
+
+    def index_transactions(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Add matched transactions to the local transaction index, in one transaction.
+
+        Rows are keyed by (address, chain, block_number, tx_index, log_index); a native
+        transfer uses log_index -1, token transfers the index of their Transfer log.
+        Rows that are already indexed are left unchanged, so rescanning is harmless.
+
+        :param rows: Dictionaries with the keys of TRANSACTION_COLUMNS; address is the 20-byte form.
+        """
+        if not rows:
+            return
+        self._transaction([(
+            f"INSERT OR IGNORE INTO transactions ({', '.join(TRANSACTION_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(TRANSACTION_COLUMNS))})",
+            [tuple(row[column] for column in TRANSACTION_COLUMNS) for row in rows]
+        )])
+
+    def get_transactions(
+        self,
+        address: bytes,
+        cursor: Optional[Cursor] = None,
+        newer: bool = False,
+        limit: int = 10,
+        chain: str = DEFAULT_CHAIN
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Read one page of an address's indexed transactions on one chain, newest first.
+
+        Pages are addressed by a cursor (the position of an entry) instead of an offset,
+        so a page is a single index range scan however deep into the history it is.
+
+        :param address: The 20-byte address.
+        :param cursor: Position to page from; None starts at the newest transaction.
+        :param newer: Return the entries newer than cursor instead of older.
+        :param limit: Maximum number of entries.
+        :param chain: Chain whose transactions to read.
+        :return: (entries newest first, whether more entries exist beyond the page in that direction)
+        """
+        sql = f"SELECT {', '.join(TRANSACTION_COLUMNS)} FROM transactions WHERE address = ? AND chain = ?"
+        params: Tuple = (address, chain)
+        if cursor is not None:
+            sql += f" AND (block_number, tx_index, log_index) {'>' if newer else '<'} (?, ?, ?)"
+            params += tuple(cursor)
+        order = 'ASC' if newer else 'DESC'
+        sql += f" ORDER BY block_number {order}, tx_index {order}, log_index {order} LIMIT ?"
+        rows = [dict(zip(TRANSACTION_COLUMNS, row)) for row in self._query(sql, params + (limit + 1,))]
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if newer:
+            rows.reverse()
+        return rows, has_more
+
+    def close(self) -> None:
+        """
+        Fold the write-ahead log into the database and close the connection.
+        """
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                logger.warning(f"WAL checkpoint of {self.db_path} failed: {e}")
+            self._conn.close()
+
+
+_store: Optional[AddressStore] = None
+_store_lock = threading.Lock()
+
+
+def get_address_store(json_path: Optional[str] = 'addresses.json') -> AddressStore:
+    """
+    Return the process-wide AddressStore, creating it (and migrating the JSON file) on first use.
+
+    The database lives next to the JSON file, with a .db extension.
+
+    :param json_path: Path to the legacy addresses.json file.
+    :return: The shared AddressStore.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            db_path = os.path.splitext(json_path or 'addresses.json')[0] + '.db'
+            _store = AddressStore(db_path, json_path)
+        return _store
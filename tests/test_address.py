@@ -0,0 +1,36 @@
+import pytest
+
+from address import is_valid_address, normalize_address, to_checksum_address
+
+# EIP-55 test vectors
+CHECKSUMMED = [
+    '0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed',
+    '0xfB6916095ca1df60bB79Ce92cE3Ea74c37c5d359',
+    '0xdbF03B407c01E7cD3CBea99509d93f8DDDC8C6FB',
+    '0xD1220A0cf47c7B9Be7A2E6BA89F429762e7b9aDb',
+]
+
+
+@pytest.mark.parametrize('address', CHECKSUMMED)
+def test_checksum_casing(address):
+    assert is_valid_address(address)
+    assert to_checksum_address(address.lower()) == address
+    assert to_checksum_address(normalize_address(address)) == address
+    # Single-case addresses carry no checksum
+    assert is_valid_address(address.lower())
+    assert is_valid_address('0x' + address[2:].upper())
+    assert is_valid_address(address[2:])
+
+
+@pytest.mark.parametrize('address', CHECKSUMMED)
+def test_mistyped_checksum_is_rejected(address):
+    position = next(i for i, c in enumerate(address) if i > 1 and c.isalpha())
+    mistyped = address[:position] + address[position].swapcase() + address[position + 1:]
+    assert not is_valid_address(mistyped)
+
+
+@pytest.mark.parametrize('address', [
+    '', '0x', '0x' + 'ab' * 19, '0x' + 'ab' * 21, '0x' + 'zz' * 20, None, 42, b'\xab' * 20
+])
+def test_malformed_addresses(address):
+    assert not is_valid_address(address)
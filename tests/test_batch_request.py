@@ -0,0 +1,24 @@
+from benchmarks.fake_node import SyntheticChain
+from web3_handler import RPC_ERROR, batch_request
+
+from web3 import Web3
+
+
+def test_results_are_formatted_like_web3_eth():
+    # Guards the private web3 formatter table batch_request relies on, e.g. when the web3 pin is raised
+    node = SyntheticChain(watched_count=0, head=100, tx_per_block=3)
+    server, url = node.serve()
+    try:
+        web3 = Web3(Web3.HTTPProvider(url))
+        block, receipt, missing, failed = batch_request(web3, [
+            ('eth_getBlockByNumber', (hex(100), True)),
+            ('eth_getTransactionReceipt', (node.transactions(100)[0]['hash'],)),
+            ('eth_getBlockByNumber', (hex(101), False)),
+            ('eth_unsupported', ()),
+        ], error_result=RPC_ERROR)
+        assert block == web3.eth.get_block(100, full_transactions=True)
+        assert receipt == web3.eth.get_transaction_receipt(node.transactions(100)[0]['hash'])
+        assert missing is None
+        assert failed is RPC_ERROR
+    finally:
+        server.shutdown()
@@ -0,0 +1,29 @@
+from benchmarks.fake_node import SyntheticChain
+from cache import block_header_cache, header_key
+from web3_handler import fetch_blocks, get_block_header
+
+from web3 import Web3
+
+
+def _hash(value: int) -> str:
+    return '0x' + format(value, '064x')
+
+
+def test_reorged_block_is_not_served_from_cache():
+    node = SyntheticChain(watched_count=0, head=20, tx_per_block=1)
+    server, url = node.serve()
+    web3 = Web3(Web3.HTTPProvider(url))
+    try:
+        block_header_cache.clear()
+        fetch_blocks(web3, [10], False, 10, chain='test')
+        orphaned = block_header_cache.get(header_key('test', _hash(10)))
+        assert orphaned['number'] == 10
+
+        # Block 10 is replaced by a block with another hash: its header must come from the node
+        node.block = lambda number, full: dict(SyntheticChain.block(node, number, full), hash=_hash(10 | 1 << 200))
+        header = get_block_header(web3, _hash(10 | 1 << 200), 'test')
+        assert header['hash'] == bytes.fromhex(_hash(10 | 1 << 200)[2:])
+        assert node.calls['eth_getBlockByHash'] == 1
+        assert get_block_header(web3, _hash(10), 'test') is orphaned
+    finally:
+        server.shutdown()
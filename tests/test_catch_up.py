@@ -0,0 +1,74 @@
+import threading
+import time
+
+from benchmarks.fake_node import SyntheticChain, watched_address
+from chains import ETHEREUM
+from main import monitor_addresses
+from registry import SubscriptionRegistry
+from scanner import BlockScanner
+from storage import AddressStore
+
+from web3 import Web3
+
+
+class RecordingBot:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.messages.append((chat_id, text))
+
+
+def _setup(tmp_path, head: int, checkpoint: int):
+    node = SyntheticChain(watched_count=1, head=head, tx_per_block=20, hit_rate=0.05)
+    server, url = node.serve()
+    registry = SubscriptionRegistry(AddressStore(str(tmp_path / 'addresses.db'), json_path=None))
+    registry.add(1, 'a', watched_address(0), {'ethereum': checkpoint})
+    return server, Web3(Web3.HTTPProvider(url)), registry
+
+
+def test_backlog_is_scanned_without_waiting_for_poll_interval(tmp_path):
+    server, web3, registry = _setup(tmp_path, head=1300, checkpoint=1000)
+    chain = ETHEREUM.configured(max_blocks_per_cycle=50, poll_interval=60)
+    stop = threading.Event()
+    thread = threading.Thread(target=monitor_addresses, args=(web3, RecordingBot(), registry, {}),
+                              kwargs={'stop_event': stop, 'chain': chain}, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 20
+        while registry.last_seen_block(1, 'a', 'ethereum') < 1300:
+            assert time.monotonic() < deadline, "the backlog was not scanned back to back"
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        thread.join(10)
+        server.shutdown()
+
+
+def test_resume_is_capped_behind_the_head(tmp_path):
+    server, web3, registry = _setup(tmp_path, head=1300, checkpoint=5)
+    try:
+        scanner = BlockScanner(web3, RecordingBot(), registry, max_blocks_per_cycle=50, max_resume_blocks=100)
+        assert scanner.plan_cycle(1300) == range(1201, 1251)
+        assert not scanner.caught_up()
+        scanner.scan_new_blocks()
+        scanner.scan_new_blocks()
+        assert scanner.caught_up()
+        assert registry.last_seen_block(1, 'a', 'ethereum') == 1300
+    finally:
+        server.shutdown()
+
+
+def test_each_block_is_matched_once_per_cycle(tmp_path):
+    server, web3, registry = _setup(tmp_path, head=1300, checkpoint=1250)
+    try:
+        bot = RecordingBot()
+        scanner = BlockScanner(web3, bot, registry, max_blocks_per_cycle=50)
+        matched = []
+        match_transactions = scanner.match_transactions
+        scanner.match_transactions = lambda block: matched.append(block['number']) or match_transactions(block)
+        assert scanner.scan_new_blocks() == 50
+        assert sorted(matched) == list(range(1251, 1301))
+        assert bot.messages
+    finally:
+        server.shutdown()
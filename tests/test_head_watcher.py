@@ -0,0 +1,68 @@
+import time
+import asyncio
+
+import head_watcher
+from benchmarks.fake_node import SyntheticChain
+from benchmarks.fake_ws import FakeHeadStream
+from chains import ETHEREUM, KNOWN_CHAINS
+from head_watcher import HeadWatcher
+
+from web3 import AsyncWeb3
+
+
+async def _wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_subscription_falls_back_to_polling_and_reconnects(monkeypatch):
+    # Synthetic blocks are 12s apart; poll fast so the test does not wait for them
+    monkeypatch.setattr(head_watcher, 'MAX_POLL_INTERVAL', 0.05)
+    node = SyntheticChain(watched_count=0, head=100, tx_per_block=1)
+    node_server, node_url = node.serve()
+    stream = FakeHeadStream(node)
+    ws_server, ws_url = stream.serve()
+
+    async def scenario():
+        watcher = HeadWatcher(AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(node_url)), ws_url, reconnect_delay=0.5)
+        heads = watcher.heads()
+        next_head = asyncio.ensure_future(heads.__anext__())
+        await _wait_for(lambda: stream.subscribers() == 1)
+
+        # Heads are pushed over the subscription
+        assert stream.publish() == 101
+        assert await asyncio.wait_for(next_head, 5) == 101
+        assert watcher.mode == 'subscription'
+        assert stream.publish() == 102
+        assert await asyncio.wait_for(heads.__anext__(), 5) == 102
+        polls = node.calls['eth_getBlockByNumber']
+
+        # The socket drops: the next head is found by polling over HTTP
+        node.produce_block()
+        stream.drop()
+        assert await asyncio.wait_for(heads.__anext__(), 5) == 103
+        assert watcher.mode == 'polling'
+        assert node.calls['eth_getBlockByNumber'] > polls
+
+        # After reconnect_delay the watcher subscribes again
+        next_head = asyncio.ensure_future(heads.__anext__())
+        await _wait_for(lambda: stream.subscriptions == 2)
+        await _wait_for(lambda: stream.subscribers() == 1)
+        assert stream.publish() == 104
+        assert await asyncio.wait_for(next_head, 5) == 104
+        assert watcher.mode == 'subscription'
+        await heads.aclose()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        ws_server.shutdown()
+        node_server.shutdown()
+
+
+def test_fallback_polling_starts_from_the_chain_block_time():
+    web3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider('http://127.0.0.1:1'))
+    for chain, interval in ((ETHEREUM, 6.0), (KNOWN_CHAINS['base'], 1.0)):
+        assert HeadWatcher(web3, block_time=chain.block_time).estimator.poll_interval() == interval
@@ -0,0 +1,25 @@
+import pytest
+
+from chains import KNOWN_CHAINS
+from web3_handler import CALLBACK_DATA_LIMIT, history_callback_data, parse_history_callback_data
+
+ADDRESS = '0x' + 'ab' * 20
+
+
+@pytest.mark.parametrize('chain', list(KNOWN_CHAINS))
+@pytest.mark.parametrize('cursor', [(0, 0, -1), (19000000, 150, 3), (4294967295, 1048575, 1048575)])
+def test_round_trip_within_the_limit(chain, cursor):
+    for newer in (False, True):
+        data = history_callback_data(newer, cursor, ADDRESS.upper().replace('0X', '0x'), chain)
+        assert len(data.encode()) <= CALLBACK_DATA_LIMIT
+        assert parse_history_callback_data(data) == (newer, cursor, ADDRESS, chain)
+
+
+def test_buttons_of_earlier_messages_still_parse():
+    data = 'hist_o_ethereum_19000000_150_-1_q6urq6urq6urq6urq6urq6urq6s'
+    assert parse_history_callback_data(data) == (False, (19000000, 150, -1), ADDRESS, 'ethereum')
+
+
+def test_oversized_data_is_rejected():
+    with pytest.raises(ValueError):
+        history_callback_data(False, (10 ** 30, 0, 0), ADDRESS)
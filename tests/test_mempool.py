@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+from benchmarks.fake_node import SyntheticChain, watched_address
+from benchmarks.fake_ws import FakeHeadStream
+from mempool import MempoolWatcher, PendingTracker, UnsupportedNodeError, subscribe_pending_transactions
+
+from web3 import Web3
+
+# Never mined by the synthetic chain, so the node answers null for it
+UNKNOWN_HASH = '0x' + format(10 ** 9 << 20, '064x')
+
+
+class RecordingBot:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.messages.append((chat_id, text))
+
+
+class FlakyChain(SyntheticChain):
+    """
+    Answers the first failures eth_getTransactionByHash calls with a JSON-RPC error.
+    """
+
+    def __init__(self, failures: int, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+
+    def handle(self, request):
+        if request.get('method') == 'eth_getTransactionByHash' and self.failures:
+            self.failures -= 1
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32000, 'message': 'busy'}}
+        return super().handle(request)
+
+
+def test_transaction_is_reported_dropped_only_after_repeated_null_lookups():
+    node = FlakyChain(failures=1, watched_count=0, head=100)
+    server, url = node.serve()
+    bot = RecordingBot()
+    tracker = PendingTracker()
+    tracker.add({'hash': UNKNOWN_HASH, 'from': watched_address(0), 'nonce': '0x1'}, [(1, 'a', watched_address(0))])
+    watcher = MempoolWatcher(Web3(Web3.HTTPProvider(url)), bot, None, tracker, 'ws://unused', drop_after=0)
+    try:
+        # An RPC error is not a null result
+        assert watcher.check_dropped() == 0
+        # One null lookup is not enough
+        assert watcher.check_dropped() == 0
+        assert not bot.messages and UNKNOWN_HASH in tracker
+        assert watcher.check_dropped() == 1
+        assert len(bot.messages) == 1 and 'dropped' in bot.messages[0][1]
+        assert UNKNOWN_HASH not in tracker
+    finally:
+        server.shutdown()
+
+
+def test_node_without_full_pending_transactions_disables_alerts_instead_of_reconnecting():
+    # The newHeads stand-in rejects newPendingTransactions as an unsupported subscription
+    stream = FakeHeadStream(SyntheticChain(watched_count=0))
+    server, ws_url = stream.serve()
+
+    async def scenario():
+        try:
+            async for _ in subscribe_pending_transactions(ws_url):
+                pass
+        except UnsupportedNodeError:
+            pass
+        else:
+            raise AssertionError("the subscription was not rejected")
+
+        stop = threading.Event()
+        watcher = MempoolWatcher(None, RecordingBot(), None, PendingTracker(), ws_url, reconnect_delay=0.01)
+        task = asyncio.ensure_future(watcher.run(stop))
+        await asyncio.sleep(0.5)
+        stop.set()
+        await asyncio.wait_for(task, 5)
+
+    try:
+        asyncio.run(scenario())
+        assert stream.connections == 2
+    finally:
+        server.shutdown()
@@ -0,0 +1,39 @@
+import time
+
+import telebot
+from benchmarks.fake_telegram import FakeTelegram
+from notifier import COALESCE_SEPARATOR, MAX_MESSAGE_LENGTH, NotificationDispatcher
+
+
+def _wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_rate_limited_alerts_are_retried_after_retry_after_and_merged(monkeypatch):
+    telegram = FakeTelegram()
+    server, api_url = telegram.serve()
+    monkeypatch.setattr(telebot.apihelper, 'API_URL', api_url)
+    dispatcher = NotificationDispatcher(telebot.TeleBot('0:test'), global_rate=100, per_chat_rate=100)
+    dispatcher.start()
+    alerts = [f"alert {index} " + 'x' * 300 for index in range(40)]
+    try:
+        telegram.throttle(1, retry_after=1)
+        dispatcher.send_message(42, alerts[0])
+        _wait_for(lambda: telegram.rejected)
+        # Alerts queued while the chat waits out retry_after are merged with the rejected one
+        for alert in alerts[1:]:
+            dispatcher.send_message(42, alert)
+        dispatcher.stop(timeout=10)
+    finally:
+        server.shutdown()
+
+    rejected_at = telegram.rejected[0][0]
+    assert telegram.messages[0][0] - rejected_at >= 1.0
+    assert telegram.messages[0][2].startswith(alerts[0] + COALESCE_SEPARATOR)
+    assert all(len(text) <= MAX_MESSAGE_LENGTH for _, _, text in telegram.messages)
+    assert len(telegram.messages) == 4
+    assert COALESCE_SEPARATOR.join(text for _, _, text in telegram.messages).split(COALESCE_SEPARATOR) == alerts
+    assert (dispatcher.sent, dispatcher.dropped) == (len(alerts), 0)
@@ -0,0 +1,86 @@
+from address import to_checksum_address
+from registry import SubscriptionRegistry
+from storage import AddressStore
+
+ADDRESS = '0x' + 'ab' * 20
+KEY = bytes.fromhex('ab' * 20)
+OTHER = '0x' + 'cd' * 20
+
+
+def _registry(tmp_path) -> SubscriptionRegistry:
+    return SubscriptionRegistry(AddressStore(str(tmp_path / 'addresses.db'), json_path=None))
+
+
+def test_address_shared_by_several_chats(tmp_path):
+    registry = _registry(tmp_path)
+    assert registry.add(1, 'a', ADDRESS, {'ethereum': 10})
+    # Any casing of the address reaches the same index entry
+    assert registry.add(2, 'b', ADDRESS.upper().replace('0X', '0x'), {'ethereum': 20})
+    assert registry.add(2, 'c', OTHER, {'ethereum': 30})
+    assert not registry.add(1, 'a', OTHER, {'ethereum': 40})
+
+    assert registry.subscribers(ADDRESS) == (('1', 'a'), ('2', 'b'))
+    assert registry.subscribers(KEY) is registry.subscribers(ADDRESS)
+    assert sorted(registry.addresses()) == [ADDRESS, OTHER]
+    assert len(registry) == 3
+    # The second subscriber shares the key object of the first
+    assert registry._by_chat['2']['b'].key is registry._by_chat['1']['a'].key
+
+    assert registry.remove(1, 'a')
+    assert registry.subscribers(ADDRESS) == (('2', 'b'),)
+    assert not registry.remove(1, 'a')
+    assert registry.remove(2, 'b')
+    assert registry.subscribers(ADDRESS) == ()
+    assert registry.addresses() == [OTHER]
+    assert registry.get_user_addresses(1) == {}
+
+    # Removals are persisted
+    reloaded = SubscriptionRegistry(registry.store)
+    assert reloaded.addresses() == [OTHER] and reloaded.subscribers(OTHER) == (('2', 'c'),)
+
+
+def test_checkpoints_move_per_chain(tmp_path):
+    registry = _registry(tmp_path)
+    registry.add(1, 'a', ADDRESS, {'ethereum': 100, 'polygon': 5000})
+    registry.add(2, 'b', ADDRESS, {'ethereum': 90})
+    assert registry.ensure_chain('polygon', 5100) == 1
+    assert registry.checkpoints('ethereum') == {ADDRESS: 90}
+    assert registry.checkpoints('polygon') == {ADDRESS: 5000}
+
+    registry.advance_last_seen_block(120, chain='ethereum')
+    assert registry.last_seen_block(1, 'a', 'ethereum') == 120
+    assert registry.last_seen_block(2, 'b', 'ethereum') == 120
+    assert registry.last_seen_block(1, 'a', 'polygon') == 5000
+
+    registry.rewind_last_seen_block(110, chain='ethereum')
+    assert registry.min_last_seen_block('ethereum') == 110
+    assert registry.checkpoints('polygon') == {ADDRESS: 5000}
+    # A rewind never moves a checkpoint forward
+    registry.rewind_last_seen_block(5050, chain='polygon')
+    assert registry.last_seen_block(1, 'a', 'polygon') == 5000
+    assert registry.last_seen_block(2, 'b', 'polygon') == 5050
+
+    assert registry.store.get_user_addresses(1)['a']['last_seen_blocks'] == {'ethereum': 110, 'polygon': 5000}
+    assert registry.store.get_user_addresses(2)['b']['last_seen_blocks'] == {'ethereum': 110, 'polygon': 5050}
+
+
+def test_version_and_listeners(tmp_path):
+    registry = _registry(tmp_path)
+    events = []
+    registry.add_listener(lambda *event: events.append(event))
+    registry.add_listener(lambda *event: 1 / 0)
+    version = registry.version
+
+    registry.add(1, 'a', ADDRESS, {'ethereum': 10})
+    assert registry.version > version
+    version = registry.version
+    # A rejected add or remove changes nothing and notifies nobody
+    registry.add(1, 'a', OTHER, {'ethereum': 10})
+    registry.remove(1, 'missing')
+    assert registry.version == version
+    registry.remove(1, 'a')
+    assert registry.version > version
+
+    # The failing listener does not keep the others from being told
+    assert events == [('add', '1', 'a', ADDRESS, {'ethereum': 10}), ('remove', '1', 'a', to_checksum_address(ADDRESS))]
+
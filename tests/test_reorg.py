@@ -0,0 +1,61 @@
+from benchmarks.fake_node import SyntheticChain, watched_address
+from registry import SubscriptionRegistry
+from scanner import BlockScanner
+from storage import AddressStore
+
+from web3 import Web3
+
+
+class RecordingBot:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.messages.append((chat_id, text))
+
+
+def _indexed_blocks(store) -> list:
+    return [row[0] for row in store._query("SELECT DISTINCT block_number FROM transactions ORDER BY block_number")]
+
+
+def _hits(node, block_number: int) -> int:
+    return sum(watched_address(0) in (tx['from'], tx['to']) for tx in node.transactions(block_number))
+
+
+def test_rehashed_blocks_are_rescanned_without_duplicate_alerts(tmp_path):
+    node = SyntheticChain(watched_count=1, head=1100, tx_per_block=20, hit_rate=0.3)
+    server, url = node.serve()
+    store = AddressStore(str(tmp_path / 'addresses.db'), json_path=None)
+    registry = SubscriptionRegistry(store)
+    registry.add(1, 'a', watched_address(0), {'ethereum': 1090})
+    bot = RecordingBot()
+    deleted_after = []
+    delete_transactions_after = store.delete_transactions_after
+    store.delete_transactions_after = lambda block_number, *args, **kwargs: (
+        deleted_after.append(block_number), delete_transactions_after(block_number, *args, **kwargs)
+    )
+    try:
+        scanner = BlockScanner(Web3(Web3.HTTPProvider(url)), bot, registry)
+        assert scanner.scan_new_blocks() == 10
+        alerts = len(bot.messages)
+        assert alerts and _indexed_blocks(store)[-1] == 1100
+
+        node.reorg(3)
+        node.produce_block()
+        # Block 1101 does not extend block 1100 as scanned: rewind to the fork point
+        assert scanner.scan_new_blocks() == 0
+        assert scanner.next_block == 1098
+        assert registry.last_seen_block(1, 'a', 'ethereum') == 1097
+        assert deleted_after == [1097]
+        assert _indexed_blocks(store)[-1] <= 1097
+        assert len(bot.messages) == alerts
+
+        # The new fork holds the same transactions; only those of block 1101 are new
+        assert scanner.scan_new_blocks() == 4
+        assert registry.last_seen_block(1, 'a', 'ethereum') == 1101
+        assert len(bot.messages) == len(set(bot.messages))
+        assert len(bot.messages) == alerts + _hits(node, 1101)
+        assert [n for n in _indexed_blocks(store) if n > 1097] == [n for n in range(1098, 1102) if _hits(node, n)]
+    finally:
+        server.shutdown()
+        store.close()
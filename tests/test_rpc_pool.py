@@ -0,0 +1,93 @@
+import time
+
+from benchmarks.fake_node import SyntheticChain
+from rpc_pool import RPCPool
+
+
+def _nodes(count: int, rpc_latency: float):
+    nodes = [SyntheticChain(watched_count=0, head=100, tx_per_block=1, rpc_latency=rpc_latency) for _ in range(count)]
+    return nodes, [node.serve() for node in nodes]
+
+
+def _block_number(number: int):
+    return {'jsonrpc': '2.0', 'id': number, 'method': 'eth_getBlockByNumber', 'params': [hex(number), False]}
+
+
+def test_failing_endpoint_is_taken_out_of_rotation_with_backoff():
+    nodes, served = _nodes(3, 0.0)
+    failing, healthy = nodes[0], nodes[1:]
+    failing.http_status = 429
+    pool = RPCPool([url for _, url in served], base_backoff=0.5)
+    endpoint = pool.endpoints[0]
+    try:
+        # Every endpoint scores the same at first, so the first request goes to the failing one and fails over
+        assert pool.post(_block_number(1))['result']['number'] == hex(1)
+        assert failing.http_requests == 1 and endpoint.errors == 1
+        assert 0.4 < endpoint.disabled_until - time.monotonic() <= 0.5
+
+        for number in range(2, 12):
+            assert pool.post(_block_number(number))['result']['number'] == hex(number)
+        assert failing.http_requests == 1
+        assert sum(node.http_requests for node in healthy) == 11
+
+        # Failing again once the backoff is over doubles it
+        time.sleep(0.5)
+        pool.health_check()
+        assert failing.http_requests == 2
+        assert 0.9 < endpoint.disabled_until - time.monotonic() <= 1.0
+
+        # An endpoint that answers a health check is put back into rotation
+        failing.http_status = 200
+        pool.health_check()
+        assert endpoint.is_available(time.monotonic())
+        assert endpoint.consecutive_failures == 0
+    finally:
+        for server, _ in served:
+            server.shutdown()
+
+
+def test_batches_are_spread_across_healthy_endpoints():
+    nodes, served = _nodes(4, 0.1)
+    failing, healthy = nodes[0], nodes[1:]
+    failing.http_status = 503
+    pool = RPCPool([url for _, url in served], base_backoff=60)
+    try:
+        pool.post(_block_number(1))
+        requests_before = [node.http_requests for node in healthy]
+
+        batches = [[_block_number(number) for number in range(start, start + 5)] for start in range(10, 70, 10)]
+        started = time.monotonic()
+        responses = pool.post_batches(batches)
+        elapsed = time.monotonic() - started
+
+        assert [[int(r['result']['number'], 16) for r in response] for response in responses] == \
+            [[request['id'] for request in batch] for batch in batches]
+        assert failing.http_requests == 1
+        assert [node.http_requests - before for node, before in zip(healthy, requests_before)] == [2, 2, 2]
+        # Six batches of 0.1s over three endpoints complete in about two round trips
+        assert elapsed < 0.4
+    finally:
+        for server, _ in served:
+            server.shutdown()
+
+
+def test_json_rpc_error_with_http_200_fails_over():
+    nodes, served = _nodes(2, 0.0)
+    limited, healthy = nodes
+    limited.rpc_error = {'code': -32005, 'message': 'daily request count exceeded'}
+    pool = RPCPool([url for _, url in served], base_backoff=60)
+    endpoint = pool.endpoints[0]
+    try:
+        assert pool.post(_block_number(1))['result']['number'] == hex(1)
+        # One rate-limited response in a batch fails the whole batch over
+        assert [r['result']['number'] for r in pool.post([_block_number(2), _block_number(3)])] == [hex(2), hex(3)]
+        assert limited.http_requests == 1 and endpoint.errors == 1
+        assert not endpoint.is_available(time.monotonic())
+
+        # Errors about the request itself are answered as they are
+        healthy.rpc_error = {'code': -32601, 'message': 'method not found'}
+        assert pool.post(_block_number(4))['error']['code'] == -32601
+        assert pool.endpoints[1].errors == 0
+    finally:
+        for server, _ in served:
+            server.shutdown()
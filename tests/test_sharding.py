@@ -0,0 +1,35 @@
+from benchmarks.fake_node import SyntheticChain, watched_address
+from registry import SubscriptionRegistry, shard_of
+from sharding import ShardCoordinator
+from storage import AddressStore
+
+from web3 import Web3
+
+
+def test_blocks_are_fetched_once_for_every_shard(tmp_path):
+    node = SyntheticChain(watched_count=20, head=120, tx_per_block=50, hit_rate=0.3)
+    server, url = node.serve()
+    registry = SubscriptionRegistry(AddressStore(str(tmp_path / 'addresses.db'), json_path=None))
+    for index in range(20):
+        registry.add(1, f'a{index}', watched_address(index), {'ethereum': 100})
+    coordinator = ShardCoordinator(registry, None, 3, {'batch_size': 50})
+    coordinator.web3 = Web3(Web3.HTTPProvider(url))
+    try:
+        views = [coordinator.shard_blocks(index, range(101, 111)) for index in range(3)]
+        assert node.calls['eth_getBlockByNumber'] == 10
+
+        for number in range(101, 111):
+            block = node.block(number, True)
+            watched = [tx for tx in block['transactions']
+                       if registry.subscribers(tx['from']) or registry.subscribers(tx['to'])]
+            for index, view in enumerate(views):
+                assert int(view[number]['parentHash'].hex(), 16) == int(block['parentHash'], 16)
+                expected = {int(tx['hash'], 16) for tx in watched
+                            if index in {shard_of(a, 3) for a in (tx['from'], tx['to']) if registry.subscribers(a)}}
+                assert {int(tx['hash'].hex(), 16) for tx in view[number]['transactions']} == expected
+
+        # A worker going back, e.g. after a reorg, gets the blocks fetched again
+        coordinator.shard_blocks(0, range(105, 111))
+        assert node.calls['eth_getBlockByNumber'] == 16
+    finally:
+        server.shutdown()
@@ -0,0 +1,71 @@
+import json
+import os
+import sqlite3
+
+from storage import AddressStore
+
+ADDRESS = '0x' + 'ab' * 20
+
+
+def test_baseline_json_is_imported_once(tmp_path):
+    json_path = tmp_path / 'addresses.json'
+    # Format written by the JSON-only bot: one checkpoint per address
+    json_path.write_text(json.dumps({
+        '1': {'a': {'ether_address': ADDRESS, 'last_seen_block': 100}},
+        '2': {'b': {'ether_address': ADDRESS, 'last_seen_block': 200}}
+    }))
+    store = AddressStore(str(tmp_path / 'addresses.db'), json_path=str(json_path))
+    try:
+        assert store.load_all() == {
+            '1': {'a': {'ether_address': ADDRESS, 'last_seen_blocks': {'ethereum': 100}}},
+            '2': {'b': {'ether_address': ADDRESS, 'last_seen_blocks': {'ethereum': 200}}}
+        }
+        assert not json_path.exists()
+        assert os.path.exists(f"{json_path}.migrated")
+        # A JSON file reappearing later is not imported over the database
+        json_path.write_text(json.dumps({'3': {'c': {'ether_address': ADDRESS, 'last_seen_block': 300}}}))
+        assert store.migrate_from_json(str(json_path)) == 0
+        assert '3' not in store.load_all()
+    finally:
+        store.close()
+
+
+def test_single_chain_database_is_migrated_to_per_chain_rows(tmp_path):
+    db_path = str(tmp_path / 'addresses.db')
+    # Schema of databases created before multi-chain support
+    connection = sqlite3.connect(db_path)
+    connection.executescript("""
+        CREATE TABLE addresses (
+            chat_id TEXT NOT NULL, name TEXT NOT NULL, ether_address TEXT NOT NULL,
+            last_seen_block INTEGER NOT NULL, PRIMARY KEY (chat_id, name)
+        );
+        CREATE TABLE transactions (
+            address BLOB NOT NULL, block_number INTEGER NOT NULL, tx_index INTEGER NOT NULL,
+            log_index INTEGER NOT NULL, tx_hash TEXT NOT NULL, from_address TEXT, to_address TEXT,
+            amount TEXT NOT NULL, timestamp INTEGER, PRIMARY KEY (address, block_number, tx_index, log_index)
+        ) WITHOUT ROWID;
+    """)
+    connection.execute("INSERT INTO addresses VALUES ('1', 'a', ?, 100)", (ADDRESS,))
+    connection.execute("INSERT INTO transactions VALUES (?, 90, 0, -1, '0x01', ?, NULL, '1', 0)",
+                       (bytes.fromhex(ADDRESS[2:]), ADDRESS))
+    connection.commit()
+    connection.close()
+
+    store = AddressStore(db_path, json_path=None)
+    try:
+        assert 'chain' in store._columns('addresses') and 'chain' in store._columns('transactions')
+        assert store.get_user_addresses(1) == {'a': {'ether_address': ADDRESS, 'last_seen_blocks': {'ethereum': 100}}}
+        entries, _ = store.get_transactions(bytes.fromhex(ADDRESS[2:]))
+        assert [(entry['chain'], entry['block_number'], entry['tx_hash']) for entry in entries] == [('ethereum', 90, '0x01')]
+        # Checkpoints of other chains are separate rows of the same address
+        store.add_checkpoints('polygon', 500, [('1', 'a', ADDRESS)])
+        store.update_last_seen_block(1, 'a', 110)
+        assert store.get_user_addresses(1)['a']['last_seen_blocks'] == {'ethereum': 110, 'polygon': 500}
+    finally:
+        store.close()
+    # Reopening a migrated database leaves it as it is
+    store = AddressStore(db_path, json_path=None)
+    try:
+        assert store.get_user_addresses(1)['a']['last_seen_blocks'] == {'ethereum': 110, 'polygon': 500}
+    finally:
+        store.close()
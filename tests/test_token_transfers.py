@@ -0,0 +1,63 @@
+from benchmarks.fake_node import TOKEN_ADDRESS, TRANSFER_EVENT_TOPIC, SyntheticChain
+from address import to_checksum_address
+from web3_handler import decode_transfer_log, format_transfer_amount
+
+from web3 import Web3
+
+SENDER = '0x' + '11' * 20
+RECIPIENT = '0x' + '22' * 20
+
+
+def _topic(address: str) -> str:
+    return '0x' + '0' * 24 + address[2:]
+
+
+def test_erc20_transfer_amount_is_read_from_data():
+    for data in ('0x' + format(1500000, '064x'), bytes.fromhex(format(1500000, '064x'))):
+        transfer = decode_transfer_log({
+            'address': TOKEN_ADDRESS,
+            'topics': [TRANSFER_EVENT_TOPIC, _topic(SENDER), _topic(RECIPIENT)],
+            'data': data
+        })
+        assert transfer == {
+            'from': to_checksum_address(SENDER),
+            'to': to_checksum_address(RECIPIENT),
+            'contract': to_checksum_address(TOKEN_ADDRESS),
+            'standard': 'ERC-20',
+            'value': 1500000
+        }
+
+
+def test_erc721_token_id_is_read_from_the_fourth_topic():
+    transfer = decode_transfer_log({
+        'address': TOKEN_ADDRESS,
+        'topics': [bytes.fromhex(TRANSFER_EVENT_TOPIC[2:]), bytes.fromhex(_topic(SENDER)[2:]),
+                   bytes.fromhex(_topic(RECIPIENT)[2:]), bytes.fromhex(format(42, '064x'))],
+        'data': b''
+    })
+    assert (transfer['standard'], transfer['token_id']) == ('ERC-721', 42)
+    assert (transfer['from'], transfer['to']) == (to_checksum_address(SENDER), to_checksum_address(RECIPIENT))
+
+
+def test_malformed_and_empty_transfers():
+    # Transfer events of other contracts may not index the sender and recipient
+    assert decode_transfer_log({'address': TOKEN_ADDRESS, 'topics': [TRANSFER_EVENT_TOPIC], 'data': '0x'}) is None
+    transfer = decode_transfer_log({
+        'address': TOKEN_ADDRESS, 'topics': [TRANSFER_EVENT_TOPIC, _topic(SENDER), _topic(RECIPIENT)], 'data': '0x'
+    })
+    assert transfer['value'] == 0
+
+
+def test_amount_is_formatted_with_the_token_decimals():
+    node = SyntheticChain(watched_count=0)
+    server, url = node.serve()
+    try:
+        web3 = Web3(Web3.HTTPProvider(url))
+        transfer = {'contract': to_checksum_address(TOKEN_ADDRESS), 'standard': 'ERC-20', 'value': 1500000}
+        assert format_transfer_amount(web3, transfer) == '1.500000 BENCH'
+        transfer = {'contract': to_checksum_address(TOKEN_ADDRESS), 'standard': 'ERC-721', 'token_id': 42}
+        assert format_transfer_amount(web3, transfer) == '42 (BENCH)'
+        # Token info is fetched once per contract
+        assert node.calls['eth_call'] == 2
+    finally:
+        server.shutdown()
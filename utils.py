@@ -1,9 +1,13 @@
+from __future__ import annotations
+
 import os
 import json
-import telebot
 import logging
 from logging.handlers import RotatingFileHandler
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Dict, Any
+
+if TYPE_CHECKING:
+    import telebot
 
 
 # Configure logging with rotation
@@ -13,45 +17,6 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.addHandler(log_handler)
 
-def load_addresses(file_path='addresses.json'):
-    """
-    Load Ethereum addresses from a JSON file.
-
-    :param file_path: Path to the JSON file containing the addresses.
-    :return: A dictionary with Ethereum addresses and their details.
-    """
-    addresses_to_monitor = {}
-    
-    # Check if the file exists
-    if not os.path.exists(file_path):
-        # Create an empty file
-        with open(file_path, 'w') as file:
-            json.dump({}, file, indent=4)
-        logger.info(f"Created new file: {file_path}")
-
-    # Load the file if it exists
-    try:
-        with open(file_path, 'r') as file:
-            addresses_to_monitor = json.load(file)
-        logger.info("Loaded addresses from file.")
-    except Exception as e:
-        logger.error(f"Error loading addresses: {e}")
-    
-    return addresses_to_monitor
-
-def save_addresses(addresses_by_user):
-    """
-    Save the current state of addresses being monitored by users to the JSON file.
-    
-    :param addresses_by_user: The dictionary containing user-specific addresses.
-    """
-    try:
-        with open('addresses.json', 'w') as json_file:
-            json.dump(addresses_by_user, json_file, indent=4)
-        logger.info("Addresses successfully saved.")
-    except Exception as e:
-        logger.error(f"Failed to save addresses: {str(e)}")
-
 def load_allowed_users(file_path: str = 'users.json') -> Dict[int, str]:
     """
     Load the allowed users who can interact with the Telegram bot from a JSON file.
@@ -84,6 +49,16 @@ def is_allowed_user(chat_id: int, allowed_users: Dict[int, str]) -> bool:
     """
     return chat_id in allowed_users
 
+def emojize(text: str) -> str:
+    """
+    Replace :name: emoji codes in a message; the emoji package is imported on first use.
+
+    :param text: Text containing emoji codes.
+    :return: The text with the codes replaced.
+    """
+    import emoji
+    return emoji.emojize(text)
+
 def show_addresses(bot: telebot.TeleBot, message: telebot.types.Message, addresses_to_monitor: Dict[str, Dict[str, Any]]) -> None:
     """
     Displays the list of Ethereum addresses currently being monitored.
@@ -98,7 +73,7 @@ def show_addresses(bot: telebot.TeleBot, message: telebot.types.Message, address
         addresses_info = '\n'.join(
             f"🔹 Name: {name}\n"
             f"   Address: {info['ether_address']}\n"
-            f"   Last Seen Block: {info['last_seen_block']}\n"
+            f"   Last Seen Block: {', '.join(f'{chain} {block}' for chain, block in info['last_seen_blocks'].items())}\n"
             for name, info in addresses_to_monitor.items()
         )
         bot.send_message(chat_id, f"📋 Addresses Being Monitored:\n{addresses_info}")
@@ -1,193 +1,941 @@
-import telebot
+from __future__ import annotations
+
 import threading
-from web3 import Web3
 import time
-import emoji
-from utils import logger
-from typing import Dict, Any, List
+import base64
+import itertools
+from collections.abc import Mapping
+from decimal import Decimal
+from utils import logger, emojize
+from cache import block_header_cache, receipt_cache, balance_cache, block_header, header_key
+from log_fetcher import AdaptiveLogFetcher
+from metrics import rpc_metrics_middleware, rpc_requests, rpc_errors, rpc_latency
+from address import normalize_address, to_checksum_address, is_valid_address
+from storage import AddressStore, Cursor
+from chains import Chain, ETHEREUM, DEFAULT_CHAIN, chain_label
+from typing import TYPE_CHECKING, Dict, Any, List, Iterable, Iterator, Optional, Tuple
+
+# web3, telebot and requests take over a second to import, so they are imported where
+# they are first used and command intake does not wait for them
+if TYPE_CHECKING:
+    import telebot
+    from web3 import Web3
+
+# keccak256("Transfer(address,address,uint256)"), shared by ERC-20 and ERC-721
+TRANSFER_EVENT_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+# Most providers cap the number of OR-ed values in a single topic position
+DEFAULT_TOPIC_CHUNK_SIZE = 500
+# Number of JSON-RPC calls sent in one HTTP batch request
+DEFAULT_BATCH_SIZE = 50
+# Result of a batched call that returned an error, for callers that must tell it from a null result
+RPC_ERROR = object()
+# Multicall3 is deployed at the same address on mainnet and most EVM chains
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+MULTICALL3_ABI = [{
+    'name': 'aggregate3', 'type': 'function', 'stateMutability': 'payable',
+    'inputs': [{'name': 'calls', 'type': 'tuple[]', 'components': [
+        {'name': 'target', 'type': 'address'},
+        {'name': 'allowFailure', 'type': 'bool'},
+        {'name': 'callData', 'type': 'bytes'}
+    ]}],
+    'outputs': [{'name': 'returnData', 'type': 'tuple[]', 'components': [
+        {'name': 'success', 'type': 'bool'},
+        {'name': 'returnData', 'type': 'bytes'}
+    ]}]
+}]
+# keccak256("balanceOf(address)")[:4]
+BALANCE_OF_SELECTOR = bytes.fromhex('70a08231')
+# Number of balanceOf calls aggregated into one Multicall3 call
+MULTICALL_CHUNK_SIZE = 500
+# Addresses per page of the /balances command
+BALANCES_PAGE_SIZE = 20
+# Transactions per page of the /history command
+HISTORY_PAGE_SIZE = 10
+# Maximum size in bytes of inline button callback data accepted by Telegram
+CALLBACK_DATA_LIMIT = 64
+
+# requests.Session for batch requests, created on first use
+_batch_session = None
+_batch_request_ids = itertools.count(1)
 
-def init_web3(INFURA_PROJECT_ID: str) -> Web3:
+# (id of the chain's Web3 instance, contract) -> token info
+_token_info_cache: Dict[Tuple[int, str], Dict[str, Any]] = {}
+
+def init_web3(
+    INFURA_PROJECT_ID: str,
+    rpc_urls: Optional[List[str]] = None,
+    infura_network: Optional[str] = 'mainnet',
+    poa: bool = False
+) -> Web3:
     """
     Initialize a Web3 instance connected to the Ethereum network via Infura.
+
+    When additional endpoints are given, requests are routed through an RPCPool
+    that sends each request to the healthiest endpoint and fails over between them.
     
     :param INFURA_PROJECT_ID: Infura project ID for accessing the Ethereum network.
+    :param rpc_urls: Additional JSON-RPC endpoint URLs to pool with Infura.
+    :param infura_network: Infura network to connect to, e.g. 'arbitrum-mainnet'; None to use rpc_urls only.
+    :param poa: Accept proof-of-authority blocks, whose extraData is longer than 32 bytes.
     :return: Web3 instance connected to the Ethereum network.
     :raises ConnectionError: If the connection to Infura fails.
     """
-    infura_url = f'https://mainnet.infura.io/v3/{INFURA_PROJECT_ID}'
-    web3 = Web3(Web3.HTTPProvider(infura_url))
+    from web3 import Web3
+    from web3.middleware import geth_poa_middleware
+    from rpc_pool import RPCPool, PooledHTTPProvider
+
+    urls = list(rpc_urls or [])
+    if INFURA_PROJECT_ID and infura_network:
+        urls.insert(0, f'https://{infura_network}.infura.io/v3/{INFURA_PROJECT_ID}')
+    if len(urls) > 1:
+        pool = RPCPool(urls)
+        # Measure every endpoint once so routing starts from real latencies
+        pool.health_check()
+        web3 = Web3(PooledHTTPProvider(pool))
+        web3.middleware_onion.add(rpc_metrics_middleware, 'rpc_metrics')
+        if poa:
+            web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        if not web3.is_connected():
+            logger.error("Failed to connect to any RPC endpoint")
+            raise ConnectionError("Failed to connect to any RPC endpoint")
+        pool.start_health_checks()
+        logger.info(f"Successfully connected to RPC pool of {len(urls)} endpoints")
+        return web3
+
+    web3 = Web3(Web3.HTTPProvider(urls[0] if urls else None))
+    web3.middleware_onion.add(rpc_metrics_middleware, 'rpc_metrics')
+    if poa:
+        web3.middleware_onion.inject(geth_poa_middleware, layer=0)
     if not web3.is_connected():
         logger.error("Failed to connect to Infura")
         raise ConnectionError("Failed to connect to Infura")
     logger.info("Successfully connected to Infura")
     return web3
 
-def get_eth_balance(web3: Web3, address: str) -> float:
+class ChainConnections(Mapping):
     """
-    Fetch the Ethereum balance of a given address.
-    
+    Chain name -> Web3 instance of every configured chain, each connected on first use.
+
+    Connecting imports web3 and probes the endpoints, so it is left to the first monitor
+    cycle or command that needs the chain and command intake starts without waiting for it.
+    A failed connection raises ConnectionError and is retried on the next use.
+    """
+
+    def __init__(self, INFURA_PROJECT_ID: str, chains: List[Chain]) -> None:
+        """
+        :param INFURA_PROJECT_ID: Infura project ID for accessing the networks.
+        :param chains: Configured chains, in the order they are listed.
+        """
+        self.infura_project_id = INFURA_PROJECT_ID
+        self.chains = {chain.name: chain for chain in chains}
+        self._web3: Dict[str, Web3] = {}
+        self._locks = {chain.name: threading.Lock() for chain in chains}
+
+    def __getitem__(self, name: str) -> Web3:
+        chain = self.chains[name]
+        web3 = self._web3.get(name)
+        if web3 is None:
+            # Concurrent first uses of a chain wait for one connection
+            with self._locks[name]:
+                web3 = self._web3.get(name)
+                if web3 is None:
+                    web3 = init_web3(self.infura_project_id, chain.rpc_urls, chain.infura_network, chain.poa)
+                    self._web3[name] = web3
+        return web3
+
+    def __contains__(self, name) -> bool:
+        return name in self.chains
+
+    def __iter__(self):
+        return iter(self.chains)
+
+    def __len__(self) -> int:
+        return len(self.chains)
+
+def get_block_header(web3: Web3, block_hash, chain: str = DEFAULT_CHAIN) -> Dict[str, Any]:
+    """
+    Fetch the header fields of a block, served from the block header cache when possible.
+
+    Headers are looked up by hash rather than number, so a block orphaned by a reorg is
+    never returned for the block that replaced it.
+
     :param web3: Web3 instance used for interacting with the Ethereum network.
-    :param address: Ethereum address whose balance is to be fetched.
-    :return: Balance in ETH or None if there was an error.
+    :param block_hash: Hash of the block, as bytes or hex.
+    :param chain: Name of the chain web3 is connected to; the cache is keyed by (chain, hash).
+    :return: Dictionary with number, hash, parentHash and timestamp.
     """
-    try:
-        balance = web3.eth.get_balance(address)
-        return web3.fromWei(balance, 'ether')
-    except Exception as e:
-        logger.error(f"Error fetching balance for {address}: {e}")
-        return None
+    return block_header_cache.get_or_load(
+        header_key(chain, block_hash),
+        lambda: block_header(web3.eth.get_block(block_hash))
+    )
 
-def process_transaction(web3, bot, tx, name, address, allowed_users, addresses_by_user):
-    chat_id = tx['chat_id']  # Include user chat ID with the transaction
+def get_transaction_receipt(web3: Web3, tx_hash: str):
+    """
+    Fetch a transaction receipt, served from the receipt cache when possible.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param tx_hash: Hex hash of the transaction.
+    :return: The receipt.
+    """
+    return receipt_cache.get_or_load(tx_hash, lambda: web3.eth.get_transaction_receipt(tx_hash))
+
+def on_chain(chain: Chain) -> str:
+    """
+    :return: " on <chain>" for alerts from chains other than Ethereum, which keep their original wording.
+    """
+    return '' if chain.name == DEFAULT_CHAIN else f" on {chain.label}"
+
+def process_transaction(web3, bot, tx, chat_id, name, address, registry,
+                        tx_receipt=None, block_timestamp=None, pending_for=None, chain: Chain = ETHEREUM):
+    """
+    Build the alert for a matched transaction and send it to the owning chat.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param bot: TeleBot instance used to send messages.
+    :param tx: Transaction (from a block or a log) that matched a watched address.
+    :param chat_id: Chat ID of the user watching the address.
+    :param name: Name under which the address is watched.
+    :param address: The watched Ethereum address.
+    :param registry: SubscriptionRegistry holding the address's checkpoint.
+    :param tx_receipt: Receipt of the transaction, if it was already fetched in a batch.
+    :param block_timestamp: Timestamp of the transaction's block, if already known.
+    :param pending_for: Seconds since a pending alert was sent for this transaction, which this alert confirms.
+    :param chain: Chain the transaction was mined on.
+    """
+    from telebot.apihelper import ApiTelegramException
 
     try:
-        tx_hash = tx['transactionHash'].hex()
+        tx_hash = (tx['hash'] if 'hash' in tx else tx['transactionHash']).hex()
         try:
-            tx_receipt = web3.eth.getTransactionReceipt(tx_hash)
+            if tx_receipt is None:
+                tx_receipt = get_transaction_receipt(web3, tx_hash)
             if tx_receipt:
                 from_address = tx_receipt['from']
                 to_address = tx_receipt['to']
-                value = web3.fromWei(web3.eth.getTransaction(tx_hash)['value'], 'ether')
+                if 'value' not in tx:
+                    tx = web3.eth.get_transaction(tx_hash)
+                value = web3.from_wei(tx['value'], 'ether')
                 block_number = int(tx_receipt['blockNumber'])
-                block_timestamp = web3.eth.getBlock(block_number)['timestamp']
+                if block_timestamp is None:
+                    block_timestamp = get_block_header(web3, tx_receipt['blockHash'], chain.name)['timestamp']
                 formatted_timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(block_timestamp))
-                alert_emoji = emoji.emojize(":rotating_light:")
-                message = (f"{alert_emoji} New transaction for {name} ({address}):\n"
+                if pending_for is None:
+                    headline = f"{emojize(':rotating_light:')} New transaction for {name} ({address}){on_chain(chain)}:"
+                else:
+                    headline = (f"{emojize(':check_mark_button:')} Confirmed pending transaction for "
+                                f"{name} ({address}){on_chain(chain)} after {pending_for:.0f}s:")
+                message = (f"{headline}\n"
                            f"Hash: {tx_hash}\n"
                            f"From: {from_address}\n"
                            f"To: {to_address}\n"
-                           f"Value: {value} ETH\n"
+                           f"Value: {value} {chain.symbol}\n"
                            f"Block Number: {block_number}\n"
                            f"Timestamp: {formatted_timestamp}\n"
                            "------")
-                logger.info(f"Constructed message: {message}")
+                logger.debug(f"Constructed message: {message}")
                 if message.strip():
-                    for username, chat_id in allowed_users.items():
-                        try:
-                            bot.send_message(chat_id, message)
-                        except telebot.apihelper.ApiTelegramException as e:
-                            logger.error(f"Failed to send message to {username} ({chat_id}): {str(e)}")
-                addresses_by_user[chat_id][name]['last_seen_block'] = block_number
+                    try:
+                        bot.send_message(chat_id, message)
+                    except ApiTelegramException as e:
+                        logger.error(f"Failed to send message to {chat_id}: {str(e)}")
+                registry.update_last_seen_block(chat_id, name, block_number, chain.name)
         except Exception as e:
             logger.error(f"Error processing transaction {tx_hash} for {name} ({address}): {str(e)}")
 
     except Exception as e:
         logger.error(f"Error processing transaction for {name} ({address}): {str(e)}")
 
-def show_address_history(
+def transaction_index_row(
     web3: Web3,
-    bot: telebot.TeleBot,
-    lock: threading.Lock,
-    message: telebot.types.Message,
-    address_name: str,
-    addresses_to_monitor: Dict[str, Dict[str, Any]]
-) -> None:
+    tx: Dict[str, Any],
+    address: str,
+    block_timestamp: Optional[int] = None,
+    chain: Chain = ETHEREUM
+) -> Dict[str, Any]:
     """
-    Show the transaction history for a specific Ethereum address.
-    
+    Build the transaction index row of a native transaction involving a watched address.
+
     :param web3: Web3 instance used for interacting with the Ethereum network.
-    :param bot: TeleBot instance used to send messages.
-    :param lock: Thread lock for synchronized access.
-    :param message: Received message object containing chat details.
-    :param address_name: Name of the Ethereum address to fetch history for.
-    :param addresses_to_monitor: Dictionary of addresses being monitored.
-    """
-    chat_id = message.chat.id
-    with lock:
-        address_info = addresses_to_monitor.get(address_name)
-        if address_info:
-            address = address_info['ether_address']
-            from_block = address_info['last_seen_block'] + 1
-            transactions = get_eth_transactions(web3, address, from_block)
-            if transactions:
-                history_message = "\n".join(
-                    f"Hash: {tx['transactionHash'].hex()}\n"
-                    f"From: {tx['from']}\n"
-                    f"To: {tx['to']}\n"
-                    f"Value: {web3.fromWei(tx['value'], 'ether')} ETH\n"
-                    f"Block Number: {tx['blockNumber']}\n"
-                    for tx in transactions
-                )
-                bot.send_message(chat_id, f"Transaction History for {address_name}:\n{history_message}")
-            else:
-                bot.send_message(chat_id, "No transactions found.")
-        else:
-            bot.send_message(chat_id, f"Address with name '{address_name}' not found.")
+    :param tx: Transaction from a block fetched with full transactions.
+    :param address: The watched Ethereum address.
+    :param block_timestamp: Timestamp of the transaction's block, if known.
+    :param chain: Chain the transaction was mined on.
+    :return: Row for AddressStore.index_transactions.
+    """
+    return {
+        'chain': chain.name,
+        'address': normalize_address(address),
+        'block_number': int(tx['blockNumber']),
+        'tx_index': int(tx['transactionIndex']),
+        'log_index': -1,
+        'tx_hash': tx['hash'].hex(),
+        'from_address': tx.get('from'),
+        'to_address': tx.get('to'),
+        'amount': f"{web3.from_wei(tx['value'], 'ether')} {chain.symbol}",
+        'timestamp': block_timestamp
+    }
 
-def show_address_details(
+def transfer_index_row(
     web3: Web3,
+    log: Dict[str, Any],
+    address: str,
+    chain: str = DEFAULT_CHAIN
+) -> Optional[Dict[str, Any]]:
+    """
+    Build the transaction index row of a token transfer involving a watched address.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param log: The Transfer log that matched a watched address.
+    :param address: The watched Ethereum address.
+    :param chain: Name of the chain the transfer happened on.
+    :return: Row for AddressStore.index_transactions, or None if the log is malformed.
+    """
+    transfer = decode_transfer_log(log)
+    if transfer is None:
+        return None
+    return {
+        'chain': chain,
+        'address': normalize_address(address),
+        'block_number': int(log['blockNumber']),
+        'tx_index': int(log['transactionIndex']),
+        'log_index': int(log['logIndex']),
+        'tx_hash': log['transactionHash'].hex(),
+        'from_address': transfer['from'],
+        'to_address': transfer['to'],
+        'amount': format_transfer_amount(web3, transfer),
+        'timestamp': None
+    }
+
+def history_callback_data(newer: bool, cursor: Cursor, address: str, chain: str = DEFAULT_CHAIN) -> str:
+    """
+    Encode a history page request as inline button callback data.
+
+    Telegram limits callback data to 64 bytes, so the cursor is written in hex and the
+    address as unpadded base64; a 10-digit block number on the longest chain name still fits.
+
+    :param newer: Whether the button pages towards newer transactions.
+    :param cursor: Position to page from.
+    :param address: The watched Ethereum address.
+    :param chain: Name of the chain whose history is paged.
+    :return: Callback data of the form hx_<o|n>_<chain>_<block>_<tx_index>_<log_index>_<address>.
+    :raises ValueError: If the data would exceed the callback data limit.
+    """
+    encoded = base64.urlsafe_b64encode(normalize_address(address)).rstrip(b'=').decode()
+    data = f"hx_{'n' if newer else 'o'}_{chain}_{cursor[0]:x}_{cursor[1]:x}_{cursor[2]:x}_{encoded}"
+    if len(data.encode()) > CALLBACK_DATA_LIMIT:
+        raise ValueError(f"History callback data exceeds {CALLBACK_DATA_LIMIT} bytes: {data}")
+    return data
+
+def parse_history_callback_data(data: str) -> Tuple[bool, Cursor, str, str]:
+    """
+    Decode callback data built by history_callback_data, or by its earlier hist_ form
+    with decimal cursors, which buttons of messages sent before still carry.
+
+    :return: (newer, cursor, address as lowercase 0x-prefixed hex, chain)
+    """
+    prefix, direction, chain, block_number, tx_index, log_index, encoded = data.split('_', 6)
+    base = 10 if prefix == 'hist' else 16
+    address = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+    cursor = (int(block_number, base), int(tx_index, base), int(log_index, base))
+    return direction == 'n', cursor, '0x' + address.hex(), chain
+
+def show_address_history(
     bot: telebot.TeleBot,
-    lock: threading.Lock,
-    message: telebot.types.Message,
+    store: AddressStore,
+    chat_id: int,
     address_name: str,
-    addresses_to_monitor: Dict[str, Dict[str, Any]]
+    address: str,
+    cursor: Optional[Cursor] = None,
+    newer: bool = False,
+    message_id: Optional[int] = None,
+    chain: str = DEFAULT_CHAIN
 ) -> None:
     """
-    Show the details of a specific Ethereum address.
-    
-    Retrieves and displays information about the given Ethereum address, including the address itself,
-    the last seen block, and the current balance. The details are sent to the user's chat.
-    
-    :param bot: The TeleBot instance used to send messages.
-    :param lock: Thread lock for synchronized access.
-    :param message: The received message object containing chat details.
-    :param address_name: The name of the Ethereum address for which details are to be shown.
-    :param addresses_to_monitor: Dictionary of addresses being monitored.
-    """
-    chat_id = message.chat.id
-    with lock:
-        address_info = addresses_to_monitor.get(address_name)
-
-        if address_info:
-            address = address_info['ether_address']
-            last_seen_block = address_info['last_seen_block']
-            balance = get_eth_balance(web3, address)
-            
-            if balance is None:
-                balance = "Error fetching balance"
-
-            details_message = (f"📋 *Details for {address_name}:*\n"
-                               f"🔹 Address: {address}\n"
-                               f"🔹 Last Seen Block: {last_seen_block}\n"
-                               f"🔹 Current Balance: {balance} ETH")
-            bot.send_message(chat_id, details_message, parse_mode='Markdown')
-        else:
-            bot.send_message(chat_id, f"❌ Address with name '{address_name}' not found.")
+    Show one page of the transaction history of a watched address on one chain from the local transaction index.
+
+    The monitor indexes every matched transaction as it scans, so no RPC calls are made.
+    Prev/next buttons carry the cursor of the page boundary.
+
+    :param bot: TeleBot instance used to send messages.
+    :param store: AddressStore holding the transaction index.
+    :param chat_id: Chat to send the page to.
+    :param address_name: Name of the watched address.
+    :param address: The watched Ethereum address.
+    :param cursor: Position to page from; None shows the newest transactions.
+    :param newer: Page towards newer transactions instead of older ones.
+    :param message_id: Message to edit in place when paging.
+    :param chain: Name of the chain whose transactions are shown.
+    """
+    from telebot import types
+
+    entries, has_more = store.get_transactions(normalize_address(address), cursor, newer, HISTORY_PAGE_SIZE, chain)
+    on = '' if chain == DEFAULT_CHAIN else f" on {chain_label(chain)}"
+    if not entries:
+        bot.send_message(chat_id, f"No transactions have been recorded for {address_name}{on} yet.")
+        return
+
+    lines = [f"📜 Transaction history for {address_name} ({address}){on}:"]
+    for entry in entries:
+        timestamp = ''
+        if entry['timestamp'] is not None:
+            timestamp = f" ({time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(entry['timestamp']))})"
+        lines.append(f"\n🔹 Block {entry['block_number']}{timestamp}\n"
+                     f"Hash: {entry['tx_hash']}\n"
+                     f"From: {entry['from_address']}\n"
+                     f"To: {entry['to_address']}\n"
+                     f"Value: {entry['amount']}")
+    text = '\n'.join(lines)
+
+    has_newer = has_more if newer else cursor is not None
+    has_older = True if newer else has_more
+    first = entries[0]
+    last = entries[-1]
+    buttons = []
+    if has_newer:
+        buttons.append(types.InlineKeyboardButton("⬅️ Newer", callback_data=history_callback_data(
+            True, (first['block_number'], first['tx_index'], first['log_index']), address, chain)))
+    if has_older:
+        buttons.append(types.InlineKeyboardButton("Older ➡️", callback_data=history_callback_data(
+            False, (last['block_number'], last['tx_index'], last['log_index']), address, chain)))
+    markup = None
+    if buttons:
+        markup = types.InlineKeyboardMarkup()
+        markup.row(*buttons)
+
+    if message_id is None:
+        bot.send_message(chat_id, text, reply_markup=markup)
+    else:
+        bot.edit_message_text(text, chat_id, message_id, reply_markup=markup)
 
 def is_valid_ethereum_address(address: str) -> bool:
     """
-    Validate if the provided address is a valid Ethereum address.
+    Validate if the provided address is a valid Ethereum address, including its EIP-55 checksum if it has one.
     
     :param address: The Ethereum address to validate.
     :return: True if the address is valid, False otherwise.
     """
-    web3 = Web3()
-    return web3.is_address(address)
+    return is_valid_address(address)
+
+def address_to_topic(address: str) -> str:
+    """
+    Left-pad an Ethereum address to a 32-byte log topic.
+
+    :param address: The Ethereum address to pad.
+    :return: The address as a 0x-prefixed 32-byte hex topic.
+    """
+    return '0x' + '0' * 24 + address[2:].lower()
+
+def topic_to_address(topic) -> str:
+    """
+    Extract the checksummed Ethereum address from a 32-byte log topic.
 
-def get_eth_transactions(
+    :param topic: The topic as bytes or hex string.
+    :return: The checksummed address.
+    """
+    topic_hex = topic.hex() if isinstance(topic, (bytes, bytearray)) else topic
+    return to_checksum_address('0x' + topic_hex[-40:])
+
+def iter_token_transfers(
     web3: Web3,
-    address: str,
-    from_block: int
+    addresses: Iterable[str],
+    from_block: int,
+    to_block: int,
+    topic_chunk_size: int = DEFAULT_TOPIC_CHUNK_SIZE,
+    fetcher: Optional[AdaptiveLogFetcher] = None
+) -> Iterator[Tuple[int, int, List[Dict[str, Any]]]]:
+    """
+    Yield the ERC-20/ERC-721 Transfer logs sent from or to any of the given addresses, one block window at a time.
+
+    All addresses are OR-ed in a single topic position, so the cost is two eth_getLogs
+    calls (sender side and recipient side) per chunk of topic_chunk_size addresses and
+    window, regardless of which contract emitted the log. Every filter is fetched over
+    the same windows, so a window is complete when it is yielded and the caller can
+    checkpoint after it.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param addresses: The Ethereum addresses to watch.
+    :param from_block: First block of the range, inclusive.
+    :param to_block: Last block of the range, inclusive.
+    :param topic_chunk_size: Maximum number of addresses per topic filter.
+    :param fetcher: AdaptiveLogFetcher to reuse, keeping the window size it has learned; a new one when omitted.
+    :return: Iterator of (window_from, window_to, logs ordered by block number and log index, without duplicates).
+    """
+    topics = sorted({address_to_topic(address) for address in addresses})
+    filters = [{'topics': topic_filter}
+               for start in range(0, len(topics), topic_chunk_size)
+               for topic_filter in ([TRANSFER_EVENT_TOPIC, topics[start:start + topic_chunk_size]],
+                                    [TRANSFER_EVENT_TOPIC, None, topics[start:start + topic_chunk_size]])]
+    if not filters:
+        yield from_block, to_block, []
+        return
+    fetcher = fetcher or AdaptiveLogFetcher(web3)
+    try:
+        for window_from, window_to, logs in fetcher.iter_windows(filters, from_block, to_block):
+            # A transfer between two watched addresses matches both the sender and the recipient filter
+            logs_by_id = {(log['blockNumber'], log['logIndex']): log for log in logs}
+            yield window_from, window_to, [logs_by_id[key] for key in sorted(logs_by_id)]
+    except Exception as e:
+        logger.error(f"Error fetching token transfers for blocks {from_block}-{to_block}: {str(e)}")
+        raise
+
+def get_token_transfers(
+    web3: Web3,
+    addresses: Iterable[str],
+    from_block: int,
+    to_block: int,
+    topic_chunk_size: int = DEFAULT_TOPIC_CHUNK_SIZE,
+    fetcher: Optional[AdaptiveLogFetcher] = None
 ) -> List[Dict[str, Any]]:
     """
-    Retrieve Ethereum transactions for a given address starting from a specific block.
-    
+    Retrieve ERC-20/ERC-721 Transfer logs sent from or to any of the given addresses.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param addresses: The Ethereum addresses to watch.
+    :param from_block: First block of the range, inclusive.
+    :param to_block: Last block of the range, inclusive.
+    :param topic_chunk_size: Maximum number of addresses per topic filter.
+    :param fetcher: AdaptiveLogFetcher to reuse, keeping the window size it has learned; a new one when omitted.
+    :return: Transfer logs ordered by block number and log index, without duplicates.
+    """
+    return [log for _, _, logs in iter_token_transfers(web3, addresses, from_block, to_block, topic_chunk_size, fetcher)
+            for log in logs]
+
+def decode_transfer_log(log: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Decode a Transfer log into its sender, recipient and amount or token ID.
+
+    ERC-20 transfers carry the amount in the log data, ERC-721 transfers carry
+    the token ID as a third indexed topic.
+
+    :param log: The Transfer log to decode.
+    :return: Dictionary with from, to, contract, standard and value/token_id, or None if malformed.
+    """
+    topics = log['topics']
+    if len(topics) < 3:
+        return None
+    transfer = {
+        'from': topic_to_address(topics[1]),
+        'to': topic_to_address(topics[2]),
+        'contract': to_checksum_address(log['address'])
+    }
+    if len(topics) == 4:
+        topic_hex = topics[3].hex() if isinstance(topics[3], (bytes, bytearray)) else topics[3]
+        transfer['standard'] = 'ERC-721'
+        transfer['token_id'] = int(topic_hex, 16)
+    else:
+        data = log['data']
+        data_hex = data.hex() if isinstance(data, (bytes, bytearray)) else data
+        if data_hex.startswith('0x'):
+            data_hex = data_hex[2:]
+        transfer['standard'] = 'ERC-20'
+        transfer['value'] = int(data_hex[:64], 16) if data_hex else 0
+    return transfer
+
+def get_token_info(web3: Web3, contract: str) -> Dict[str, Any]:
+    """
+    Fetch (and memoize) the symbol and decimals of a token contract.
+
     :param web3: Web3 instance used for interacting with the Ethereum network.
-    :param address: The Ethereum address to monitor.
-    :param from_block: The block number to start monitoring from.
-    :return: List of transactions or an empty list if none are found or an error occurs.
+    :param contract: The token contract address.
+    :return: Dictionary with symbol and decimals; falls back to the contract address and 0 decimals.
     """
+    # Token contracts differ between chains, so the cache is per Web3 instance
+    key = (id(web3), contract)
+    if key in _token_info_cache:
+        return _token_info_cache[key]
+
+    token = web3.eth.contract(address=contract, abi=[
+        {'name': 'symbol', 'type': 'function', 'stateMutability': 'view', 'inputs': [],
+         'outputs': [{'name': '', 'type': 'string'}]},
+        {'name': 'decimals', 'type': 'function', 'stateMutability': 'view', 'inputs': [],
+         'outputs': [{'name': '', 'type': 'uint8'}]},
+    ])
+    info = {'symbol': contract, 'decimals': 0}
+    try:
+        info['symbol'] = token.functions.symbol().call()
+    except Exception as e:
+        logger.debug(f"Could not read symbol of {contract}: {e}")
     try:
-        logs = web3.eth.get_logs({
-            'fromBlock': from_block,
-            'toBlock': 'latest',
-            'address': address
-        })
-        transactions = [web3.eth.get_transaction(log['transactionHash']) for log in logs]
-        return transactions
-    except ConnectionError as e:
-        logger.error(f"Network error while fetching logs for {address}: {str(e)}")
-        return []
+        info['decimals'] = token.functions.decimals().call()
     except Exception as e:
-        logger.error(f"Unexpected error while fetching logs for {address}: {str(e)}")
-        return []
+        logger.debug(f"Could not read decimals of {contract}: {e}")
+    _token_info_cache[key] = info
+    return info
+
+def format_transfer_amount(web3: Web3, transfer: Dict[str, Any]) -> str:
+    """
+    Format the amount of a decoded transfer with the token's symbol and decimals.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param transfer: Transfer decoded by decode_transfer_log.
+    :return: "<amount> <symbol>" for ERC-20, "<token id> (<symbol>)" for ERC-721.
+    """
+    token_info = get_token_info(web3, transfer['contract'])
+    if transfer['standard'] == 'ERC-721':
+        return f"{transfer['token_id']} ({token_info['symbol']})"
+    return f"{Decimal(transfer['value']).scaleb(-token_info['decimals'])} {token_info['symbol']}"
+
+def process_token_transfer(web3, bot, log, chat_id, name, address, registry, chain: Chain = ETHEREUM):
+    """
+    Build the alert for a token transfer involving a watched address and send it to the owning chat.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param bot: TeleBot instance used to send messages.
+    :param log: The Transfer log that matched a watched address.
+    :param chat_id: Chat ID of the user watching the address.
+    :param name: Name under which the address is watched.
+    :param address: The watched Ethereum address.
+    :param registry: SubscriptionRegistry holding the address's checkpoint.
+    :param chain: Chain the transfer happened on.
+    """
+    from telebot.apihelper import ApiTelegramException
+
+    tx_hash = log['transactionHash'].hex()
+    try:
+        transfer = decode_transfer_log(log)
+        if transfer is None:
+            return
+        amount = format_transfer_amount(web3, transfer)
+        direction = "Incoming" if transfer['to'].lower() == address.lower() else "Outgoing"
+        block_number = int(log['blockNumber'])
+        alert_emoji = emojize(":coin:")
+        message = (f"{alert_emoji} {direction} {transfer['standard']} transfer for {name} ({address}){on_chain(chain)}:\n"
+                   f"Hash: {tx_hash}\n"
+                   f"Contract: {transfer['contract']}\n"
+                   f"From: {transfer['from']}\n"
+                   f"To: {transfer['to']}\n"
+                   f"{'Token ID' if transfer['standard'] == 'ERC-721' else 'Amount'}: {amount}\n"
+                   f"Block Number: {block_number}\n"
+                   "------")
+        logger.debug(f"Constructed message: {message}")
+        try:
+            bot.send_message(chat_id, message)
+        except ApiTelegramException as e:
+            logger.error(f"Failed to send message to {chat_id}: {str(e)}")
+        registry.update_last_seen_block(chat_id, name, block_number, chain.name)
+    except Exception as e:
+        logger.error(f"Error processing token transfer {tx_hash} for {name} ({address}): {str(e)}")
+
+def batch_request(
+    web3: Web3,
+    calls: List[tuple],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    error_result: Any = None
+) -> List[Any]:
+    """
+    Send JSON-RPC calls as batch requests and return their formatted results.
+
+    Identical calls are sent only once. Results are formatted the same way as the
+    corresponding web3.eth methods, so callers get AttributeDicts and HexBytes.
+    With a pooled provider the batches are spread across its endpoints; providers
+    without an HTTP endpoint fall back to one request per call.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param calls: List of (method, params) tuples.
+    :param batch_size: Maximum number of calls per HTTP request.
+    :param error_result: Result given for calls that returned an error, e.g. RPC_ERROR to tell them from null results.
+    :return: Results in the order of calls; error_result for calls that returned an error.
+    """
+    unique_calls = list(dict.fromkeys((method, tuple(params)) for method, params in calls))
+    raw_results: Dict[tuple, Any] = {}
+    failed_calls = set()
+    endpoint_uri = getattr(web3.provider, 'endpoint_uri', None)
+    pool = getattr(web3.provider, 'pool', None)
+
+    requests_by_id: Dict[int, tuple] = {}
+    payloads = []
+    for start in range(0, len(unique_calls), batch_size):
+        chunk = unique_calls[start:start + batch_size]
+        payload = []
+        for method, params in chunk:
+            request_id = next(_batch_request_ids)
+            requests_by_id[request_id] = (method, params)
+            payload.append({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': list(params)})
+        payloads.append(payload)
+    for method, _ in unique_calls:
+        rpc_requests.inc(method)
+
+    if pool is not None:
+        # Batches are spread across the pool's endpoints concurrently; the pool times each round trip
+        responses_per_batch = pool.post_batches(payloads)
+    elif endpoint_uri:
+        responses_per_batch = []
+        for payload in payloads:
+            started = time.perf_counter()
+            response = _get_batch_session().post(endpoint_uri, json=payload, timeout=30)
+            rpc_latency.observe(time.perf_counter() - started, 'batch')
+            response.raise_for_status()
+            responses_per_batch.append(response.json())
+    else:
+        responses_per_batch = []
+        for payload in payloads:
+            started = time.perf_counter()
+            responses_per_batch.append(
+                [dict(web3.provider.make_request(request['method'], request['params']), id=request['id'])
+                 for request in payload]
+            )
+            rpc_latency.observe(time.perf_counter() - started, 'batch')
+
+    for responses in responses_per_batch:
+        if isinstance(responses, dict):
+            # Some providers answer a rejected batch with a single error object
+            raise ValueError(f"Batch request rejected: {responses.get('error')}")
+        for item in responses:
+            call = requests_by_id.get(item.get('id'))
+            if call is None:
+                continue
+            if 'error' in item:
+                rpc_errors.inc(call[0])
+                logger.error(f"RPC call {call[0]} {list(call[1])} failed: {item['error']}")
+                failed_calls.add(call)
+                continue
+            raw_results[call] = item.get('result')
+
+    # web3 has no public API to format a raw result the way web3.eth does, so the private formatter
+    # table is used and requirements.txt pins web3 to an exact version (==6.20.0); check this import
+    # whenever the pin is raised, since web3 may move or rename it in any release
+    from web3._utils.method_formatters import PYTHONIC_RESULT_FORMATTERS as result_formatters
+
+    results = []
+    for method, params in calls:
+        if (method, tuple(params)) in failed_calls:
+            results.append(error_result)
+            continue
+        result = raw_results.get((method, tuple(params)))
+        formatter = result_formatters.get(method)
+        results.append(formatter(result) if formatter and result is not None else result)
+    return results
+
+def _get_batch_session():
+    global _batch_session
+    if _batch_session is None:
+        import requests
+        _batch_session = requests.Session()
+    return _batch_session
+
+def _hash_param(tx_hash) -> str:
+    return tx_hash.hex() if isinstance(tx_hash, (bytes, bytearray)) else tx_hash
+
+def fetch_blocks(
+    web3: Web3,
+    block_numbers: Iterable[int],
+    full_transactions: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    chain: str = DEFAULT_CHAIN
+) -> Dict[int, Any]:
+    """
+    Fetch several blocks with batched eth_getBlockByNumber calls.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param block_numbers: Numbers of the blocks to fetch; duplicates are fetched once.
+    :param full_transactions: Include full transaction objects instead of hashes.
+    :param batch_size: Maximum number of calls per HTTP request.
+    :param chain: Name of the chain web3 is connected to, for the block header cache.
+    :return: Dictionary of block number -> block (None if the node did not return it).
+    """
+    numbers = list(dict.fromkeys(block_numbers))
+    blocks = batch_request(web3, [('eth_getBlockByNumber', (hex(n), full_transactions)) for n in numbers], batch_size)
+    for block in blocks:
+        if block is not None:
+            block_header_cache.set(header_key(chain, block['hash']), block_header(block))
+    return dict(zip(numbers, blocks))
+
+def fetch_transactions(
+    web3: Web3,
+    tx_hashes: Iterable,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    error_result: Any = None
+) -> Dict[Any, Any]:
+    """
+    Fetch several transactions with batched eth_getTransactionByHash calls.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param tx_hashes: Transaction hashes (bytes or hex); duplicates are fetched once.
+    :param batch_size: Maximum number of calls per HTTP request.
+    :param error_result: Value given for lookups that returned an error instead of None.
+    :return: Dictionary of the given hash -> transaction (None if not found, error_result if the lookup failed).
+    """
+    hashes = list(dict.fromkeys(tx_hashes))
+    transactions = batch_request(web3, [('eth_getTransactionByHash', (_hash_param(h),)) for h in hashes], batch_size,
+                                 error_result)
+    return dict(zip(hashes, transactions))
+
+def fetch_receipts(
+    web3: Web3,
+    tx_hashes: Iterable,
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> Dict[Any, Any]:
+    """
+    Fetch several transaction receipts with batched eth_getTransactionReceipt calls.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param tx_hashes: Transaction hashes (bytes or hex); duplicates are fetched once.
+    :param batch_size: Maximum number of calls per HTTP request.
+    :return: Dictionary of the given hash -> receipt (None if not found).
+    """
+    receipts = {}
+    missing = []
+    for tx_hash in dict.fromkeys(tx_hashes):
+        receipt = receipt_cache.get(_hash_param(tx_hash))
+        if receipt is None:
+            missing.append(tx_hash)
+        else:
+            receipts[tx_hash] = receipt
+    fetched = batch_request(web3, [('eth_getTransactionReceipt', (_hash_param(h),)) for h in missing], batch_size)
+    for tx_hash, receipt in zip(missing, fetched):
+        if receipt is not None:
+            receipt_cache.set(_hash_param(tx_hash), receipt)
+        receipts[tx_hash] = receipt
+    return receipts
+
+def get_eth_balances(
+    web3: Web3,
+    addresses: Iterable[str],
+    block_number: int,
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> Dict[str, Optional[Decimal]]:
+    """
+    Fetch the ETH balances of many addresses at one block height.
+
+    Balances already cached for this block are served from memory; the rest are
+    fetched with batched eth_getBalance calls.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param addresses: Ethereum addresses.
+    :param block_number: Block at which all balances are read.
+    :param batch_size: Maximum number of calls per HTTP request.
+    :return: Dictionary of address -> balance in ETH (None if it could not be fetched).
+    """
+    balances: Dict[str, Optional[Decimal]] = {}
+    missing = []
+    for address in dict.fromkeys(addresses):
+        cached = balance_cache.get((address.lower(), block_number))
+        if cached is None:
+            missing.append(address)
+        else:
+            balances[address] = web3.from_wei(cached, 'ether')
+    if missing:
+        fetched = batch_request(web3, [
+            ('eth_getBalance', (to_checksum_address(address), hex(block_number))) for address in missing
+        ], batch_size)
+        for address, balance in zip(missing, fetched):
+            if balance is not None:
+                balance_cache.set((address.lower(), block_number), balance)
+            balances[address] = web3.from_wei(balance, 'ether') if balance is not None else None
+    return balances
+
+def get_token_balances(
+    web3: Web3,
+    token: str,
+    addresses: Iterable[str],
+    block_number: int
+) -> Dict[str, Optional[Decimal]]:
+    """
+    Fetch the ERC-20 balances of many addresses at one block height with Multicall3.
+
+    All balanceOf calls are aggregated into one eth_call per MULTICALL_CHUNK_SIZE addresses.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param token: The ERC-20 token contract address.
+    :param addresses: Ethereum addresses.
+    :param block_number: Block at which all balances are read.
+    :return: Dictionary of address -> balance in token units (None if the call failed).
+    """
+    token = to_checksum_address(token)
+    decimals = get_token_info(web3, token)['decimals']
+    multicall = web3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+    balances: Dict[str, Optional[Decimal]] = {}
+    missing = []
+    for address in dict.fromkeys(addresses):
+        cached = balance_cache.get((address.lower(), block_number, token))
+        if cached is None:
+            missing.append(address)
+        else:
+            balances[address] = Decimal(cached).scaleb(-decimals)
+
+    for start in range(0, len(missing), MULTICALL_CHUNK_SIZE):
+        chunk = missing[start:start + MULTICALL_CHUNK_SIZE]
+        calls = [(token, True, BALANCE_OF_SELECTOR + normalize_address(address).rjust(32, b'\0')) for address in chunk]
+        try:
+            results = multicall.functions.aggregate3(calls).call(block_identifier=block_number)
+        except Exception as e:
+            logger.error(f"Multicall3 balanceOf for {token} failed: {e}")
+            results = [(False, b'')] * len(chunk)
+        for address, (success, return_data) in zip(chunk, results):
+            if success and len(return_data) >= 32:
+                raw = int.from_bytes(return_data[:32], 'big')
+                balance_cache.set((address.lower(), block_number, token), raw)
+                balances[address] = Decimal(raw).scaleb(-decimals)
+            else:
+                balances[address] = None
+    return balances
+
+def show_balances(
+    web3: Web3,
+    bot: telebot.TeleBot,
+    chat_id: int,
+    user_addresses: Dict[str, Dict[str, Any]],
+    page: int = 0,
+    block_number: Optional[int] = None,
+    token: Optional[str] = None,
+    message_id: Optional[int] = None
+) -> None:
+    """
+    Show one page of balances of a user's addresses, all read at the same block.
+
+    Every page fetches only its own addresses, and navigation buttons carry the block
+    number so all pages show one consistent snapshot served from the balance cache.
+
+    :param web3: Web3 instance used for interacting with the Ethereum network.
+    :param bot: TeleBot instance used to send messages.
+    :param chat_id: Chat to send the page to.
+    :param user_addresses: Dictionary of name -> address info of the user.
+    :param page: Zero-based page number.
+    :param block_number: Block of the snapshot; defaults to the current head.
+    :param token: ERC-20 contract address for token balances, or None for ETH.
+    :param message_id: Message to edit in place when paging.
+    """
+    from telebot import types
+
+    if not user_addresses:
+        bot.send_message(chat_id, "🚫 No addresses are currently being monitored.")
+        return
+    if block_number is None:
+        block_number = web3.eth.block_number
+
+    names = sorted(user_addresses)
+    page_count = (len(names) + BALANCES_PAGE_SIZE - 1) // BALANCES_PAGE_SIZE
+    page = max(0, min(page, page_count - 1))
+    page_names = names[page * BALANCES_PAGE_SIZE:(page + 1) * BALANCES_PAGE_SIZE]
+    addresses = [user_addresses[name]['ether_address'] for name in page_names]
+
+    if token:
+        balances = get_token_balances(web3, token, addresses, block_number)
+        unit = get_token_info(web3, to_checksum_address(token))['symbol']
+    else:
+        balances = get_eth_balances(web3, addresses, block_number)
+        unit = 'ETH'
+
+    lines = [f"💰 Balances at block {block_number} (page {page + 1}/{page_count}):"]
+    for name, address in zip(page_names, addresses):
+        balance = balances.get(address)
+        lines.append(f"🔹 {name}: {'Error fetching balance' if balance is None else f'{balance} {unit}'}")
+    text = '\n'.join(lines)
+
+    markup = None
+    if page_count > 1:
+        markup = types.InlineKeyboardMarkup()
+        buttons = []
+        suffix = f"_{token}" if token else ''
+        if page > 0:
+            buttons.append(types.InlineKeyboardButton(
+                "⬅️ Prev", callback_data=f"bal_{page - 1}_{block_number}{suffix}"))
+        if page < page_count - 1:
+            buttons.append(types.InlineKeyboardButton(
+                "Next ➡️", callback_data=f"bal_{page + 1}_{block_number}{suffix}"))
+        markup.row(*buttons)
+
+    if message_id is None:
+        bot.send_message(chat_id, text, reply_markup=markup)
+    else:
+        bot.edit_message_text(text, chat_id, message_id, reply_markup=markup)
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import json
+import hmac
+import secrets
+import threading
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils import logger
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import telebot
+
+
+class WebhookReceiver:
+    """
+    Receives Telegram updates pushed to a webhook instead of long polling for them.
+
+    Updates are handed to the bot's own worker pool (TeleBot threaded mode), so the HTTP
+    handler returns immediately. Requests without the secret token registered with
+    Telegram are rejected.
+    """
+
+    def __init__(
+        self,
+        bot: telebot.TeleBot,
+        url: str,
+        listen: str = '0.0.0.0',
+        port: int = 8443,
+        secret_token: Optional[str] = None
+    ) -> None:
+        """
+        :param bot: TeleBot instance with registered handlers.
+        :param url: Public HTTPS URL Telegram posts updates to; its path is served locally.
+        :param listen: Interface to listen on.
+        :param port: Port to listen on, typically behind a TLS-terminating proxy.
+        :param secret_token: Token Telegram sends in X-Telegram-Bot-Api-Secret-Token; random when omitted.
+        """
+        self.bot = bot
+        self.url = url
+        self.path = urlparse(url).path or '/'
+        self.listen = listen
+        self.port = port
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+
+    def _handler(self):
+        from telebot.types import Update
+
+        receiver = self
+
+        class UpdateHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                token = self.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+                if self.path != receiver.path or not hmac.compare_digest(token, receiver.secret_token):
+                    self.send_error(403)
+                    return
+                try:
+                    body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                    update = Update.de_json(json.loads(body))
+                    receiver.bot.process_new_updates([update])
+                except Exception as e:
+                    logger.error(f"Error processing webhook update: {e}")
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return UpdateHandler
+
+    def run(self, stopping: threading.Event) -> None:
+        """
+        Register the webhook with Telegram and serve updates until stopping is set.
+
+        The webhook stays registered afterwards, so updates queue up at Telegram while the bot is down.
+        """
+        server = ThreadingHTTPServer((self.listen, self.port), self._handler())
+        server.daemon_threads = True
+        # handle_request returns after this many seconds without a request, to check stopping
+        server.timeout = 0.5
+        try:
+            self.bot.set_webhook(url=self.url, secret_token=self.secret_token, drop_pending_updates=False)
+            logger.info(f"Receiving updates on {self.listen}:{self.port}{self.path} for webhook {self.url}")
+            while not stopping.is_set():
+                server.handle_request()
+        finally:
+            server.server_close()